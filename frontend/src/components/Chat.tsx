@@ -11,6 +11,8 @@ export const Chat: React.FC = () => {
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
   const [sidebarVisible, setSidebarVisible] = useState(true);
+  const [runStatus, setRunStatus] = useState<string | null>(null);
+  const runAbortRef = useRef<AbortController | null>(null);
   const chatEndRef = useRef<null | HTMLDivElement>(null);
   const inputRef = useRef<HTMLTextAreaElement>(null);
 
@@ -47,6 +49,25 @@ export const Chat: React.FC = () => {
     }
   };
 
+  // Submits a run and long-polls it; the controller lets the user cancel it
+  const runChat = async (prompt: string, threadId: string) => {
+    const controller = new AbortController();
+    runAbortRef.current = controller;
+    try {
+      return await sendChatMessage(prompt, threadId, {
+        signal: controller.signal,
+        onStatus: run => setRunStatus(run.status)
+      });
+    } finally {
+      runAbortRef.current = null;
+      setRunStatus(null);
+    }
+  };
+
+  const cancelRun = () => {
+    runAbortRef.current?.abort();
+  };
+
   const extractStepData = (stepDetails: string) => {
     try {
       // Initialize return object
@@ -115,7 +136,7 @@ export const Chat: React.FC = () => {
 
       setInput('');
 
-      const response = await sendChatMessage(userMessage.content, threadId);
+      const response = await runChat(userMessage.content, threadId);
 
       let parsedSteps: any[] = [];
       if (Array.isArray(response.steps)) {
@@ -190,7 +211,7 @@ export const Chat: React.FC = () => {
     setInput('');
 
     try {
-      const response = await sendChatMessage(input, activeThreadId);
+      const response = await runChat(input, activeThreadId);
 
       let parsedSteps: any[] = [];
       if (Array.isArray(response.steps)) {
@@ -215,9 +236,10 @@ export const Chat: React.FC = () => {
       syncState(threadsWithResponse, activeThreadId);
     } catch (error) {
       console.error('[handleSubmit] error in chat:', error);
+      const cancelled = (error as Error).name === 'AbortError';
       const errorMessage: ChatMessage = {
         role: 'assistant',
-        content: 'Sorry, I encountered an error processing your request.',
+        content: cancelled ? 'Cancelled.' : 'Sorry, I encountered an error processing your request.',
         timestamp: new Date().toISOString()
       };
       const threadsWithError = updatedThreads.map(thread => {
@@ -349,7 +371,10 @@ export const Chat: React.FC = () => {
               {currentThread.messages.map((m, i) => renderMessage(m, i))}
               {loading && (
                 <div className="loading-spinner">
-                  <Spinner label="Processing..." />
+                  <Spinner label={runStatus ? `Processing (${runStatus.replace('_', ' ')})...` : 'Processing...'} />
+                  {runStatus && (
+                    <DefaultButton className="small-button" text="Cancel" onClick={cancelRun} />
+                  )}
                 </div>
               )}
               <div ref={chatEndRef} />
@@ -43,13 +43,52 @@ export const uploadFile = async (file: File, metadata: Record<string, any>) => {
   return response.json();
 };
 
-export const sendChatMessage = async (prompt: string, threadId: string) => {
-  const response = await fetch(`${BASE_URL}/api/chat`, {
+export interface ChatRun {
+  runId: string;
+  threadId: string;
+  status: string;
+  message?: any;
+  error?: string;
+}
+
+const ACTIVE_RUN_STATUSES = ['queued', 'in_progress', 'requires_action', 'cancelling'];
+const MAX_BUSY_RETRIES = 5;
+
+const sleep = (ms: number, signal?: AbortSignal) =>
+  new Promise<void>((resolve, reject) => {
+    const timer = setTimeout(resolve, ms);
+    signal?.addEventListener('abort', () => {
+      clearTimeout(timer);
+      reject(new DOMException('Aborted', 'AbortError'));
+    });
+  });
+
+// Retries requests the server shed with 429, honouring Retry-After
+const fetchWithBackoff = async (url: string, init: RequestInit) => {
+  for (let attempt = 0; ; attempt++) {
+    const response = await fetch(url, init);
+    if (response.status !== 429 || attempt >= MAX_BUSY_RETRIES) {
+      return response;
+    }
+    const retryAfter = Number(response.headers.get('Retry-After')) || 5;
+    await sleep(retryAfter * 1000, init.signal || undefined);
+  }
+};
+
+// `messageId` identifies one user message, so the server answers a retried request with its existing run
+export const startChatRun = async (
+  prompt: string,
+  threadId?: string,
+  signal?: AbortSignal,
+  messageId: string = crypto.randomUUID(),
+): Promise<ChatRun> => {
+  const response = await fetchWithBackoff(`${BASE_URL}/api/chat/runs`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
     },
-    body: JSON.stringify({ prompt, threadId }),
+    body: JSON.stringify({ prompt, threadId, messageId }),
+    signal,
   });
 
   if (!response.ok) {
@@ -59,6 +98,63 @@ export const sendChatMessage = async (prompt: string, threadId: string) => {
   return response.json();
 };
 
+// Long-polls: the server answers when the run ends or after `wait` seconds
+export const getChatRun = async (runId: string, threadId: string, wait = 20, signal?: AbortSignal): Promise<ChatRun> => {
+  const params = new URLSearchParams({ threadId, wait: String(wait) });
+  const response = await fetchWithBackoff(`${BASE_URL}/api/chat/runs/${runId}?${params}`, {
+    method: 'GET',
+    signal,
+  });
+
+  if (!response.ok) {
+    throw new Error(`Failed to get chat run: ${response.statusText}`);
+  }
+
+  return response.json();
+};
+
+export const cancelChatRun = async (runId: string, threadId: string): Promise<ChatRun> => {
+  const params = new URLSearchParams({ threadId });
+  const response = await fetch(`${BASE_URL}/api/chat/runs/${runId}?${params}`, {
+    method: 'DELETE',
+  });
+
+  if (!response.ok) {
+    throw new Error(`Failed to cancel chat run: ${response.statusText}`);
+  }
+
+  return response.json();
+};
+
+interface SendChatOptions {
+  signal?: AbortSignal;
+  onStatus?: (run: ChatRun) => void;
+}
+
+export const sendChatMessage = async (prompt: string, threadId: string, options: SendChatOptions = {}) => {
+  const { signal, onStatus } = options;
+  let run = await startChatRun(prompt, threadId, signal);
+  onStatus?.(run);
+
+  try {
+    while (ACTIVE_RUN_STATUSES.includes(run.status)) {
+      run = await getChatRun(run.runId, run.threadId, 20, signal);
+      onStatus?.(run);
+    }
+  } catch (error) {
+    if (signal?.aborted) {
+      await cancelChatRun(run.runId, run.threadId).catch(() => undefined);
+    }
+    throw error;
+  }
+
+  if (run.status !== 'completed' || !run.message) {
+    throw new Error(`Chat failed: run ${run.status}${run.error ? `: ${run.error}` : ''}`);
+  }
+
+  return run.message;
+};
+
 export const loadChatHistory = async (threadId: string) => {
   const response = await fetch(`${BASE_URL}/api/chat/history/${threadId}`, {
     method: 'GET',
@@ -0,0 +1,171 @@
+# /aggregate_function/__init__.py
+import azure.functions as func
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+from shared.search_clients import get_search_client
+from shared.index_versions import active_index
+from shared.schema_plan import CHUNK_PREFIX, DATETIME, compile_schema
+from shared.storage import load_user_config
+from shared.profiling import profiled
+
+DATE_INTERVALS = ("year", "quarter", "month", "week", "day")
+DEFAULT_FACET_VALUES = 10
+MAX_FACET_VALUES = 50
+MAX_GROUP_FIELDS = 5
+
+# Results are cached per index generation: the physical index version plus its
+# document count, so a rebuild or newly ingested files invalidate them. The TTL
+# covers updates that keep the count (re-ingested files, merged duplicates).
+CACHE_TTL_SECONDS = 300
+CACHE_SIZE = 256
+_cache: "OrderedDict[Tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def facet_columns(schema_json: Dict[str, Any], scope: str) -> Dict[str, str]:
+    """Facetable columns of an index by the name the agent uses, with their index names"""
+    plan = compile_schema(schema_json)
+    prefix = CHUNK_PREFIX if scope == "chunks" else ""
+    columns = {name: prefix + name for name, _ in plan.columns}
+    if scope == "chunks":
+        columns["sources"] = "chunk_sources"
+    return columns
+
+def date_columns(schema_json: Dict[str, Any], scope: str) -> Dict[str, str]:
+    prefix = CHUNK_PREFIX if scope == "chunks" else ""
+    columns = {"timestamp": prefix + "timestamp"}
+    columns.update({
+        name: prefix + name
+        for name, column_type in compile_schema(schema_json).columns if column_type == DATETIME
+    })
+    return columns
+
+def build_query(payload: Dict[str, Any], schema_json: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate an Aggregate request and turn it into search options"""
+    scope = payload.get("scope", "artifacts")
+    if scope not in ("artifacts", "chunks"):
+        raise ValueError("scope must be 'artifacts' or 'chunks'")
+    columns = facet_columns(schema_json, scope)
+    dates = date_columns(schema_json, scope)
+
+    group_by = payload.get("groupBy") or []
+    if isinstance(group_by, str):
+        group_by = [f.strip() for f in group_by.split(",") if f.strip()]
+    if len(group_by) > MAX_GROUP_FIELDS:
+        raise ValueError(f"At most {MAX_GROUP_FIELDS} groupBy fields are supported")
+    unknown = [f for f in group_by if f not in columns]
+    if unknown:
+        raise ValueError(f"Cannot group by {', '.join(unknown)}; available fields: {', '.join(sorted(columns))}")
+    top = max(1, min(int(payload.get("top", DEFAULT_FACET_VALUES)), MAX_FACET_VALUES))
+    facets = [f"{columns[f]},count:{top}" for f in group_by]
+
+    date_field = payload.get("dateField", "timestamp")
+    if date_field not in dates:
+        raise ValueError(f"dateField must be one of {', '.join(sorted(dates))}")
+    interval = payload.get("dateInterval")
+    if interval:
+        if interval not in DATE_INTERVALS:
+            raise ValueError(f"dateInterval must be one of {', '.join(DATE_INTERVALS)}")
+        facets.append(f"{dates[date_field]},interval:{interval}")
+
+    doc_type = "chunk_docType eq 'chunk'" if scope == "chunks" else "docType eq 'artifact'"
+    filters = [doc_type]
+    if payload.get("filter"):
+        filters.append(f"({payload['filter']})")
+    if payload.get("from"):
+        filters.append(f"{dates[date_field]} ge {payload['from']}")
+    if payload.get("to"):
+        filters.append(f"{dates[date_field]} lt {payload['to']}")
+
+    return {
+        "scope": scope,
+        "search_text": payload.get("searchText") or "*",
+        "filter": " and ".join(filters),
+        "facets": facets,
+        "names": {columns[f]: f for f in group_by},
+        "date_column": dates[date_field] if interval else None,
+    }
+
+def _cache_get(key):
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None or time.monotonic() - entry[0] > CACHE_TTL_SECONDS:
+            return None
+        _cache.move_to_end(key)
+        return entry[1]
+
+def _cache_put(key, value):
+    with _cache_lock:
+        _cache[key] = (time.monotonic(), value)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def aggregate(payload: Dict[str, Any], schema_json: Dict[str, Any]) -> Dict[str, Any]:
+    """Count matching documents, grouped by fields and date buckets, in one facet query"""
+    query = build_query(payload, schema_json)
+    index = active_index(query["scope"])
+    search_client = get_search_client(index["name"])
+
+    generation = (index["name"], search_client.get_document_count())
+    key = (generation, query["search_text"], query["filter"], tuple(query["facets"]))
+    cached = _cache_get(key)
+    if cached is not None:
+        return dict(cached, cached=True)
+
+    results = search_client.search(
+        search_text=query["search_text"],
+        filter=query["filter"],
+        facets=query["facets"],
+        include_total_count=True,
+        top=0
+    )
+    facets = results.get_facets() or {}
+    summary = {
+        "count": results.get_count(),
+        "groups": {
+            name: [{"value": f["value"], "count": f["count"]} for f in facets.get(column, [])]
+            for column, name in query["names"].items()
+        }
+    }
+    if query["date_column"]:
+        summary["buckets"] = [
+            {"start": f["value"], "count": f["count"]}
+            for f in facets.get(query["date_column"], []) if f["count"]
+        ]
+    _cache_put(key, summary)
+    return summary
+
+@profiled("aggregate_function")
+def main(msg: func.QueueMessage, outputQueueItem: func.Out[str]) -> None:
+    logging.info('Python queue trigger function processed a queue item')
+    correlation_id = None
+
+    try:
+        # Parse the queue message
+        message_payload = json.loads(msg.get_body().decode('utf-8'))
+        correlation_id = message_payload.get('CorrelationId')
+        payload = message_payload.get('payload', {})
+
+        # Get config to find the schema fields
+        schema_json = load_user_config()
+
+        summary = aggregate(payload, schema_json)
+
+        output_message = {
+            "Value": json.dumps(summary),
+            "CorrelationId": correlation_id
+        }
+        outputQueueItem.set(json.dumps(output_message))
+
+    except Exception as e:
+        logging.error(f"Error in aggregate_function: {str(e)}")
+        # Send error to output queue
+        error_message = {
+            "error": str(e),
+            "CorrelationId": correlation_id
+        }
+        outputQueueItem.set(json.dumps(error_message))
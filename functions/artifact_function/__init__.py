@@ -1,17 +1,21 @@
 # /artifact_function/__init__.py
 import azure.functions as func
-import os
 import json
 import logging
-from azure.search.documents import SearchClient
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents.models import QueryType
-from azure.storage.blob import BlobServiceClient
+from shared.search_clients import get_search_client
+from shared.index_versions import active_index
+from shared.schema_plan import compile_schema
+from shared.storage import load_user_config
+from shared.dedup import collapse_duplicates
+from shared.relevance import relevance_cut, semantic_options
+from shared.snippets import build_snippet, highlight_options, query_terms, result_fragments, snippet_budget
+from shared.profiling import profiled
 
 def check_message_size(message):
     """Check if message size is within Azure Queue limit"""
     return len(json.dumps(message).encode('utf-8')) <= 60000  # Buffer below 64KB limit
 
+@profiled("artifact_function")
 def main(msg: func.QueueMessage, outputQueueItem: func.Out[str]) -> None:
     logging.info('Python queue trigger function processed a queue item')
     
@@ -26,39 +30,33 @@ def main(msg: func.QueueMessage, outputQueueItem: func.Out[str]) -> None:
         filter_expr = payload.get("filter")
         semantic_ranking = payload.get("semanticRanking", False)
         top_k = min(payload.get("topK", 5), 50)
+        collapse = payload.get("collapseDuplicates", False)
         
         # Get config to find index name
-        blob_client = BlobServiceClient.from_connection_string(os.environ["STORAGE_CONNECTION_STRING"])
-        container_client = blob_client.get_container_client("schemas")
-        config_blob = container_client.get_blob_client("user_config.json")
-        schema_json = json.loads(config_blob.download_blob().readall())
+        schema_json = load_user_config()
         
-        # Initialize search client
-        search_client = SearchClient(
-            endpoint=os.environ["SEARCH_ENDPOINT"],
-            index_name="artifacts",  # Use static name
-            credential=AzureKeyCredential(os.environ["SEARCH_ADMIN_KEY"])
-        )
+        # Initialize search client for the active index version
+        index = active_index("artifacts")
+        search_client = get_search_client(index["name"])
         
         # Build dynamic field selection from config
-        standard_fields = ["id", "content", "docType", "timestamp", "fileName"]
-        custom_fields = [f["name"] for f in schema_json.get("fields", [])]
-        all_fields = standard_fields + custom_fields
+        all_fields = compile_schema(schema_json).select_fields
+        if index["fields"] is not None:
+            # Fields added by a schema change exist once their rebuild is active
+            all_fields = [f for f in all_fields if f in index["fields"]]
         
         # Build search options with dynamic field selection
         search_options = {
             "filter": f"docType eq 'artifact' {f'and {filter_expr}' if filter_expr else ''}",
-            "top": top_k,
+            # Over-fetch so collapsed near-duplicates still leave topK results
+            "top": min(top_k * 2, 50) if collapse else top_k,
             "select": ",".join(all_fields),
-            "include_total_count": True
+            "include_total_count": True,
+            **highlight_options("content")
         }
         
         if semantic_ranking:
-            search_options.update({
-                "query_type": QueryType.SEMANTIC,
-                "query_language": "en-us",
-                "semantic_configuration_name": "artifact-semantic"
-            })
+            search_options.update(semantic_options("artifacts"))
             
         # Perform search
         results = search_client.search(
@@ -68,23 +66,33 @@ def main(msg: func.QueueMessage, outputQueueItem: func.Out[str]) -> None:
         
         # Format results with size limit checking
         docs = []
-        total_count = results.get_count()
+        results = list(results)
+        if collapse:
+            results = collapse_duplicates(results, "content", name_field="fileName")
+        # Only strong evidence takes room in the message
+        results = relevance_cut(results, payload.get("minScore"))[:top_k]
         
+        # Show each artifact around its matches, sized so topK results fit the message
+        budget = snippet_budget(top_k)
+        terms = query_terms(search_text)
         for result in results:
             doc = {
-                field: (result.get(field)[:1000] if field == 'content' and isinstance(result.get(field), str) 
-                       else result.get(field))
+                field: (build_snippet(result.get(field), budget, result_fragments(result, field), terms)
+                        if field == 'content' else result.get(field))
                 for field in all_fields 
                 if field in result
             }
             doc["score"] = result.get("@search.score")
+            if result.get("@search.reranker_score") is not None:
+                doc["rerankerScore"] = result["@search.reranker_score"]
+            if result.get("duplicates"):
+                doc["duplicates"] = result["duplicates"]
+                if result.get("duplicate_names"):
+                    doc["duplicateFiles"] = result["duplicate_names"]
             
-            # Test if adding this doc would exceed size limit
+            # Test if adding this doc would exceed size limit, measured as sent (results are a JSON string)
             test_message = {
-                "Value": {
-                    "results": docs + [doc],
-                    "count": total_count
-                },
+                "Value": json.dumps(docs + [doc]),
                 "CorrelationId": correlation_id
             }
             
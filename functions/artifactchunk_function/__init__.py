@@ -1,11 +1,21 @@
 import json
 import logging
-import os
 import azure.functions as func
-from azure.search.documents import SearchClient
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents.models import QueryType
-from azure.storage.blob import BlobServiceClient
+from shared.search_clients import get_search_client
+from shared.index_versions import active_index
+from shared.odata_filter import quote_literal
+from shared.dedup import collapse_duplicates
+from shared.query_rewriting import multi_query_search, rewrite_query
+from shared.relevance import relevance_cut, semantic_options
+from shared.snippets import build_snippet, highlight_options, query_terms, result_fragments, snippet_budget
+from shared.profiling import profiled
+
+# Selected from every chunks index; the others only where the active version defines them
+CHUNK_FIELDS = ["chunk_id", "chunk_content", "chunk_timestamp", "chunk_fileName"]
+OPTIONAL_CHUNK_FIELDS = ["chunk_sources", "chunk_headers", "chunk_segmentStartTime", "chunk_segmentEndTime"]
+
+class BadRequest(ValueError):
+    """A tool call the active index cannot answer"""
 
 def check_message_size(message):
     """Check if message size is within Azure Queue limit"""
@@ -15,41 +25,45 @@ def search_chunk (payload):
     # Extract search parameters
     search_text = payload.get("searchText", "*")
     filter_expr = payload.get("filter")
+    section = payload.get("section")
     semantic_ranking = payload.get("semanticRanking", False)
     question_rewriting = payload.get("questionRewriting", False)
     top_k = min(payload.get("topK", 5), 50)
+    if payload.get("collapseDuplicates", False):
+        # Over-fetch so collapsed near-duplicates still leave topK results
+        top_k = min(top_k * 2, 50)
     
-    # Get config to find index name
-    blob_client = BlobServiceClient.from_connection_string(os.environ["STORAGE_CONNECTION_STRING"])
-    container_client = blob_client.get_container_client("schemas")
-    config_blob = container_client.get_blob_client("user_config.json")
-    schema_json = json.loads(config_blob.download_blob().readall())
-    
-    # Initialize search client with static index name
-    search_client = SearchClient(
-        endpoint=os.environ["SEARCH_ENDPOINT"],
-        index_name="chunks",
-        credential=AzureKeyCredential(os.environ["SEARCH_ADMIN_KEY"])
-    )
+    # Initialize search client for the active index version
+    index = active_index("chunks")
+    search_client = get_search_client(index["name"])
+    # Indexes created before a field was added do not have it until their rebuild is active
+    optional_fields = [f for f in OPTIONAL_CHUNK_FIELDS if index["fields"] is None or f in index["fields"]]
     
     # Build search options with chunk-specific fields
+    filters = ["chunk_docType eq 'chunk'"]
+    if filter_expr:
+        filters.append(f"({filter_expr})")
+    if section:
+        if "chunk_headers" not in optional_fields:
+            raise BadRequest(f"Index {index['name']} has no section headers yet; search without 'section' until it is rebuilt")
+        # Any chunk under this header, including its subsections
+        filters.append(f"chunk_headers/any(h: h eq {quote_literal(section)})")
     search_options = {
-        "filter": f"chunk_docType eq 'chunk' {f'and {filter_expr}' if filter_expr else ''}",
+        "filter": " and ".join(filters),
         "top": top_k,
-        "select": "chunk_id,chunk_content,chunk_timestamp,chunk_fileName",
-        "include_total_count": True
+        "select": ",".join(CHUNK_FIELDS + optional_fields),
+        "include_total_count": True,
+        **highlight_options("chunk_content")
     }
     
     if semantic_ranking:
-        search_options.update({
-            "query_type": QueryType.SEMANTIC,
-            "query_language": "en-us",
-            "semantic_configuration_name": "chunk-semantic"
-        })
+        search_options.update(semantic_options("chunks"))
 
     if question_rewriting:
-        # TODO: Implement question rewriting using Azure AI Services
-        pass
+        # Search the query and its rewrites at once and fuse the rankings
+        queries = rewrite_query(search_text)
+        logging.info(f"Question rewriting: {len(queries)} queries {queries}")
+        return multi_query_search(search_client, queries, "chunk_id", **search_options)
         
     # Perform search
     results = search_client.search(
@@ -60,6 +74,7 @@ def search_chunk (payload):
     return results
 
 
+@profiled("artifactchunk_function")
 def main(msg: func.QueueMessage, outputQueueItem: func.Out[str]) -> None:
     logging.info('Python queue trigger function processed a queue item')
     
@@ -74,29 +89,45 @@ def main(msg: func.QueueMessage, outputQueueItem: func.Out[str]) -> None:
         
         # Format results with size limit checking
         docs = []
-        total_count = results.get_count()
+        top_k = min(payload.get("topK", 5), 50)
+        results = list(results)
+        if payload.get("collapseDuplicates", False):
+            results = collapse_duplicates(results, "chunk_content", name_field="chunk_fileName")
+        # Only strong evidence takes room in the message
+        results = relevance_cut(results, payload.get("minScore"))[:top_k]
         
+        # Show each chunk around its matches, sized so topK results fit the message
+        budget = snippet_budget(top_k)
+        terms = query_terms(payload.get("searchText"))
         for result in results:
             doc = {
                 "id": result["chunk_id"],
-                "content": result.get("chunk_content", "")[:1000],  # Limit content size
+                "content": build_snippet(
+                    result.get("chunk_content") or "", budget, result_fragments(result, "chunk_content"), terms
+                ),
                 "timestamp": result.get("chunk_timestamp"),
                 "fileName": result.get("chunk_fileName"),
                 "score": result.get("@search.score")
             }
+            if result.get("@search.reranker_score") is not None:
+                doc["rerankerScore"] = result["@search.reranker_score"]
             
             # Add optional fields if present
-            if "segmentTimestamp" in result:
-                doc["segmentTimestamp"] = result["segmentTimestamp"]
-            if "headers" in result:
-                doc["headers"] = result["headers"]
+            if result.get("chunk_segmentStartTime") is not None:
+                doc["segmentStartTime"] = result["chunk_segmentStartTime"]
+                doc["segmentEndTime"] = result.get("chunk_segmentEndTime")
+            if result.get("chunk_headers"):
+                doc["headers"] = " > ".join(result["chunk_headers"])
+            if len(result.get("chunk_sources") or []) > 1:
+                doc["sources"] = result["chunk_sources"]
+            if result.get("duplicates"):
+                doc["duplicates"] = result["duplicates"]
+                if result.get("duplicate_names"):
+                    doc["duplicateFiles"] = result["duplicate_names"]
             
-            # Test if adding this doc would exceed size limit
+            # Test if adding this doc would exceed size limit, measured as sent (results are a JSON string)
             test_message = {
-                "Value": {
-                    "results": docs + [doc],
-                    "count": total_count
-                },
+                "Value": json.dumps(docs + [doc]),
                 "CorrelationId": correlation_id
             }
             
@@ -119,5 +150,7 @@ def main(msg: func.QueueMessage, outputQueueItem: func.Out[str]) -> None:
         error_message = {
             "error": str(e),
             "CorrelationId": correlation_id
-        }        
+        }
+        if isinstance(e, BadRequest):
+            error_message["status"] = 400
         outputQueueItem.set(json.dumps(error_message))
\ No newline at end of file
@@ -0,0 +1 @@
+"""Offline benchmarks for the function app (run from the functions/ directory)."""
@@ -0,0 +1,125 @@
+"""Chunk sizes on pathological documents (``ingestion_function/markdown_chunker.py``).
+
+Chunks the small-documents and large-pdf corpora and documents built to break
+a line-based chunker: a long code listing, minified code on one line, a
+spreadsheet exported as a single-line HTML table, a long pipe table, a table
+whose cells are larger than a chunk, one paragraph without line breaks, an
+unterminated code fence, and empty documents. Reports per document kind the
+chunk count, p50/p99/max tokens per chunk (counted with tiktoken when its
+encoding loads, estimated otherwise), chunk characters against input
+characters, and the chunking throughput. Exits 1 when a chunk is over
+``CHUNK_MAX_CHARS`` or blank, a table piece lost its header row, or a code
+piece is not a fenced block.
+
+Usage (from the functions/ directory):
+
+    python -m benchmarks.chunking_benchmark
+    python -m benchmarks.chunking_benchmark --max-chars 1024 --scale 4
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from shared.tokens import count_tokens, tokenizer
+
+from .corpora import _html_table, _paragraph, _sentence, _vocabulary, large_pdfs, small_documents
+from .ingestion_benchmark import percentile
+
+
+def pathological_documents(rng: random.Random, scale: int) -> Dict[str, List[str]]:
+    vocab = _vocabulary(rng)
+    code = "\n".join(f"    {rng.choice(vocab)}_{i} = compute({rng.randint(0, 999)})" for i in range(2000 * scale))
+    pipe_rows = "\n".join(
+        "| " + " | ".join(f"{rng.choice(vocab)} {rng.randint(0, 9999)}" for _ in range(6)) + " |"
+        for _ in range(1500 * scale)
+    )
+    wide_rows = "\n".join(
+        "| " + " | ".join(" ".join(rng.choice(vocab) for _ in range(600)) for _ in range(2)) + " |"
+        for _ in range(20 * scale)
+    )
+    minified = ";".join(f"var {rng.choice(vocab)}{i}={rng.randint(0, 999)}" for i in range(8000 * scale))
+    return {
+        "code listing": [f"# Listing\n\n```python\n{code}\n```\n\nAfter the listing."],
+        "minified code": [f"# Bundle\n\n```js\n{minified}\n```"],
+        "html table": [f"# Ledger\n\n{_html_table(rng, vocab, 3000 * scale, 8)}"],
+        "pipe table": [f"# Ledger\n\n| a | b | c | d | e | f |\n|---|---|---|---|---|---|\n{pipe_rows}"],
+        "wide cells": [f"# Notes\n\n| note | remark |\n|---|---|\n{wide_rows}"],
+        "one paragraph": [" ".join(_paragraph(rng, vocab) for _ in range(400 * scale))],
+        "unterminated fence": [f"# Dump\n\n~~~\n{code}"],
+        "long words": [" ".join("".join(rng.choice(vocab) for _ in range(400)) for _ in range(50 * scale))],
+        "headers only": ["\n".join(f"## {_sentence(rng, vocab, 3)}" for _ in range(2000 * scale))],
+        "empty": ["", "\n\n", "   \n\t\n"],
+    }
+
+
+def check_chunk(content: str, max_chars: int) -> List[str]:
+    problems = []
+    if len(content) > max_chars:
+        problems.append(f"{len(content)} characters")
+    if not content.strip():
+        problems.append("blank chunk")
+    if "<tr>" in content and ("<table>" not in content or "</table>" not in content):
+        problems.append("table piece without its table tags")
+    if content.count("<table>") and "<th>" not in content:
+        problems.append("table piece without its header row")
+    if content.count("```") % 2 or content.count("~~~") % 2:
+        problems.append("unbalanced code fence")
+    return problems
+
+
+def run(documents: List[str], max_chars: int) -> Tuple[Dict[str, float], List[str]]:
+    from ingestion_function.markdown_chunker import MarkdownChunker
+
+    chunker = MarkdownChunker(max_chars=max_chars)
+    contents, problems, input_chars = [], [], 0
+    start = time.perf_counter()
+    for i, markdown in enumerate(documents):
+        chunks = chunker.create_chunks(markdown, {"id": f"doc{i}", "fileName": f"doc{i}.md"})
+        input_chars += len(markdown)
+        contents.extend(chunk["chunk_content"] for chunk in chunks)
+        for chunk in chunks:
+            problems.extend(f"{chunk['chunk_id']}: {p}" for p in check_chunk(chunk["chunk_content"], max_chars))
+    elapsed = time.perf_counter() - start
+    # Counted after timing, so tokenizing does not count against the chunker
+    tokens = [count_tokens(content) for content in contents]
+    chunk_chars = sum(len(content) for content in contents)
+    return {
+        "chunks": len(tokens),
+        "p50": percentile(tokens, 50),
+        "p99": percentile(tokens, 99),
+        "max": max(tokens, default=0),
+        "ratio": chunk_chars / max(1, input_chars),
+        "mb_per_s": input_chars / 1e6 / max(elapsed, 1e-9),
+    }, problems
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Markdown chunk size benchmark")
+    parser.add_argument("--max-chars", type=int, default=int(os.environ.get("CHUNK_MAX_CHARS", 2048)))
+    parser.add_argument("--scale", type=int, default=1, help="Size multiplier for the pathological documents")
+    parser.add_argument("--seed", type=int, default=49)
+    args = parser.parse_args(argv)
+
+    kinds = {
+        "small-documents": [r["contents"][0]["markdown"] for _, _, r in small_documents()],
+        "large-pdf": [r["contents"][0]["markdown"] for _, _, r in large_pdfs()],
+        **pathological_documents(random.Random(args.seed), args.scale),
+    }
+    print(f"CHUNK_MAX_CHARS={args.max_chars}, tokens {'counted' if tokenizer() else 'estimated'}")
+    print(f"{'documents':<20}{'chunks':>8}{'p50 tok':>9}{'p99 tok':>9}{'max tok':>9}{'chars x':>9}{'MB/s':>8}")
+    failed = False
+    for kind, documents in kinds.items():
+        result, problems = run(documents, args.max_chars)
+        print(f"{kind:<20}{result['chunks']:>8}{result['p50']:>9.0f}{result['p99']:>9.0f}{result['max']:>9}"
+              f"{result['ratio']:>9.2f}{result['mb_per_s']:>8.1f}")
+        for problem in problems[:5]:
+            print(f"  FAIL {problem}")
+        failed = failed or bool(problems)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
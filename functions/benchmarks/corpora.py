@@ -0,0 +1,150 @@
+import random
+from typing import Dict, Any, List, Tuple
+
+# (blob name, uploaded bytes, analyze_result replayed for those bytes)
+CorpusDocument = Tuple[str, bytes, Dict[str, Any]]
+
+BENCHMARK_SCHEMA = {
+    "name": "benchmark-analyzer",
+    "scenario": "document",
+    "instructions": "Benchmark schema",
+    "fields": [
+        {"name": "summary", "type": "string", "description": "Summary"},
+        {"name": "sentiment", "type": "string", "description": "Sentiment"},
+        {"name": "topics", "type": "array", "description": "Topics"},
+        {"name": "customerName", "type": "string", "description": "Customer"},
+    ],
+}
+
+_SYLLABLES = ["ka", "lo", "mi", "ren", "sa", "tor", "vi", "que", "dan", "el", "por", "ni", "ust", "bra", "ge"]
+
+
+def _vocabulary(rng: random.Random, size: int = 800) -> List[str]:
+    return [
+        "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(1, 4)))
+        for _ in range(size)
+    ]
+
+
+def _sentence(rng: random.Random, vocab: List[str], words: int = 14) -> str:
+    text = " ".join(rng.choice(vocab) for _ in range(rng.randint(words // 2, words * 2)))
+    return text.capitalize() + "."
+
+
+def _paragraph(rng: random.Random, vocab: List[str], sentences: int = 5) -> str:
+    return " ".join(_sentence(rng, vocab) for _ in range(rng.randint(2, sentences)))
+
+
+def _fields(rng: random.Random, vocab: List[str]) -> Dict[str, Any]:
+    return {
+        "summary": {"type": "string", "valueString": _paragraph(rng, vocab, 3)},
+        "sentiment": {"type": "string", "valueString": rng.choice(["positive", "neutral", "negative"])},
+        "topics": {
+            "type": "array",
+            "valueArray": [
+                {"type": "string", "valueString": rng.choice(vocab)}
+                for _ in range(rng.randint(1, 6))
+            ],
+        },
+        "customerName": {"type": "string", "valueString": rng.choice(vocab).title()},
+    }
+
+
+def _html_table(rng: random.Random, vocab: List[str], rows: int, cols: int) -> str:
+    header = "".join(f"<th>{rng.choice(vocab)}</th>" for _ in range(cols))
+    body = "".join(
+        "<tr>" + "".join(f"<td>{rng.choice(vocab)} {rng.randint(0, 9999)}</td>" for _ in range(cols)) + "</tr>"
+        for _ in range(rows)
+    )
+    return f"<table><tr>{header}</tr>{body}</table>"
+
+
+def _document_markdown(rng: random.Random, vocab: List[str], pages: int) -> str:
+    parts = [f"# {_sentence(rng, vocab, 4)}"]
+    for page in range(pages):
+        parts.append(f"## {_sentence(rng, vocab, 3)}")
+        for _ in range(rng.randint(2, 5)):
+            if rng.random() < 0.3:
+                parts.append(f"### {_sentence(rng, vocab, 3)}")
+            parts.append(_paragraph(rng, vocab))
+        if rng.random() < 0.25:
+            parts.append(_html_table(rng, vocab, rng.randint(3, 25), rng.randint(3, 6)))
+        if rng.random() < 0.1:
+            code = "\n".join(f"    {rng.choice(vocab)} = {rng.randint(0, 99)}" for _ in range(rng.randint(3, 20)))
+            parts.append(f"```\n{code}\n```")
+        parts.append("<!-- PageBreak -->")
+    return "\n\n".join(parts)
+
+
+def _analyze_result(kind: str, markdown: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "analyzerId": BENCHMARK_SCHEMA["name"],
+        "apiVersion": "2024-12-01-preview",
+        "contents": [{"kind": kind, "markdown": markdown, "fields": fields}],
+    }
+
+
+def small_documents(count: int = 200, seed: int = 26) -> List[CorpusDocument]:
+    """Short multi-section documents (1-3 pages each)"""
+    rng = random.Random(seed)
+    vocab = _vocabulary(rng)
+    docs = []
+    for i in range(count):
+        markdown = _document_markdown(rng, vocab, rng.randint(1, 3))
+        name = f"files/small-{i:05d}.pdf"
+        docs.append((name, f"{name}:{seed}".encode("utf-8"), _analyze_result("document", markdown, _fields(rng, vocab))))
+    return docs
+
+
+def large_pdfs(count: int = 3, pages: int = 400, seed: int = 27) -> List[CorpusDocument]:
+    """Report-sized documents with tables and code listings"""
+    rng = random.Random(seed)
+    vocab = _vocabulary(rng)
+    docs = []
+    for i in range(count):
+        markdown = _document_markdown(rng, vocab, pages)
+        name = f"files/large-{i:03d}.pdf"
+        docs.append((name, f"{name}:{seed}".encode("utf-8"), _analyze_result("document", markdown, _fields(rng, vocab))))
+    return docs
+
+
+def _vtt_time(ms: int, with_hours: bool) -> str:
+    hours, rem = divmod(ms, 3_600_000)
+    minutes, rem = divmod(rem, 60_000)
+    seconds, millis = divmod(rem, 1000)
+    if with_hours:
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{millis:03d}"
+    return f"{minutes:02d}:{seconds:02d}.{millis:03d}"
+
+
+def long_transcripts(count: int = 2, hours: float = 3.0, seed: int = 28) -> List[CorpusDocument]:
+    """Multi-hour call recordings rendered as WEBVTT, as Content Understanding returns them"""
+    rng = random.Random(seed)
+    vocab = _vocabulary(rng)
+    docs = []
+    total_ms = int(hours * 3_600_000)
+    with_hours = total_ms >= 3_600_000
+    for i in range(count):
+        cues = ["WEBVTT", ""]
+        t = 0
+        while t < total_ms:
+            duration = rng.randint(1500, 9000)
+            speaker = rng.choice(["Agent", "Customer"])
+            cues.append(f"{_vtt_time(t, with_hours)} --> {_vtt_time(t + duration, with_hours)}")
+            cues.append(f"<v {speaker}>{_sentence(rng, vocab)}")
+            cues.append("")
+            t += duration + rng.randint(0, 800)
+        markdown = (
+            f"# Audio: 00:00.000 => {_vtt_time(total_ms, with_hours)}\n\n"
+            "Transcript\n```\n" + "\n".join(cues) + "\n```"
+        )
+        name = f"files/call-{i:03d}.wav"
+        docs.append((name, f"{name}:{seed}".encode("utf-8"), _analyze_result("audioVisual", markdown, _fields(rng, vocab))))
+    return docs
+
+
+CORPORA = {
+    "small-documents": small_documents,
+    "large-pdf": large_pdfs,
+    "transcript": long_transcripts,
+}
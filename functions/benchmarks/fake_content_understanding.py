@@ -0,0 +1,121 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional
+
+
+class FakeContentUnderstandingServer:
+    """Local HTTP stand-in for the Content Understanding analyze API.
+
+    Replays recorded ``analyze_result`` payloads keyed by the SHA-256 of the
+    uploaded bytes. ``latency_ms`` is spent server-side before the first poll
+    returns, so the client sees one 202 and one successful poll per document.
+    """
+
+    def __init__(self, latency_ms: float = 0, host: str = "127.0.0.1", port: int = 0):
+        self.latency_ms = latency_ms
+        self._recordings: Dict[str, bytes] = {}
+        self._operations: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def register(self, content: bytes, analyze_result: Dict[str, Any]) -> None:
+        """Register the payload replayed when ``content`` is analyzed"""
+        body = json.dumps({"status": "Succeeded", "result": analyze_result}).encode("utf-8")
+        self._recordings[hashlib.sha256(content).hexdigest()] = body
+
+    def load_recordings(self, directory: str) -> Dict[str, bytes]:
+        """Load ``<name>.json`` recordings from a directory.
+
+        Each file holds a raw ``analyze_result``; the returned mapping gives the
+        bytes to upload for each recording so it is replayed on analyze.
+        """
+        uploads = {}
+        for file_name in sorted(os.listdir(directory)):
+            if not file_name.endswith(".json"):
+                continue
+            with open(os.path.join(directory, file_name), "r", encoding="utf-8") as f:
+                analyze_result = json.load(f)
+            content = f"recording:{file_name}".encode("utf-8")
+            self.register(content, analyze_result)
+            uploads[file_name] = content
+        return uploads
+
+    def start(self) -> "FakeContentUnderstandingServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeContentUnderstandingServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                logging.debug("fake-cu: " + format, *args)
+
+            def _send(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None):
+                self.send_response(status)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                content = self.rfile.read(length)
+                if ":analyze" not in self.path:
+                    self._send(404, b'{"error": {"message": "Not found"}}')
+                    return
+                recording = fake._recordings.get(hashlib.sha256(content).hexdigest())
+                if recording is None:
+                    self._send(400, b'{"error": {"message": "No recording for content"}}')
+                    return
+                operation_id = str(uuid.uuid4())
+                with fake._lock:
+                    fake._operations[operation_id] = {
+                        "body": recording,
+                        "ready_at": time.monotonic() + fake.latency_ms / 1000.0,
+                    }
+                analyzer_path = self.path.split(":analyze")[0]
+                location = f"{fake.endpoint}{analyzer_path}/results/{operation_id}"
+                self._send(202, b"", {"Operation-Location": location})
+
+            def do_GET(self):
+                operation_id = self.path.split("?")[0].rsplit("/", 1)[-1]
+                with fake._lock:
+                    operation = fake._operations.pop(operation_id, None)
+                if operation is None:
+                    self._send(404, b'{"error": {"message": "Unknown operation"}}')
+                    return
+                delay = operation["ready_at"] - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self._send(200, operation["body"])
+
+        return Handler
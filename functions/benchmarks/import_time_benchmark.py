@@ -0,0 +1,135 @@
+"""Cold-start import time of each function module.
+
+Imports every function (each folder with a ``function.json``) in a fresh
+interpreter, after ``azure.functions`` which the Python worker has already
+loaded, and reports the import time and which heavy SDKs came with it. The
+SDKs are meant to load on first use, so a function that pulls one in at import
+time fails the check even when it is within its time budget.
+
+Usage (from the functions/ directory):
+
+    python -m benchmarks.import_time_benchmark
+    python -m benchmarks.import_time_benchmark --functions chat_function --repeat 10
+    python -m benchmarks.import_time_benchmark --update-baselines
+
+Exits with status 1 when a function imports a heavy SDK, exceeds its budget
+in ``baselines/import_time.json``, has no budget there, or takes longer than
+``--max-ms`` whatever its budget. CI runs it on every build.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+FUNCTIONS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINES = os.path.join(os.path.dirname(__file__), "baselines", "import_time.json")
+# Ceiling on any function's import, also when its baseline was recorded slow
+DEFAULT_MAX_IMPORT_MS = 100
+# Modules that cost tens to hundreds of milliseconds each to import
+HEAVY_MODULES = [
+    "azure.core",
+    "azure.storage.blob",
+    "azure.storage.queue",
+    "azure.search.documents",
+    "azure.identity",
+    "azure.ai.projects",
+    "requests",
+]
+
+PROBE = """
+import json, sys, time
+import azure.functions
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"import_ms": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def function_modules() -> List[str]:
+    return sorted(
+        name for name in os.listdir(FUNCTIONS_DIR)
+        if os.path.isfile(os.path.join(FUNCTIONS_DIR, name, "function.json"))
+    )
+
+
+def measure(module: str, repeat: int) -> Dict[str, Any]:
+    """Best of ``repeat`` cold imports of ``module``, each in a new interpreter"""
+    samples, heavy = [], []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=FUNCTIONS_DIR, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples.append(result["import_ms"])
+        heavy = result["heavy"]
+    return {"import_ms": round(min(samples), 1), "heavy": heavy}
+
+
+def check(
+    name: str, result: Dict[str, Any], budget: Dict[str, Any], tolerance: float, slack_ms: float, max_ms: float
+) -> List[str]:
+    problems = []
+    if result["heavy"]:
+        problems.append(f"{name}: imports {', '.join(result['heavy'])} at module load")
+    if result["import_ms"] > max_ms:
+        problems.append(f"{name}: import {result['import_ms']}ms > {max_ms:.1f}ms ceiling")
+    if not budget:
+        problems.append(f"{name}: no budget in the baselines; record one with --update-baselines")
+    else:
+        # Absolute slack keeps millisecond imports from flapping on a busy runner
+        ceiling = budget["import_ms"] * (1 + tolerance) + slack_ms
+        if result["import_ms"] > ceiling:
+            problems.append(f"{name}: import {result['import_ms']}ms > {ceiling:.1f}ms (baseline {budget['import_ms']}ms)")
+    return problems
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Function import time benchmark")
+    parser.add_argument("--functions", default=",".join(function_modules()), help="Comma-separated function folders")
+    parser.add_argument("--repeat", type=int, default=5, help="Cold imports per function; the fastest counts")
+    parser.add_argument("--baselines", default=DEFAULT_BASELINES)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative regression")
+    parser.add_argument("--slack-ms", type=float, default=20, help="Allowed absolute regression")
+    parser.add_argument("--max-ms", type=float, default=DEFAULT_MAX_IMPORT_MS, help="Import time no function may exceed")
+    parser.add_argument("--update-baselines", action="store_true")
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'function':<26}{'import ms':>10}  heavy SDKs")
+    for name in (f for f in args.functions.split(",") if f):
+        results[name] = measure(name, args.repeat)
+        print(f"{name:<26}{results[name]['import_ms']:>10.1f}  {', '.join(results[name]['heavy']) or '-'}")
+
+    if args.update_baselines:
+        stored = {}
+        if os.path.exists(args.baselines):
+            with open(args.baselines, "r", encoding="utf-8") as f:
+                stored = json.load(f).get("functions", {})
+        stored.update({name: {"import_ms": result["import_ms"]} for name, result in results.items()})
+        with open(args.baselines, "w", encoding="utf-8") as f:
+            json.dump({"functions": stored}, f, indent=2)
+        print(f"\nUpdated baselines in {args.baselines}")
+        return 0
+
+    budgets = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines, "r", encoding="utf-8") as f:
+            budgets = json.load(f).get("functions", {})
+    problems = []
+    for name, result in results.items():
+        problems.extend(check(name, result, budgets.get(name), args.tolerance, args.slack_ms, args.max_ms))
+    if problems:
+        print("\nImport budget exceeded:")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+    print("\nAll functions within their import budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""Offline ingestion throughput benchmark.
+
+Runs the real ``ingestion_function.main`` (analyze -> process_content_item ->
+chunkers -> upload) against a local fake Content Understanding server and an
+in-memory search sink, one corpus per child process so peak RSS is isolated.
+
+Usage (from the functions/ directory):
+
+    python -m benchmarks.ingestion_benchmark
+    python -m benchmarks.ingestion_benchmark --corpus transcript --latency-ms 50
+    python -m benchmarks.ingestion_benchmark --update-baselines
+
+Exits with status 1 when a corpus regresses past the stored baselines.
+"""
+import argparse
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from typing import Dict, Any, List
+
+from .corpora import BENCHMARK_SCHEMA, CORPORA
+from .fake_content_understanding import FakeContentUnderstandingServer
+
+DEFAULT_BASELINES = os.path.join(os.path.dirname(__file__), "baselines", "ingestion.json")
+STAGES = ["analyze", "archive", "process", "dedup", "checkpoint", "upload", "total"]
+# Below this many samples a p99 is the slowest one or two, too noisy to gate on
+MIN_P99_SAMPLES = 100
+# Absolute slack on top of the relative tolerances, so sub-millisecond stages do not flap
+P50_SLACK_MS = 1.0
+P99_SLACK_MS = 5.0
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _timed(fn, samples: List[float]):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            samples.append((time.perf_counter() - start) * 1000)
+    return wrapper
+
+
+def run_corpus(corpus: str, endpoint: str, search_backend: str = "sink", repeat: int = 1) -> Dict[str, Any]:
+    """Ingest one corpus ``repeat`` times in the current process and return its metrics"""
+    logging.getLogger().setLevel(logging.WARNING)
+    os.environ.update({
+        "CO_AI_ENDPOINT": endpoint,
+        "CO_AI_KEY": "benchmark",
+        "STORAGE_CONNECTION_STRING": "UseDevelopmentStorage=true",
+        # The fake service does not throttle; measure ingestion, not the limiter
+        "RATE_LIMIT_BACKEND": "local",
+        "RATE_LIMIT_CONTENT_UNDERSTANDING_RPS": "0",
+        "RATE_LIMIT_CONTENT_UNDERSTANDING_CONCURRENCY": "0",
+        "RATE_LIMIT_SEARCH_RPS": "0",
+    })
+
+    import ingestion_function
+    # Loaded on first analyze; cold starts are import_time_benchmark's concern
+    importlib.import_module("requests")
+    from shared import storage
+    from .stand_ins import BenchmarkInputStream, InMemorySearchSink, StaticBlobServiceClient
+
+    samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+
+    class TimedSearchSink(InMemorySearchSink):
+        def upload_documents(self, documents, **kwargs):
+            return _timed(super().upload_documents, samples["upload"])(documents, **kwargs)
+
+    StaticBlobServiceClient.set_schema(BENCHMARK_SCHEMA)
+    InMemorySearchSink.reset()
+    storage.use_blob_service_client(StaticBlobServiceClient())
+    if search_backend == "local":
+        from shared.local_search import LocalSearchClient
+
+        class TimedLocalClient(LocalSearchClient):
+            def upload_documents(self, documents, **kwargs):
+                return _timed(super().upload_documents, samples["upload"])(documents, **kwargs)
+
+        ingestion_function.get_search_client = lambda index_name: TimedLocalClient(index_name=index_name)
+    else:
+        ingestion_function.get_search_client = lambda index_name: TimedSearchSink(index_name=index_name)
+    ingestion_function.analyze_file = _timed(ingestion_function.analyze_file, samples["analyze"])
+    ingestion_function.save_analysis = _timed(ingestion_function.save_analysis, samples["archive"])
+    ingestion_function.process_content_item = _timed(ingestion_function.process_content_item, samples["process"])
+    ingestion_function.deduplicate_chunks = _timed(ingestion_function.deduplicate_chunks, samples["dedup"])
+    ingestion_function.complete_stage = _timed(ingestion_function.complete_stage, samples["checkpoint"])
+
+    docs = CORPORA[corpus]()
+    input_bytes = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for name, content, analyze_result in docs:
+            input_bytes += sum(len(item.get("markdown", "")) for item in analyze_result["contents"])
+            _timed(ingestion_function.main, samples["total"])(BenchmarkInputStream(name, content))
+    elapsed = time.perf_counter() - start
+
+    if search_backend == "local":
+        from shared.local_search import get_local_index
+        chunk_count = len(get_local_index("chunks"))
+    else:
+        chunk_count = InMemorySearchSink.count("chunks")
+    return {
+        "docs": len(docs),
+        "chunks": chunk_count,
+        "repeat": repeat,
+        "markdown_mb": round(input_bytes / (1024 * 1024), 2),
+        "elapsed_s": round(elapsed, 3),
+        "docs_per_sec": round(len(docs) * repeat / elapsed, 3),
+        "chunks_per_sec": round(chunk_count * repeat / elapsed, 1),
+        "stages": {
+            stage: {
+                "p50_ms": round(percentile(values, 50), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+                "samples": len(values),
+            }
+            for stage, values in samples.items()
+        },
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def _child(corpus: str, endpoint: str, search_backend: str, repeat: int, queue) -> None:
+    try:
+        queue.put(("ok", run_corpus(corpus, endpoint, search_backend, repeat)))
+    except Exception as e:
+        logging.exception("Benchmark run failed")
+        queue.put(("error", f"{type(e).__name__}: {e}"))
+
+
+def run_isolated(corpus: str, endpoint: str, search_backend: str = "sink", repeat: int = 1) -> Dict[str, Any]:
+    """Run a corpus in a fresh interpreter so peak RSS is not shared"""
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_child, args=(corpus, endpoint, search_backend, repeat, queue))
+    process.start()
+    status, result = queue.get()
+    process.join()
+    if status != "ok":
+        raise RuntimeError(f"Corpus {corpus} failed: {result}")
+    return result
+
+
+def compare_to_baseline(
+    corpus: str, result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, p99_tolerance: float
+) -> List[str]:
+    """Return a description of every metric that regressed past its tolerance.
+
+    Tail latencies come from few samples per stage, so p99 gets its own (looser)
+    tolerance and more absolute slack while p50 and throughput use
+    ``tolerance``, and is only checked for stages with ``MIN_P99_SAMPLES``.
+    """
+    regressions = []
+    for metric in ("docs_per_sec", "chunks_per_sec"):
+        floor = baseline[metric] * (1 - tolerance)
+        if result[metric] < floor:
+            regressions.append(f"{corpus}: {metric} {result[metric]} < {floor:.3f} (baseline {baseline[metric]})")
+    for stage, stats in baseline.get("stages", {}).items():
+        measured = result["stages"].get(stage, {})
+        for pct, allowed, slack in (("p50_ms", tolerance, P50_SLACK_MS), ("p99_ms", p99_tolerance, P99_SLACK_MS)):
+            if pct == "p99_ms" and measured.get("samples", 0) < MIN_P99_SAMPLES:
+                continue
+            ceiling = stats[pct] * (1 + allowed) + slack
+            actual = measured.get(pct, 0.0)
+            if actual > ceiling:
+                regressions.append(f"{corpus}: {stage} {pct[:3]} {actual}ms > {ceiling:.2f}ms (baseline {stats[pct]}ms)")
+    if baseline.get("peak_rss_mb"):
+        ceiling = baseline["peak_rss_mb"] * (1 + tolerance)
+        if result["peak_rss_mb"] > ceiling:
+            regressions.append(f"{corpus}: peak RSS {result['peak_rss_mb']}MB > {ceiling:.1f}MB (baseline {baseline['peak_rss_mb']}MB)")
+    return regressions
+
+
+def print_report(corpus: str, result: Dict[str, Any]) -> None:
+    print(f"\n== {corpus}: {result['docs']} docs x{result['repeat']}, {result['chunks']} chunks, {result['markdown_mb']} MB markdown")
+    print(f"   {result['docs_per_sec']} docs/s, {result['chunks_per_sec']} chunks/s, peak RSS {result['peak_rss_mb']} MB")
+    for stage, stats in result["stages"].items():
+        print(f"   {stage:<10} p50 {stats['p50_ms']:>10.2f} ms   p99 {stats['p99_ms']:>10.2f} ms")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline ingestion benchmark")
+    parser.add_argument("--corpus", default=",".join(CORPORA), help="Comma-separated corpora to run")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Fake Content Understanding latency per document")
+    parser.add_argument(
+        "--search", choices=["sink", "local"], default="sink",
+        help="Record uploads in memory (sink) or index them with the embedded search engine (local)"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Ingest each corpus this many times")
+    parser.add_argument("--baselines", default=DEFAULT_BASELINES)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative regression")
+    parser.add_argument("--p99-tolerance", type=float, default=2.0, help="Allowed relative regression of p99 latencies")
+    parser.add_argument("--update-baselines", action="store_true")
+    parser.add_argument("--json", help="Write the raw results to this file")
+    args = parser.parse_args(argv)
+
+    corpora = [c for c in args.corpus.split(",") if c]
+    unknown = [c for c in corpora if c not in CORPORA]
+    if unknown:
+        parser.error(f"Unknown corpus: {', '.join(unknown)}")
+
+    results = {}
+    with FakeContentUnderstandingServer(latency_ms=args.latency_ms) as server:
+        for corpus in corpora:
+            for _, content, analyze_result in CORPORA[corpus]():
+                server.register(content, analyze_result)
+            results[corpus] = run_isolated(corpus, server.endpoint, args.search, args.repeat)
+            print_report(corpus, results[corpus])
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.search != "sink":
+        # Baselines are recorded against the sink; local indexing cost is informational
+        return 0
+
+    if args.update_baselines:
+        stored = {"config": {"latency_ms": args.latency_ms}, "corpora": {}}
+        if os.path.exists(args.baselines):
+            with open(args.baselines, "r", encoding="utf-8") as f:
+                stored["corpora"] = json.load(f).get("corpora", {})
+        stored["corpora"].update(results)
+        with open(args.baselines, "w", encoding="utf-8") as f:
+            json.dump(stored, f, indent=2)
+        print(f"\nUpdated baselines in {args.baselines}")
+        return 0
+
+    if not os.path.exists(args.baselines):
+        print("\nNo baselines stored; run with --update-baselines to record them")
+        return 0
+
+    with open(args.baselines, "r", encoding="utf-8") as f:
+        baselines = json.load(f)
+    if baselines.get("config", {}).get("latency_ms") != args.latency_ms:
+        print(f"\nWarning: baselines were recorded with latency_ms={baselines.get('config', {}).get('latency_ms')}")
+
+    regressions = []
+    for corpus, result in results.items():
+        if corpus in baselines.get("corpora", {}):
+            regressions.extend(compare_to_baseline(
+                corpus, result, baselines["corpora"][corpus], args.tolerance, args.p99_tolerance
+            ))
+
+    if regressions:
+        print("\nRegressions:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    print("\nNo regressions against stored baselines")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""Overhead and output of invocation profiling (``shared/profiling.py``).
+
+Wraps a CPU-bound handler (chunking and deduplicating a large-pdf corpus
+document) and a no-op handler with ``profiled`` and runs them with profiling
+off, with the sampling profiler and with cProfile on every invocation.
+Profiles go to the in-memory blob stand-in. Reports the p50 time per
+invocation, the overhead against profiling off, the bytes of profile written
+per invocation, and the share of the handler's time that the collapsed stacks
+account for. Exits 1 when a ``.prof`` blob does not load in ``pstats`` or a
+collapsed file has a malformed line.
+
+Usage (from the functions/ directory):
+
+    python -m benchmarks.profiling_benchmark
+    python -m benchmarks.profiling_benchmark --invocations 50 --interval-ms 1
+"""
+import argparse
+import os
+import pstats
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from .corpora import large_pdfs
+from .ingestion_benchmark import percentile
+from .stand_ins import StaticBlobServiceClient
+
+MODES = {
+    "off": {"PROFILE_SAMPLE_RATE": "0"},
+    "sampling": {"PROFILE_SAMPLE_RATE": "1", "PROFILER": "sampling"},
+    "cprofile": {"PROFILE_SAMPLE_RATE": "1", "PROFILER": "cprofile"},
+}
+
+
+def check_profiles(blobs: Dict[str, bytes]) -> List[str]:
+    problems = []
+    for name, data in blobs.items():
+        if name.endswith(".prof"):
+            with tempfile.NamedTemporaryFile(suffix=".prof", delete=False) as f:
+                f.write(data)
+            try:
+                pstats.Stats(f.name)
+            except Exception as e:
+                problems.append(f"{name}: {e}")
+            finally:
+                os.unlink(f.name)
+        else:
+            for line in data.decode("utf-8").splitlines():
+                stack, _, count = line.rpartition(" ")
+                if not stack or not count.isdigit():
+                    problems.append(f"{name}: malformed line {line[:80]!r}")
+                    break
+    return problems
+
+
+def collapsed_total(blobs: Dict[str, bytes]) -> int:
+    return sum(int(line.rpartition(" ")[2]) for name, data in blobs.items() if name.endswith(".collapsed")
+               for line in data.decode("utf-8").splitlines())
+
+
+def run(handler: Callable[[], None], invocations: int, mode: str) -> Dict[str, float]:
+    for key in ("PROFILE_SAMPLE_RATE", "PROFILER"):
+        os.environ.pop(key, None)
+    os.environ.update(MODES[mode])
+    StaticBlobServiceClient.blobs.pop("profiles", None)
+    samples = []
+    for _ in range(invocations):
+        start = time.perf_counter()
+        handler()
+        samples.append((time.perf_counter() - start) * 1000)
+    blobs = StaticBlobServiceClient.blobs.get("profiles", {})
+    total = collapsed_total(blobs)
+    return {
+        "p50": percentile(samples, 50),
+        "bytes": sum(len(data) for data in blobs.values()) / invocations,
+        # cProfile stacks are in microseconds, sampled ones in samples
+        "coverage": total / 1000 / sum(samples) if mode == "cprofile" else
+        total * float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", 5)) / sum(samples) if mode == "sampling" else 0.0,
+        "problems": check_profiles(blobs),
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Invocation profiling overhead benchmark")
+    parser.add_argument("--invocations", type=int, default=20)
+    parser.add_argument("--interval-ms", type=int, default=5, help="PROFILE_SAMPLE_INTERVAL_MS")
+    args = parser.parse_args(argv)
+    os.environ.update({"STORAGE_CONNECTION_STRING": "UseDevelopmentStorage=true",
+                       "PROFILE_SAMPLE_INTERVAL_MS": str(args.interval_ms)})
+
+    from ingestion_function.markdown_chunker import MarkdownChunker
+    from shared import storage
+    from shared.dedup import deduplicate_chunks
+    from shared.profiling import profiled
+
+    storage.use_blob_service_client(StaticBlobServiceClient())
+    markdown = large_pdfs(count=1, pages=60)[0][2]["contents"][0]["markdown"]
+
+    @profiled("benchmark")
+    def ingest() -> None:
+        deduplicate_chunks(MarkdownChunker().create_chunks(markdown, {"id": "doc", "fileName": "doc.pdf"}))
+
+    @profiled("benchmark")
+    def noop() -> None:
+        pass
+
+    print(f"{'handler':<10}{'mode':<10}{'p50 ms':>10}{'overhead':>10}{'KB/call':>9}{'covered':>9}")
+    failed = False
+    for label, handler, invocations in (("ingest", ingest, args.invocations), ("noop", noop, args.invocations * 500)):
+        base = None
+        for mode in MODES:
+            result = run(handler, invocations, mode)
+            base = base or result["p50"]
+            overhead = result["p50"] / base - 1 if base else 0.0
+            print(f"{label:<10}{mode:<10}{result['p50']:>10.3f}{overhead:>10.1%}{result['bytes'] / 1024:>9.1f}"
+                  f"{result['coverage']:>9.0%}")
+            for problem in result["problems"][:5]:
+                print(f"  FAIL {problem}")
+            failed = failed or bool(result["problems"])
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
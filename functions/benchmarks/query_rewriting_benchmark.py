@@ -0,0 +1,132 @@
+"""Recall and latency of ``questionRewriting`` (``shared/query_rewriting.py``).
+
+Indexes the small-documents chunks in the embedded search engine and plants
+facts about made-up account codes: each code appears in several distractor
+chunks and in one chunk that answers the question. Half of the questions are
+compound and ask about two codes at once; the answering chunks of the other
+half use the plural or singular of the question's words. Reports recall@k
+(answering chunks found in the top k) and the p50/p99 latency of the plain
+search against multi-query search with fused results, with a cold and a warm
+rewrite cache. ``--latency-ms`` adds a service round trip to every search, so
+the latency shows what running the variants concurrently costs against Azure
+AI Search rather than the in-process engine.
+
+Usage (from the functions/ directory):
+
+    python -m benchmarks.query_rewriting_benchmark
+    python -m benchmarks.query_rewriting_benchmark --questions 400 --top-k 3,5,10
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+from .corpora import BENCHMARK_SCHEMA, small_documents
+from .ingestion_benchmark import percentile
+
+DISTRACTORS = 6
+TOPICS = [
+    ("renewal terms", "renewals term"),
+    ("warranty claims", "warranty claim"),
+    ("shipment delays", "shipments delay"),
+    ("license fees", "licenses fee"),
+    ("support tickets", "supports ticket"),
+    ("payment reminders", "payments reminder"),
+]
+
+
+def build_index(rng: random.Random, questions: int) -> Tuple[Any, List[Tuple[str, List[str]]]]:
+    """Index the corpus chunks with planted facts; returns the client and (question, answering chunk ids)"""
+    from ingestion_function import build_documents
+    from shared.local_search import LocalSearchClient, reset_local_indexes
+
+    reset_local_indexes()
+    chunks = []
+    for name, _, analyze_result in small_documents():
+        chunks.extend(build_documents(name, analyze_result, BENCHMARK_SCHEMA)[1])
+
+    def plant(text: str) -> str:
+        chunk = rng.choice(chunks)
+        chunk["chunk_content"] += " " + text
+        return chunk["chunk_id"]
+
+    cases = []
+    for i in range(questions):
+        facts = []
+        for part in range(2 if i % 2 == 0 else 1):
+            code = f"acct{i:04d}{part}"
+            topic, inflected = rng.choice(TOPICS)
+            for _ in range(DISTRACTORS):
+                plant(f"Account {code} was reviewed in the quarterly report.")
+            # Compound questions use the question's words; single ones their inflections
+            answer = plant(f"The {topic if i % 2 == 0 else inflected} of account {code} were settled in March.")
+            facts.append((code, topic, answer))
+        question = " and ".join(f"what are the {topic} of {code}" for code, topic, _ in facts) + "?"
+        cases.append((question, [answer for _, _, answer in facts]))
+
+    client = LocalSearchClient(index_name="chunks")
+    for start in range(0, len(chunks), 1000):
+        client.upload_documents(documents=chunks[start:start + 1000])
+    return client, cases
+
+
+class RemoteClient:
+    """A search client whose calls take ``latency`` seconds longer, like a service round trip"""
+
+    def __init__(self, client: Any, latency: float):
+        self.client = client
+        self.latency = latency
+
+    def search(self, search_text: str = None, **kwargs: Any):
+        time.sleep(self.latency)
+        return self.client.search(search_text, **kwargs)
+
+
+def run(client: Any, cases: List[Tuple[str, List[str]]], top_k: int, rewriting: bool) -> Dict[str, float]:
+    from shared.query_rewriting import multi_query_search, rewrite_query
+
+    found, total, samples = 0, 0, []
+    for question, answers in cases:
+        start = time.perf_counter()
+        queries = rewrite_query(question) if rewriting else [question]
+        results = multi_query_search(client, queries, "chunk_id", top=top_k, select="chunk_id")
+        samples.append((time.perf_counter() - start) * 1000)
+        ids = {r["chunk_id"] for r in results}
+        found += sum(answer in ids for answer in answers)
+        total += len(answers)
+    return {"recall": found / total, "p50": percentile(samples, 50), "p99": percentile(samples, 99)}
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Question rewriting recall and latency benchmark")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--top-k", default="3,5,10", help="Comma-separated topK values")
+    parser.add_argument("--variants", type=int, default=3, help="QUESTION_REWRITING_VARIANTS")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Added round trip per search")
+    parser.add_argument("--seed", type=int, default=47)
+    args = parser.parse_args(argv)
+    os.environ["QUESTION_REWRITING_VARIANTS"] = str(args.variants)
+    os.environ.pop("LOCAL_SEARCH_PATH", None)
+
+    from shared.query_rewriting import clear_rewrite_cache
+
+    client, cases = build_index(random.Random(args.seed), args.questions)
+    print(f"{len(cases)} questions over {client.get_document_count()} chunks, {args.variants} variants, "
+          f"{args.latency_ms:g} ms per search")
+    client = RemoteClient(client, args.latency_ms / 1000)
+    print(f"{'variant':<26}{'recall':>8}{'p50 ms':>9}{'p99 ms':>9}")
+    for top_k in (int(k) for k in args.top_k.split(",") if k):
+        single = run(client, cases, top_k, rewriting=False)
+        clear_rewrite_cache()
+        cold = run(client, cases, top_k, rewriting=True)
+        warm = run(client, cases, top_k, rewriting=True)
+        for label, result in ((f"single topK={top_k}", single), (f"rewritten topK={top_k}", cold),
+                              ("  warm cache", warm)):
+            print(f"{label:<26}{result['recall']:>8.1%}{result['p50']:>9.2f}{result['p99']:>9.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""Goodput of downstream calls under throttling (``shared/rate_limits.py``).
+
+A synthetic service admits ``--capacity`` requests per second and answers the
+rest with 429 and a ``Retry-After``; during a storm (``--storm``) it throttles
+everything. Rejecting a request costs it ``--reject-cost`` of an admitted one,
+so a flood of retries eats into the capacity left for real work. Worker threads, split over ``--instances`` simulated function
+instances, call it until ``--duration`` runs out with three strategies:
+
+- ``immediate``: retry a 429 straight away, as callers without a policy do
+- ``retry-after``: each caller sleeps for the ``Retry-After`` it got
+- ``limiter``: one ``RateLimiter`` per instance with ``capacity / instances``
+  requests per second, whose pause holds every caller of the instance
+
+It reports goodput (successful calls per second), the 429s the service sent
+and the share of calls that were wasted on them.
+
+Before that it checks the limiter against a storm and exits 1 when
+
+- ``call`` retries a 429 before its ``Retry-After`` has passed
+- other callers of the same limiter send requests while it is paused
+- an Azure SDK pipeline built with ``sdk_options`` does not retry a throttled
+  POST (the SDK's own policy retries one only when it carries
+  ``Retry-After``), or retries it before its ``Retry-After``
+
+Usage (from the functions/ directory):
+
+    python -m benchmarks.rate_limit_benchmark
+    python -m benchmarks.rate_limit_benchmark --capacity 20 --workers 32 --storm 1:3
+    python -m benchmarks.rate_limit_benchmark --strategies ""   # checks only
+"""
+import argparse
+import logging
+import math
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from shared.rate_limits import THROTTLED_STATUS_CODES, RateLimiter, retry_after_seconds
+
+STRATEGIES = ("immediate", "retry-after", "limiter")
+
+
+class Response:
+    def __init__(self, status_code: int, headers: Optional[Dict[str, str]] = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class ThrottlingService:
+    """Admits ``capacity`` requests per second; throttles the rest and everything during a storm"""
+
+    def __init__(self, capacity: float, latency: float, storm: Optional[Tuple[float, float]] = None,
+                 reject_cost: float = 0.0):
+        self.capacity = capacity
+        self.burst = max(1.0, capacity / 10)
+        self.latency = latency
+        self.storm = storm
+        self.reject_cost = reject_cost
+        self.started = self._updated = time.monotonic()
+        self._tokens = self.burst
+        self.counts = {"calls": 0, "throttled": 0}
+        self._lock = threading.Lock()
+
+    def request(self) -> Response:
+        with self._lock:
+            now = time.monotonic()
+            self.counts["calls"] += 1
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.capacity)
+            self._updated = now
+            if self.storm and self.storm[0] <= now - self.started < self.storm[1]:
+                return self._throttled(self.storm[1] - (now - self.started))
+            if self._tokens < 1:
+                # Rejecting costs capacity too, up to a second's worth of debt
+                self._tokens = max(-self.capacity, self._tokens - self.reject_cost)
+                return self._throttled((1 - self._tokens) / self.capacity)
+            self._tokens -= 1
+        time.sleep(self.latency)
+        return Response(200)
+
+    def _throttled(self, retry_after: float) -> Response:
+        self.counts["throttled"] += 1
+        # Rounded up, so a caller that waits exactly this long is past the storm
+        return Response(429, {"retry-after-ms": str(max(1, math.ceil(retry_after * 1000)))})
+
+
+def immediate(service: ThrottlingService, deadline: float) -> Callable[[], Response]:
+    def call() -> Response:
+        response = service.request()
+        while response.status_code in THROTTLED_STATUS_CODES and time.monotonic() < deadline:
+            time.sleep(0.001)
+            response = service.request()
+        return response
+    return call
+
+
+def retry_after(service: ThrottlingService, deadline: float) -> Callable[[], Response]:
+    def call() -> Response:
+        response = service.request()
+        while response.status_code in THROTTLED_STATUS_CODES and time.monotonic() < deadline:
+            time.sleep(retry_after_seconds(response))
+            response = service.request()
+        return response
+    return call
+
+
+def check_storm(storm_seconds: float = 0.3, callers: int = 4) -> List[str]:
+    """Problems of the limiter in a storm of ``storm_seconds`` that throttles with Retry-After to its end"""
+    problems = []
+    service = ThrottlingService(1000, 0, (0, storm_seconds))
+    limiter = RateLimiter("check", 0, 0)
+    response = limiter.call(service.request)
+    elapsed = time.monotonic() - service.started
+    if response.status_code != 200 or service.counts["throttled"] != 1 or elapsed < storm_seconds:
+        problems.append(f"call: {service.counts['throttled']} 429s and HTTP {response.status_code} after "
+                        f"{elapsed:.2f}s, expected one 429 and HTTP 200 after Retry-After ({storm_seconds}s)")
+
+    # The first caller's 429 pauses the limiter; the others must wait it out instead of meeting the storm
+    service = ThrottlingService(1000, 0, (0, storm_seconds))
+    limiter = RateLimiter("check", 0, 0)
+    statuses: List[int] = []
+    first = threading.Thread(target=lambda: statuses.append(limiter.call(service.request).status_code))
+    first.start()
+    time.sleep(storm_seconds / 6)
+    others = [threading.Thread(target=lambda: statuses.append(limiter.call(service.request).status_code))
+              for _ in range(callers - 1)]
+    for thread in others:
+        thread.start()
+    for thread in [first] + others:
+        thread.join()
+    if service.counts["throttled"] != 1 or statuses != [200] * callers:
+        problems.append(f"pause: {callers} callers met {service.counts['throttled']} 429s, expected 1")
+    return problems
+
+
+def check_sdk_post(retry_after: float = 0.2) -> List[str]:
+    """Problems of an Azure SDK pipeline with ``sdk_options`` on a POST answered 429, 429 with Retry-After, 200"""
+    from azure.core import PipelineClient
+    from azure.core.pipeline.policies import CustomHookPolicy
+    from azure.core.pipeline.transport import HttpResponse, HttpTransport
+    from azure.core.rest import HttpRequest
+
+    class StormTransport(HttpTransport):
+        def __init__(self) -> None:
+            self.sent: List[float] = []
+
+        def __enter__(self) -> "StormTransport":
+            return self
+
+        def __exit__(self, *args: Any) -> None:
+            pass
+
+        def open(self) -> None:
+            pass
+
+        def close(self) -> None:
+            pass
+
+        def send(self, request: Any, **kwargs: Any) -> Any:
+            self.sent.append(time.monotonic())
+            response = HttpResponse(request, None)
+            response.status_code = 429 if len(self.sent) < 3 else 200
+            response.headers = {"Retry-After": str(retry_after)} if len(self.sent) == 2 else {}
+            response.reason, response.content_type = "", None
+            return response
+
+    limiter = RateLimiter("check", 0, 0)
+    options = limiter.sdk_options()
+    transport = StormTransport()
+    client = PipelineClient("https://service", transport=transport, policies=[
+        options["retry_policy"],
+        CustomHookPolicy(raw_request_hook=options["raw_request_hook"], raw_response_hook=options["raw_response_hook"]),
+    ])
+    status = client.send_request(HttpRequest("POST", "https://service/search")).status_code
+    gaps = [later - earlier for earlier, later in zip(transport.sent, transport.sent[1:])]
+    problems = []
+    if status != 200 or len(transport.sent) != 3:
+        problems.append(f"sdk: throttled POST ended with HTTP {status} after {len(transport.sent)} attempts, expected 3")
+    elif gaps[1] < retry_after:
+        problems.append(f"sdk: POST retried after {gaps[1]:.2f}s, before Retry-After ({retry_after}s)")
+    if limiter.counters["throttled"] != 2:
+        problems.append(f"sdk: limiter saw {limiter.counters['throttled']} of 2 throttled responses")
+    return problems
+
+
+def run(strategy: str, args: argparse.Namespace) -> Dict[str, Any]:
+    service = ThrottlingService(args.capacity, args.latency_ms / 1000, args.storm, args.reject_cost)
+    limiters = [RateLimiter("benchmark", args.capacity / args.instances, 0) for _ in range(args.instances)]
+    deadline = time.monotonic() + args.duration
+    successes = [0] * args.workers
+
+    def worker(i: int) -> None:
+        if strategy == "limiter":
+            limiter = limiters[i % args.instances]
+            call = lambda: limiter.call(service.request, max_retries=3)
+        else:
+            call = (immediate if strategy == "immediate" else retry_after)(service, deadline)
+        while time.monotonic() < deadline:
+            if call().status_code == 200:
+                successes[i] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.workers)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    calls = service.counts["calls"]
+    return {
+        "goodput": sum(successes) / elapsed,
+        "calls": calls,
+        "throttled": service.counts["throttled"],
+        "wasted": service.counts["throttled"] / calls if calls else 0.0,
+    }
+
+
+def parse_storm(value: str) -> Optional[Tuple[float, float]]:
+    if not value:
+        return None
+    start, end = (float(v) for v in value.split(":"))
+    return start, end
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Rate limiter goodput benchmark")
+    parser.add_argument("--capacity", type=float, default=50, help="Requests/sec the service admits")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--instances", type=int, default=2, help="Instances the workers are split over")
+    parser.add_argument("--duration", type=float, default=4.0, help="Seconds per strategy")
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--reject-cost", type=float, default=0.02, help="Capacity a 429 costs, relative to a request")
+    parser.add_argument("--storm", type=parse_storm, default="1:2", help="start:end seconds of full throttling; empty for none")
+    parser.add_argument("--strategies", default=",".join(STRATEGIES))
+    args = parser.parse_args(argv)
+    # The limiter logs every throttled response
+    logging.disable(logging.WARNING)
+
+    problems = check_storm() + check_sdk_post()
+    for problem in problems:
+        print(f"FAIL {problem}")
+    if not problems:
+        print("Limiter honours Retry-After, pauses other callers and retries throttled SDK POSTs")
+
+    ideal = args.capacity * (args.duration - (args.storm[1] - args.storm[0] if args.storm else 0)) / args.duration
+    print(f"capacity {args.capacity:g} req/s, {args.workers} workers on {args.instances} instances, "
+          f"storm {args.storm or '-'}; capacity-bound goodput ~{ideal:.1f} req/s")
+    print(f"{'strategy':<14}{'goodput/s':>10}{'calls':>9}{'429s':>9}{'wasted':>9}")
+    for strategy in (s for s in args.strategies.split(",") if s):
+        result = run(strategy, args)
+        print(f"{strategy:<14}{result['goodput']:>10.1f}{result['calls']:>9}{result['throttled']:>9}{result['wasted']:>9.1%}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""Tool payload size and recall with the relevance cut (``shared/relevance.py``).
+
+Searches the planted-facts index of the question rewriting benchmark and
+formats results like ArtifactChunk does, with and without the elbow cut, and
+reports the average results and bytes per tool message next to recall@k. The
+reranker-score cutoff needs Azure AI Search semantic ranking and is not
+exercised here.
+
+Usage (from the functions/ directory):
+
+    python -m benchmarks.relevance_benchmark
+    python -m benchmarks.relevance_benchmark --top-k 5,10,20 --min-gap 0.3,0.5
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from typing import List
+
+from shared.relevance import relevance_cut, relevance_settings
+from shared.snippets import build_snippet, query_terms, snippet_budget
+
+from .query_rewriting_benchmark import build_index
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Relevance cut payload benchmark")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--top-k", default="5,10,20", help="Comma-separated topK values")
+    parser.add_argument("--min-gap", default="0.4", help="Comma-separated SEARCH_ELBOW_MIN_GAP values")
+    parser.add_argument("--seed", type=int, default=48)
+    args = parser.parse_args(argv)
+    os.environ.pop("LOCAL_SEARCH_PATH", None)
+
+    client, cases = build_index(random.Random(args.seed), args.questions)
+    print(f"{len(cases)} questions over {client.get_document_count()} chunks")
+    print(f"{'variant':<24}{'results':>9}{'bytes':>9}{'recall':>9}")
+    for top_k in (int(k) for k in args.top_k.split(",") if k):
+        variants = [("no cut", None)] + [(f"elbow gap={g}", float(g)) for g in args.min_gap.split(",") if g]
+        for label, gap in variants:
+            settings = {**relevance_settings(), "elbow": gap is not None, "elbow_min_gap": gap or 0.0}
+            results_total, bytes_total, found, total = 0, 0, 0, 0
+            for question, answers in cases:
+                results = list(client.search(search_text=question, top=top_k))
+                results = relevance_cut(results, settings=settings)
+                budget, terms = snippet_budget(top_k), query_terms(question)
+                docs = [{"id": r["chunk_id"], "content": build_snippet(r["chunk_content"], budget, terms=terms),
+                         "score": r["@search.score"]} for r in results]
+                results_total += len(docs)
+                bytes_total += len(json.dumps(docs).encode("utf-8"))
+                found += sum(answer in {d["id"] for d in docs} for answer in answers)
+                total += len(answers)
+            print(f"{f'{label} topK={top_k}':<24}{results_total / len(cases):>9.1f}"
+                  f"{bytes_total / len(cases):>9.0f}{found / total:>9.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
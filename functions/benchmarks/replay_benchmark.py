@@ -0,0 +1,71 @@
+"""Throughput of replaying archived analysis results (``scripts/replay_analysis.py``).
+
+Writes the archives of a benchmark corpus to a temporary directory, as
+ingestion would have stored them, and replays them into the in-memory sink
+with each worker count.
+
+Usage (from the functions/ directory):
+
+    python -m benchmarks.replay_benchmark
+    python -m benchmarks.replay_benchmark --corpus large-pdf --copies 20 --workers 1,4,8
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from typing import List
+
+from scripts.replay_analysis import ARCHIVE_SUFFIX, replay
+from shared.analysis_store import encode_analysis
+
+from .corpora import BENCHMARK_SCHEMA, CORPORA
+
+
+def export_archives(corpus: str, copies: int, path: str) -> int:
+    """Write ``copies`` archives of every corpus document; returns the file count"""
+    count = 0
+    for name, _, analyze_result in CORPORA[corpus]():
+        data = encode_analysis(analyze_result)
+        base = name.split("/")[-1]
+        for copy in range(copies):
+            with open(os.path.join(path, f"{copy:04d}-{base}{ARCHIVE_SUFFIX}"), "wb") as f:
+                f.write(data)
+            count += 1
+    return count
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay throughput benchmark")
+    parser.add_argument("--corpus", default="small-documents", choices=list(CORPORA))
+    parser.add_argument("--copies", type=int, default=5, help="Archives written per corpus document")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="Comma-separated worker counts")
+    parser.add_argument("--json", help="Write the raw results to this file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as path:
+        files = export_archives(args.corpus, args.copies, path)
+        print(f"Exported {files} archives of {args.corpus}")
+        for workers in sorted({int(w) for w in args.workers.split(",") if w}):
+            totals = replay(path, BENCHMARK_SCHEMA, {"artifacts": {"name": "artifacts", "fields": None},
+                                                     "chunks": {"name": "chunks", "fields": None}},
+                            workers=workers, search="sink", progress_interval=float("inf"))
+            results[workers] = {
+                "files_per_sec": round(totals["files"] / totals["elapsed_s"], 1),
+                "chunks_per_sec": round(totals["chunks"] / totals["elapsed_s"], 1),
+                "elapsed_s": totals["elapsed_s"],
+                "failed": len(totals["failed"]),
+            }
+
+    print(f"\n{'workers':>8}{'files/s':>10}{'chunks/s':>12}{'elapsed s':>11}")
+    for workers, result in results.items():
+        print(f"{workers:>8}{result['files_per_sec']:>10}{result['chunks_per_sec']:>12}{result['elapsed_s']:>11}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Microbenchmark of schema field extraction (``shared/schema_plan.py``).
+
+Compares the compiled plan against the previous per-field loop of
+``process_content_item`` on content items with many fields and table rows.
+
+Usage (from the functions/ directory):
+
+    python -m benchmarks.schema_plan_benchmark
+    python -m benchmarks.schema_plan_benchmark --fields 60 --rows 500
+"""
+import argparse
+import random
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+from shared.schema_plan import compile_schema
+
+from .ingestion_benchmark import percentile
+
+
+def legacy_extract(fields: Dict[str, Any], schema_json: Dict[str, Any]) -> Dict[str, Any]:
+    """The extraction loop ``process_content_item`` used before the plan"""
+    content_metadata = {}
+    for k, v in fields.items():
+        if isinstance(v, dict):
+            if v.get("type") == "array":
+                content_metadata[k] = [
+                    item.get("valueString", "")
+                    for item in v.get("valueArray", [])
+                ] or []
+            else:
+                content_metadata[k] = v.get("valueString", "")
+        else:
+            content_metadata[k] = v
+    doc = {}
+    for k, v in content_metadata.items():
+        if k in [f["name"] for f in schema_json.get("fields", [])]:
+            doc[k] = v
+    return doc
+
+
+def make_schema_and_item(field_count: int, tables: int, rows: int, seed: int = 32) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    rng = random.Random(seed)
+    schema_fields: List[Dict[str, Any]] = []
+    item_fields: Dict[str, Any] = {}
+    kinds = ["string", "number", "date", "array"]
+    for i in range(field_count):
+        kind = kinds[i % len(kinds)]
+        name = f"{kind}Field{i}"
+        schema_fields.append({"name": name, "type": kind, "description": f"Field {i}"})
+        if kind == "string":
+            item_fields[name] = {"type": "string", "valueString": f"value {rng.randint(0, 9999)}"}
+        elif kind == "number":
+            item_fields[name] = {"type": "number", "valueNumber": rng.random() * 1000}
+        elif kind == "date":
+            item_fields[name] = {"type": "date", "valueDate": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"}
+        else:
+            item_fields[name] = {"type": "array", "valueArray": [
+                {"type": "string", "valueString": f"tag{rng.randint(0, 50)}"} for _ in range(rng.randint(1, 8))
+            ]}
+    for t in range(tables):
+        name = f"table{t}"
+        subfields = [f"col{c}" for c in range(5)]
+        schema_fields.append({"name": name, "type": "table", "fields": [{"name": s} for s in subfields]})
+        item_fields[name] = {"type": "array", "valueArray": [
+            {"type": "object", "valueObject": {
+                s: ({"type": "number", "valueNumber": rng.random() * 100} if c % 2 else
+                    {"type": "string", "valueString": f"cell {rng.randint(0, 999)}"})
+                for c, s in enumerate(subfields)
+            }}
+            for _ in range(rows)
+        ]}
+    # Content Understanding also returns fields that are not in the schema
+    for i in range(field_count // 4):
+        item_fields[f"extra{i}"] = {"type": "string", "valueString": "ignored"}
+    return {"fields": schema_fields}, item_fields
+
+
+def _measure(fn, iterations: int) -> List[float]:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Schema extraction microbenchmark")
+    parser.add_argument("--fields", type=int, default=40, help="Scalar and array fields in the schema")
+    parser.add_argument("--tables", type=int, default=3)
+    parser.add_argument("--rows", type=int, default=200, help="Rows per table")
+    parser.add_argument("--iterations", type=int, default=300)
+    args = parser.parse_args(argv)
+
+    schema_json, item_fields = make_schema_and_item(args.fields, args.tables, args.rows)
+    legacy = legacy_extract(item_fields, schema_json)
+    planned = compile_schema(schema_json).extract(item_fields)
+    legacy_values = sum(len(v) if isinstance(v, list) else v not in ("", None) for v in legacy.values())
+    plan_values = sum(len(v) if isinstance(v, list) else v is not None for v in planned.values())
+
+    cases = {
+        "legacy loop": lambda: legacy_extract(item_fields, schema_json),
+        "plan (cached)": lambda: compile_schema(schema_json).extract(item_fields),
+    }
+    print(f"{args.fields} fields, {args.tables} tables x {args.rows} rows, {args.iterations} iterations")
+    print(f"values kept: legacy {legacy_values}, plan {plan_values} "
+          f"({len(planned)} columns incl. numbers, dates and flattened table cells)")
+    print(f"{'case':<16}{'p50 us':>10}{'p99 us':>10}")
+    for name, fn in cases.items():
+        samples = _measure(fn, args.iterations)
+        print(f"{name:<16}{percentile(samples, 50):>10.1f}{percentile(samples, 99):>10.1f}")
+
+    # Scalar-only schema: the case where both produce the same columns
+    schema_json, item_fields = make_schema_and_item(args.fields, 0, 0)
+    for name, fn in {
+        "legacy scalars": lambda: legacy_extract(item_fields, schema_json),
+        "plan scalars": lambda: compile_schema(schema_json).extract(item_fields),
+    }.items():
+        samples = _measure(fn, args.iterations)
+        print(f"{name:<16}{percentile(samples, 50):>10.1f}{percentile(samples, 99):>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
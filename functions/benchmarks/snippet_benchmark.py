@@ -0,0 +1,63 @@
+"""Evidence coverage of tool snippets (``shared/snippets.py``).
+
+Plants a known passage at a random depth in the large-pdf corpus documents,
+queries for words from it, and checks whether the passage is visible in what
+the tools would return: the previous 1000-character prefix, or a snippet with
+the per-result budget for each ``topK``. Also reports the time per snippet.
+
+Usage (from the functions/ directory):
+
+    python -m benchmarks.snippet_benchmark
+    python -m benchmarks.snippet_benchmark --queries 500 --top-k 3,10,50
+"""
+import argparse
+import random
+import sys
+import time
+from typing import List
+
+from shared.snippets import build_snippet, query_terms, snippet_budget
+
+from .corpora import large_pdfs
+from .ingestion_benchmark import percentile
+
+LEGACY_PREFIX_CHARS = 1000
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Snippet evidence coverage benchmark")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", default="1,5,10,50", help="Comma-separated topK values")
+    parser.add_argument("--seed", type=int, default=36)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    documents = [item["markdown"] for _, _, result in large_pdfs() for item in result["contents"]]
+    cases = []
+    for i in range(args.queries):
+        content = rng.choice(documents)
+        depth = rng.randrange(len(content))
+        depth = content.rfind(" ", 0, depth) + 1
+        passage = f"invoice{i} settlement reference code{i}"
+        cases.append((content[:depth] + passage + " " + content[depth:], passage, f"invoice{i} code{i}"))
+
+    legacy_hits = sum(passage in content[:LEGACY_PREFIX_CHARS] for content, passage, _ in cases)
+    print(f"{len(cases)} queries over {len(documents)} documents "
+          f"(avg {sum(len(c) for c, _, _ in cases) // len(cases)} chars)")
+    print(f"{'variant':<22}{'chars':>8}{'hit rate':>10}{'p50 us':>10}{'p99 us':>10}")
+    print(f"{'prefix (before)':<22}{LEGACY_PREFIX_CHARS:>8}{legacy_hits / len(cases):>10.1%}{'-':>10}{'-':>10}")
+    for top_k in (int(k) for k in args.top_k.split(",") if k):
+        budget = snippet_budget(top_k)
+        hits, samples = 0, []
+        for content, passage, query in cases:
+            start = time.perf_counter()
+            snippet = build_snippet(content, budget, terms=query_terms(query))
+            samples.append((time.perf_counter() - start) * 1e6)
+            hits += passage in snippet
+        print(f"{f'snippet topK={top_k}':<22}{budget:>8}{hits / len(cases):>10.1%}"
+              f"{percentile(samples, 50):>10.1f}{percentile(samples, 99):>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import json
+import threading
+from typing import Dict, Any, List
+
+from azure.core.exceptions import ResourceNotFoundError
+
+
+class BenchmarkInputStream:
+    """Minimal stand-in for ``func.InputStream`` as used by the blob trigger"""
+
+    def __init__(self, name: str, content: bytes):
+        self.name = name
+        self.length = len(content)
+        self._content = content
+
+    def read(self, size: int = -1) -> bytes:
+        return self._content
+
+
+class InMemorySearchSink:
+    """Records uploads instead of sending them to Azure AI Search.
+
+    Constructed with the same arguments as ``SearchClient`` so it can replace
+    it in ``ingestion_function``. Documents are shared per index name.
+    """
+
+    indexes: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    upload_calls: Dict[str, int] = {}
+    uploaded_bytes: Dict[str, int] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, endpoint: str = "", index_name: str = "", credential: Any = None, **kwargs):
+        self.index_name = index_name
+
+    @classmethod
+    def reset(cls) -> None:
+        with cls._lock:
+            cls.indexes = {}
+            cls.upload_calls = {}
+            cls.uploaded_bytes = {}
+
+    @classmethod
+    def count(cls, index_name: str) -> int:
+        return len(cls.indexes.get(index_name, {}))
+
+    def upload_documents(self, documents: List[Dict[str, Any]], **kwargs) -> List[Dict[str, Any]]:
+        key_field = "chunk_id" if self.index_name.startswith("chunks") else "id"
+        # Serialize the batch like the real client does before sending it
+        payload = json.dumps({"value": documents})
+        with self._lock:
+            index = self.indexes.setdefault(self.index_name, {})
+            self.upload_calls[self.index_name] = self.upload_calls.get(self.index_name, 0) + 1
+            self.uploaded_bytes[self.index_name] = self.uploaded_bytes.get(self.index_name, 0) + len(payload)
+            for doc in documents:
+                index[doc[key_field]] = dict(doc)
+        return [{"key": doc[key_field], "succeeded": True, "status_code": 201} for doc in documents]
+
+    def search(self, search_text: str = None, **kwargs) -> List[Dict[str, Any]]:
+        """Uploads are only recorded, so queries (e.g. duplicate lookups) match nothing"""
+        return []
+
+
+class _StaticBlob:
+    def __init__(self, blobs: Dict[str, bytes], name: str):
+        self._blobs = blobs
+        self._name = name
+
+    def download_blob(self):
+        if self._name not in self._blobs:
+            raise ResourceNotFoundError(f"Blob {self._name} not found")
+        return self
+
+    def readall(self) -> bytes:
+        return self._blobs[self._name]
+
+    def exists(self) -> bool:
+        return self._name in self._blobs
+
+    def upload_blob(self, data, overwrite: bool = False, **kwargs) -> None:
+        self._blobs[self._name] = data.encode("utf-8") if isinstance(data, str) else bytes(data)
+
+    def delete_blob(self, **kwargs) -> None:
+        if self._blobs.pop(self._name, None) is None:
+            raise ResourceNotFoundError(f"Blob {self._name} not found")
+
+
+class _StaticContainer:
+    def __init__(self, blobs: Dict[str, bytes]):
+        self._blobs = blobs
+
+    def get_blob_client(self, name: str) -> _StaticBlob:
+        return _StaticBlob(self._blobs, name)
+
+    def upload_blob(self, name: str, data, overwrite: bool = False, **kwargs) -> None:
+        self.get_blob_client(name).upload_blob(data, overwrite=overwrite)
+
+    def delete_blob(self, name: str, **kwargs) -> None:
+        self.get_blob_client(name).delete_blob()
+
+
+class StaticBlobServiceClient:
+    """Serves blobs (e.g. ``schemas/user_config.json``) from memory and keeps uploaded ones"""
+
+    blobs: Dict[str, Dict[str, bytes]] = {}
+
+    @classmethod
+    def from_connection_string(cls, conn_str: str) -> "StaticBlobServiceClient":
+        return cls()
+
+    @classmethod
+    def set_schema(cls, schema_json: Dict[str, Any]) -> None:
+        cls.blobs.setdefault("schemas", {})["user_config.json"] = json.dumps(schema_json).encode("utf-8")
+
+    def get_container_client(self, container_name: str) -> _StaticContainer:
+        return _StaticContainer(self.blobs.setdefault(container_name, {}))
@@ -0,0 +1,166 @@
+"""Recall and latency of vector index profiles on a local corpus.
+
+Builds each profile with the same in-process indexes the local search backend
+uses (``shared.vector_index``) and compares its top-k against exact float32
+search over the full-width vectors.
+
+Usage (from the functions/ directory):
+
+    python -m benchmarks.vector_profile_benchmark
+    python -m benchmarks.vector_profile_benchmark --size 2000 --dims 256 --k 10
+    python -m benchmarks.vector_profile_benchmark --vectors embeddings.jsonl
+
+Without ``--vectors`` the corpus is the paragraphs of the ``small-documents``
+benchmark corpus, embedded with a deterministic hashing embedder. With
+``--vectors`` each line of the file is ``{"vector": [...]}`` (e.g. real
+``chunk_contentVector`` values exported from an index); the last ``--queries``
+lines are used as queries.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+from shared.vector_index import ExhaustiveVectorIndex, RescoringVectorIndex, build_vector_index, truncate
+from shared.vector_profiles import resolve_vector_profile
+
+from .corpora import small_documents
+from .ingestion_benchmark import percentile
+
+# Name -> profile overrides; dimensions are filled in from --dims
+PROFILES = {
+    "default": {},
+    "hnsw-m8-ef100": {"m": 8, "efConstruction": 200, "efSearch": 100},
+    "exhaustive": {"algorithm": "exhaustiveKnn"},
+    "scalar": {"compression": "scalar", "oversampling": 4},
+    "scalar-no-rescore": {"compression": "scalar", "rescore": False},
+    "binary": {"compression": "binary", "oversampling": 10},
+    "narrow": {"dimensions": 0.25},
+    "narrow-scalar": {"dimensions": 0.5, "compression": "scalar", "oversampling": 4},
+}
+
+
+def _token_vector(token: str, dims: int) -> List[float]:
+    rng = random.Random(int.from_bytes(hashlib.sha256(token.encode("utf-8")).digest()[:8], "big"))
+    return [rng.gauss(0.0, 1.0) for _ in range(dims)]
+
+
+def hashing_embeddings(texts: List[str], dims: int) -> List[List[float]]:
+    """Bag-of-words random projection; similar texts get similar vectors"""
+    cache: Dict[str, List[float]] = {}
+    vectors = []
+    for text in texts:
+        vector = [0.0] * dims
+        for token in re.findall(r"\w+", text.lower()):
+            if token not in cache:
+                cache[token] = _token_vector(token, dims)
+            vector = [a + b for a, b in zip(vector, cache[token])]
+        vectors.append(vector)
+    return vectors
+
+
+def corpus_vectors(size: int, queries: int, dims: int) -> Tuple[List[List[float]], List[List[float]]]:
+    paragraphs = []
+    for _, _, analyze_result in small_documents():
+        markdown = analyze_result["contents"][0]["markdown"]
+        paragraphs.extend(p for p in markdown.split("\n\n") if len(p) > 80 and not p.startswith("<"))
+    rng = random.Random(28)
+    rng.shuffle(paragraphs)
+    if len(paragraphs) < size + queries:
+        raise ValueError(f"The corpus only has {len(paragraphs)} paragraphs")
+    # Queries are short excerpts of held-out paragraphs
+    query_texts = [" ".join(p.split()[:12]) for p in paragraphs[size:size + queries]]
+    return hashing_embeddings(paragraphs[:size], dims), hashing_embeddings(query_texts, dims)
+
+
+def file_vectors(path: str, size: int, queries: int) -> Tuple[List[List[float]], List[List[float]]]:
+    with open(path, "r", encoding="utf-8") as f:
+        vectors = [json.loads(line)["vector"] for line in f if line.strip()]
+    return vectors[:min(size, len(vectors) - queries)], vectors[-queries:]
+
+
+def benchmark_profile(
+    profile: Dict[str, Any],
+    docs: List[List[float]],
+    queries: List[List[float]],
+    truth: List[set],
+    k: int,
+) -> Dict[str, Any]:
+    dims = profile["dimensions"]
+    index = build_vector_index(profile)
+    start = time.perf_counter()
+    for slot, vector in enumerate(docs):
+        index.add(slot, truncate(vector, dims))
+    build_s = time.perf_counter() - start
+
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        hits = index.search(truncate(query, dims), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(expected & {slot for slot, _ in hits}) / len(expected))
+
+    codec = (index.inner if isinstance(index, RescoringVectorIndex) else index).codec
+    return {
+        "recall": round(sum(recalls) / len(recalls), 4),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "build_s": round(build_s, 2),
+        "bytes_per_vector": codec.bytes_per_vector(dims),
+        "stored_bytes_per_vector": 4 * dims if profile["stored"] else 0,
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Vector profile recall/latency benchmark")
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="Comma-separated profiles to run")
+    parser.add_argument("--size", type=int, default=1000, help="Number of indexed vectors")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--dims", type=int, default=128, help="Width of the generated embeddings")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--vectors", help="JSONL file with {\"vector\": [...]} per line instead of the generated corpus")
+    parser.add_argument("--json", help="Write the raw results to this file")
+    args = parser.parse_args(argv)
+
+    names = [n for n in args.profiles.split(",") if n]
+    unknown = [n for n in names if n not in PROFILES]
+    if unknown:
+        parser.error(f"Unknown profile: {', '.join(unknown)}")
+
+    if args.vectors:
+        docs, queries = file_vectors(args.vectors, args.size, args.queries)
+    else:
+        docs, queries = corpus_vectors(args.size, args.queries, args.dims)
+    dims = len(docs[0])
+
+    exact = ExhaustiveVectorIndex()
+    for slot, vector in enumerate(docs):
+        exact.add(slot, vector)
+    truth = [{slot for slot, _ in exact.search(query, args.k)} for query in queries]
+
+    print(f"{len(docs)} vectors x {dims} dims, {len(queries)} queries, recall@{args.k} vs exact float32")
+    print(f"{'profile':<20}{'dims':>6}{'recall':>8}{'p50 ms':>9}{'p99 ms':>9}{'build s':>9}{'B/vec':>7}{'stored':>8}")
+    results = {}
+    for name in names:
+        overrides = dict(PROFILES[name])
+        overrides["dimensions"] = max(2, int(dims * overrides.get("dimensions", 1)))
+        profile = resolve_vector_profile(overrides)
+        result = results[name] = benchmark_profile(profile, docs, queries, truth, args.k)
+        print(
+            f"{name:<20}{profile['dimensions']:>6}{result['recall']:>8.3f}{result['p50_ms']:>9.2f}"
+            f"{result['p99_ms']:>9.2f}{result['build_s']:>9.2f}{result['bytes_per_vector']:>7}"
+            f"{result['stored_bytes_per_vector']:>8}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
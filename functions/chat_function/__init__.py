@@ -2,42 +2,181 @@ import azure.functions as func
 import logging
 import json
 import time
+from typing import Optional, Tuple
 from .initialize_client import initialize_client
-from azure.search.documents import SearchClient
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents.models import QueryType
-from azure.storage.blob import BlobServiceClient
+from .thread_pool import new_thread_id
+from shared.context_policy import context_run_options, run_usage
+from shared.chat_leases import (
+    POLL_INTERVAL_SECONDS, Busy, Lease, acquire_run_slot, acquire_thread, message_key, previous_run, prompt_hash,
+    retry_after_from, thread_state, thread_wait_seconds
+)
+from shared.profiling import profiled
 
+ACTIVE_RUN_STATUSES = ["queued", "in_progress", "requires_action", "cancelling"]
+# A double-send joins a run in these states; a cancelling run answers nothing
+JOINABLE_RUN_STATUSES = ["queued", "in_progress", "requires_action"]
+RUN_TIMEOUT_SECONDS = 60
+
+def busy_response(error: Busy) -> func.HttpResponse:
+    """429 with Retry-After, so clients back off instead of timing out"""
+    return func.HttpResponse(
+        json.dumps({"error": str(error), "retryAfter": error.retry_after}),
+        mimetype="application/json",
+        status_code=429,
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+def settle_thread(
+    project_client, thread_id: str, thread_lease: Lease, prompt: str, wait: Optional[float] = None,
+    message_id: Optional[str] = None
+) -> Optional[str]:
+    """Wait up to ``wait`` seconds for the thread's active run, unless it answers this same request.
+
+    Returns the id of a run that already answers the request, or None when a
+    new run should start: the run of a retried ``message_id``, or without a
+    message id, the active run of the same prompt (a double-send). A prompt
+    repeated after its run ended ("yes", "more") starts a new run.
+    """
+    state = thread_lease.state
+    if not state.get("runid"):
+        return None
+    existing_run_id = previous_run(thread_lease, message_id)
+    if existing_run_id:
+        return existing_run_id
+    if state.get("status") in ACTIVE_RUN_STATUSES:
+        run = project_client.agents.get_run(thread_id=thread_id, run_id=state["runid"])
+        if not message_id and run.status in JOINABLE_RUN_STATUSES and state.get("prompt") == prompt_hash(prompt):
+            return run.id
+        deadline = time.time() + (thread_wait_seconds() if wait is None else wait)
+        while run.status in ACTIVE_RUN_STATUSES:
+            if time.time() > deadline:
+                raise Busy(f"Thread {thread_id} is still answering a previous message")
+            time.sleep(1)
+            thread_lease.renew()
+            run = project_client.agents.get_run(thread_id=thread_id, run_id=run.id)
+        thread_lease.record(status=run.status)
+    return None
+
+def joinable_run(project_client, thread_id: str, prompt: str, message_id: Optional[str] = None) -> Optional[str]:
+    """The run already answering this request, found without taking the thread's lease.
+
+    That is the run of a retried ``message_id`` or, without a message id, the
+    active run of the same prompt. The lease is held for the whole run, so a
+    double-send that waited for it would only get it once the run had ended,
+    and then start the prompt again.
+    """
+    state = thread_state(thread_id)
+    if not state.get("runid"):
+        return None
+    if message_id:
+        return state["runid"] if state.get("message") == message_key(message_id) else None
+    if state.get("status") not in JOINABLE_RUN_STATUSES or state.get("prompt") != prompt_hash(prompt):
+        return None
+    run = project_client.agents.get_run(thread_id=thread_id, run_id=state["runid"])
+    return run.id if run.status in JOINABLE_RUN_STATUSES else None
+
+def join_or_acquire_thread(
+    project_client, thread_id: str, prompt: str, message_id: Optional[str] = None
+) -> Tuple[Optional[str], Optional[Lease]]:
+    """The run to join for this request, or else the thread's lease once it is free.
+
+    While the lease is taken the thread's state is checked on every poll, so a
+    double-send sent before the first request started its run still joins it.
+    """
+    deadline = time.monotonic() + thread_wait_seconds()
+    while True:
+        run_id = joinable_run(project_client, thread_id, prompt, message_id)
+        if run_id:
+            return run_id, None
+        try:
+            return None, acquire_thread(thread_id, wait=0)
+        except Busy:
+            if time.monotonic() >= deadline:
+                raise
+        time.sleep(POLL_INTERVAL_SECONDS)
+
+def wait_for_run(project_client, thread_id: str, run, leases: Tuple[Lease, ...] = (), cancel: bool = False):
+    """Poll ``run`` until it ends, renewing ``leases``; a run still active after the timeout is cancelled if ``cancel``"""
+    start_time = time.time()
+    while run.status in ACTIVE_RUN_STATUSES:
+        if time.time() - start_time > RUN_TIMEOUT_SECONDS:
+            if cancel:
+                project_client.agents.cancel_run(thread_id=thread_id, run_id=run.id)
+            raise Exception(f"Run timed out after {RUN_TIMEOUT_SECONDS} seconds")
+
+        logging.info(f"Run status: {run.status}")
+        time.sleep(1)
+        for lease in leases:
+            lease.renew()
+        run = project_client.agents.get_run(thread_id=thread_id, run_id=run.id)
+
+    logging.info(f"Run completed with status: {run.status}")
+    return run
+
+def run_response(project_client, thread_id: str, run_id: str) -> dict:
+    """The answer of a completed run: its last assistant message and run steps"""
+    # Get messages from the thread
+    logging.info('Retrieving messages')
+    messages = project_client.agents.list_messages(thread_id=thread_id)
+
+    # Get run steps
+    logging.info('Retrieving run steps')
+    steps = project_client.agents.list_run_steps(thread_id=thread_id, run_id=run_id)
+
+    # Find the last assistant message of this run (messages are newest first)
+    assistant_messages = [
+        msg for msg in messages.data
+        if msg.role == "assistant"
+    ]
+    assistant_messages = [msg for msg in assistant_messages if getattr(msg, "run_id", None) == run_id] or assistant_messages
+
+    if not assistant_messages:
+        error_msg = "No response received from assistant"
+        logging.error(error_msg)
+        raise Exception(error_msg)
+
+    last_msg = assistant_messages[0]
+    steps_data = [json.loads(json.dumps(vars(step), default=str)) for step in steps.data]
+
+    return {
+        "role": "assistant",
+        "content": last_msg.content[0].text.value if last_msg.content else "",
+        "timestamp": last_msg.created_at.isoformat(),
+        "steps": steps_data
+    }
+
+@profiled("chat_function")
 def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Starting chat request processing')
-    
+
     try:
         req_body = req.get_json()
         prompt = req_body.get('prompt')
         thread_id = req_body.get('threadId')
-        
+        # Set by clients so a retried request is recognised
+        message_id = req_body.get('messageId')
+
         logging.info(f'Received request - Thread ID: {thread_id}, Prompt: {prompt}')
-        
+
         # Initialize client and get agent
         project_client, agent_id = initialize_client()
         logging.info(f'Initialized client with agent ID: {agent_id}')
-        
+
         if not thread_id:
             logging.info('No thread ID provided, creating new thread')
-            thread = project_client.agents.create_thread()
             return func.HttpResponse(
-                json.dumps({"threadId": thread.id}),
+                json.dumps({"threadId": new_thread_id()}),
                 mimetype="application/json",
                 status_code=200
             )
-            
+
         if not prompt:
             logging.warning('No prompt provided')
             return func.HttpResponse(
                 "Missing prompt",
                 status_code=400
             )
-            
+
         try:
             # Get or create thread
             try:
@@ -47,102 +186,83 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 logging.warning(f'Failed to get thread, creating new one: {str(e)}')
                 thread = project_client.agents.create_thread()
                 thread_id = thread.id
-            
-            # Send message
-            logging.info('Creating message')
-            message = project_client.agents.create_message(
-                thread_id=thread_id,
-                role="user",
-                content=prompt,
-            )
-            logging.info(f"Created message with ID: {message.id}")
-            
-            # Create and monitor run
-            logging.info('Creating run')
-            run = project_client.agents.create_run(
-                thread_id=thread_id,
-                assistant_id=agent_id
-            )
-            logging.info(f"Created run with ID: {run.id}")
-            
-            # Monitor run with timeout
-            start_time = time.time()
-            timeout = 60  # 30 seconds timeout
-
-            action_run = None
-            
-            while run.status in ["queued", "in_progress", "requires_action"]:
-                if time.time() - start_time > timeout:
-                    # submit timeout message to run
-                    project_client.agents.cancel_run(thread_id=thread.id, run_id=run.id)
-                    raise Exception("Run timed out after 60 seconds")
-                
-                if run.status == "requires_action":
-                    action_run = run
-                
-                # Collect tool calls if they exist
-                logging.info(f"Run status: {run.status}")
-                time.sleep(1)
-                run = project_client.agents.get_run(
-                    thread_id=thread_id,
-                    run_id=run.id
-                )
-
-            logging.info(f"Run completed with status: {run.status}")
-            
+
+            # A retry or double-send joins its run without holding the thread or a run slot
+            existing_run_id, thread_lease = join_or_acquire_thread(project_client, thread_id, prompt, message_id)
+            if existing_run_id:
+                logging.info(f'Request is already answered by run {existing_run_id}, joining it')
+                run = project_client.agents.get_run(thread_id=thread_id, run_id=existing_run_id)
+                run = wait_for_run(project_client, thread_id, run)
+            else:
+                # One run per thread: a follow-up waited for the active run to finish
+                with thread_lease:
+                    existing_run_id = settle_thread(project_client, thread_id, thread_lease, prompt, message_id=message_id)
+                    if existing_run_id:
+                        logging.info(f'Request is already answered by run {existing_run_id}, not running it again')
+                        run = project_client.agents.get_run(thread_id=thread_id, run_id=existing_run_id)
+                        run = wait_for_run(project_client, thread_id, run, (thread_lease,), cancel=True)
+                    else:
+                        with acquire_run_slot() as run_slot:
+                            # Send message
+                            logging.info('Creating message')
+                            message = project_client.agents.create_message(
+                                thread_id=thread_id,
+                                role="user",
+                                content=prompt,
+                            )
+                            logging.info(f"Created message with ID: {message.id}")
+
+                            # Create and monitor run, with the history the context policy keeps
+                            logging.info('Creating run')
+                            run_options, context_stats = context_run_options(project_client, thread_id)
+                            run = project_client.agents.create_run(
+                                thread_id=thread_id,
+                                assistant_id=agent_id,
+                                **run_options
+                            )
+                            logging.info(f"Created run with ID: {run.id}")
+                            thread_lease.record(
+                                prompt=prompt_hash(prompt), message=message_key(message_id), runid=run.id, status=run.status
+                            )
+                            run = wait_for_run(project_client, thread_id, run, (thread_lease, run_slot), cancel=True)
+                    thread_lease.record(status=run.status)
+
             if run.status == "failed":
                 error_msg = f"Run failed: {run.last_error}"
                 logging.error(error_msg)
                 raise Exception(error_msg)
-            
+
             if run.status != "completed":
                 error_msg = f"Unexpected run status: {run.status}"
                 logging.error(error_msg)
                 raise Exception(error_msg)
-            
-            # Get messages from the thread
-            logging.info('Retrieving messages')
-            messages = project_client.agents.list_messages(thread_id=thread_id)
-            
-            # Get run steps
-            logging.info('Retrieving run steps')
-            steps = project_client.agents.list_run_steps(thread_id=thread_id, run_id=run.id)
-            
-            # Find the last assistant message
-            assistant_messages = [
-                msg for msg in messages.data
-                if msg.role == "assistant"
-            ]
-            
-            if not assistant_messages:
-                error_msg = "No response received from assistant"
-                logging.error(error_msg)
-                raise Exception(error_msg)
-                
-            # last message is first message in the list
-            last_msg = assistant_messages[0]
-            steps_data = [json.loads(json.dumps(vars(step), default=str)) for step in steps.data]
-
-            response = {
-                "role": "assistant",
-                "content": last_msg.content[0].text.value if last_msg.content else "",
-                "timestamp": last_msg.created_at.isoformat(),
-                "steps": steps_data
-            }
-            
+
+            response = run_response(project_client, thread_id, run.id)
+            if not existing_run_id:
+                response["context"] = {**context_stats, **run_usage(run)}
+
             logging.info('Successfully processed chat request')
             return func.HttpResponse(
                 json.dumps(response),
                 mimetype="application/json",
                 status_code=200
             )
-            
+
+        except Busy:
+            raise
         except Exception as e:
+            # The agent service throttles too; pass its Retry-After on
+            retry_after = retry_after_from(e)
+            if retry_after is not None:
+                raise Busy(f"Agent service is throttling requests: {str(e)}", retry_after=retry_after)
             import traceback
             logging.error(traceback.format_exc())
             logging.error(f"Error during chat processing: {str(e)}")
             raise  # Re-raise to be caught by outer try-except
-            
+
+    except Busy as e:
+        logging.warning(f"Shedding chat request: {str(e)}")
+        return busy_response(e)
     except Exception as e:
         error_msg = f"Chat function error: {str(e)}"
         logging.error(error_msg)
@@ -1,23 +1,55 @@
 import logging
-import json
 import os
-from azure.storage.blob import BlobServiceClient
-from azure.ai.projects import AIProjectClient
-from azure.identity import DefaultAzureCredential
+import threading
+import time
+from shared.storage import load_user_config
+from shared.rate_limits import rate_limiter
+from shared.settings import env_number
+
+# Setup may replace the agent; instances pick up its new id within this time
+DEFAULT_AGENT_CACHE_SECONDS = 300
+
+_project_client = None
+_agent = (None, 0.0)
+_client_lock = threading.Lock()
+
+def get_project_client():
+    """The agent client of this process; its credential token and connections are reused"""
+    global _project_client
+    if _project_client is None:
+        # The agent SDK and credentials load on first use rather than at module import
+        from azure.ai.projects import AIProjectClient
+        from azure.identity import DefaultAzureCredential
+
+        with _client_lock:
+            if _project_client is None:
+                _project_client = AIProjectClient.from_connection_string(
+                    credential=DefaultAzureCredential(),
+                    conn_str=os.environ["AI_PROJECT_CONNECTION_STRING"],
+                    **rate_limiter("agents").sdk_options()
+                )
+    return _project_client
 
 def initialize_client():
-    """Initialize the agent client and create a new thread"""
-    project_client = AIProjectClient.from_connection_string(
-        credential=DefaultAzureCredential(),
-        conn_str=os.environ["AI_PROJECT_CONNECTION_STRING"]
-)
-    
+    """The agent client and the id of the configured agent, cached per process"""
+    global _agent
+    project_client = get_project_client()
+    agent_id, loaded_at = _agent
+    if agent_id and time.monotonic() - loaded_at < env_number("CHAT_AGENT_CACHE_SECONDS", DEFAULT_AGENT_CACHE_SECONDS):
+        return project_client, agent_id
+
+    agent_id = find_agent_id(project_client)
+    _agent = (agent_id, time.monotonic())
+    return project_client, agent_id
+
+def find_agent_id(project_client) -> str:
     # Get agent ID from config
-    blob_client = BlobServiceClient.from_connection_string(os.environ["STORAGE_CONNECTION_STRING"])
-    container_client = blob_client.get_container_client("schemas")
-    config_blob = container_client.get_blob_client("user_config.json")
-    schema_json = json.loads(config_blob.download_blob().readall())
+    schema_json = load_user_config()
     
+    # Setup stores the id of the agent it provisioned
+    if schema_json.get("agentId"):
+        return schema_json["agentId"]
+
     agent_name = schema_json.get("name") if isinstance(schema_json.get("name"), str) else "customAgent"
     
     # Get agents list
@@ -57,4 +89,4 @@ def initialize_client():
     if not agent_id:
         raise ValueError("Agent ID not found")
     
-    return project_client, agent_id
+    return agent_id
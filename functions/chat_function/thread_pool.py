@@ -0,0 +1,137 @@
+"""Pre-created agent threads, so a new chat does not wait for ``create_thread``.
+
+Each function process keeps up to ``CHAT_THREAD_POOL_SIZE`` empty threads.
+Taking one returns immediately and refills the pool in the background; when
+the pool is empty the thread is created on the request path as before.
+Threads older than ``CHAT_THREAD_POOL_MAX_AGE_SECONDS`` are deleted instead
+of handed out, so a chat never starts on a thread the service may have
+expired. The warm-up endpoint fills the pool and reports its hit rate.
+``CHAT_THREAD_POOL_SIZE=0`` turns pooling off.
+"""
+import collections
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from shared.settings import env_number
+from .initialize_client import get_project_client
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_MAX_AGE_SECONDS = 3600
+
+def pool_settings() -> Dict[str, float]:
+    return {
+        "size": max(0, env_number("CHAT_THREAD_POOL_SIZE", DEFAULT_POOL_SIZE, int)),
+        "max_age": max(1.0, env_number("CHAT_THREAD_POOL_MAX_AGE_SECONDS", DEFAULT_MAX_AGE_SECONDS)),
+    }
+
+class ThreadPool:
+    """Empty threads made by ``create`` and retired with ``delete``"""
+
+    def __init__(self, create: Callable[[], str], delete: Callable[[str], Any], size: int, max_age: float):
+        self.create = create
+        self.delete = delete
+        self.size = size
+        self.max_age = max_age
+        self._threads = collections.deque()
+        self._lock = threading.Lock()
+        # One fill at a time, so concurrent refills do not overshoot the size
+        self._fill_lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "created": 0, "errors": 0}
+
+    def _take_expired(self) -> List[str]:
+        with self._lock:
+            now = time.monotonic()
+            expired = [thread_id for thread_id, created_at in self._threads if now - created_at >= self.max_age]
+            self._threads = collections.deque(t for t in self._threads if now - t[1] < self.max_age)
+        return expired
+
+    def _retire(self, thread_ids: List[str]) -> None:
+        for thread_id in thread_ids:
+            self.counters["expired"] += 1
+            try:
+                self.delete(thread_id)
+            except Exception as e:
+                logging.warning(f"Could not delete expired pooled thread {thread_id}: {str(e)}")
+
+    def take(self) -> Tuple[str, bool]:
+        """A thread id for a new chat and whether it came from the pool"""
+        expired = self._take_expired()
+        with self._lock:
+            thread_id = self._threads.popleft()[0] if self._threads else None
+        hit = thread_id is not None
+        if hit:
+            self.counters["hits"] += 1
+        else:
+            self.counters["misses"] += 1
+            thread_id = self.create()
+        if self.size or expired:
+            threading.Thread(target=self._refill, args=(expired,), name="thread-pool-refill", daemon=True).start()
+        return thread_id, hit
+
+    def _refill(self, expired: List[str]) -> None:
+        self._retire(expired)
+        if self._fill_lock.acquire(blocking=False):
+            try:
+                self._fill()
+            finally:
+                self._fill_lock.release()
+
+    def fill(self) -> int:
+        """Top the pool up to its size; returns the number of threads created"""
+        self._retire(self._take_expired())
+        with self._fill_lock:
+            return self._fill()
+
+    def _fill(self) -> int:
+        created = 0
+        while len(self._threads) < self.size:
+            try:
+                thread_id = self.create()
+            except Exception as e:
+                self.counters["errors"] += 1
+                logging.warning(f"Could not pre-create a thread: {str(e)}")
+                break
+            with self._lock:
+                self._threads.append((thread_id, time.monotonic()))
+            self.counters["created"] += 1
+            created += 1
+        return created
+
+    def stats(self) -> Dict[str, Any]:
+        taken = self.counters["hits"] + self.counters["misses"]
+        return {
+            "size": self.size,
+            "available": len(self._threads),
+            **self.counters,
+            "hitRate": round(self.counters["hits"] / taken, 3) if taken else None,
+        }
+
+_pool: Optional[ThreadPool] = None
+_pool_lock = threading.Lock()
+
+def thread_pool() -> ThreadPool:
+    """The thread pool of this process, on the shared agent client"""
+    global _pool
+    if _pool is None:
+        settings = pool_settings()
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPool(
+                    create=lambda: get_project_client().agents.create_thread().id,
+                    delete=lambda thread_id: get_project_client().agents.delete_thread(thread_id),
+                    size=settings["size"],
+                    max_age=settings["max_age"],
+                )
+    return _pool
+
+def new_thread_id() -> str:
+    """A thread for a new chat, from the pool when one is ready"""
+    pool = thread_pool()
+    thread_id, hit = pool.take()
+    stats = pool.stats()
+    logging.info(
+        f"New chat thread {thread_id} ({'pooled' if hit else 'created'}); "
+        f"pool hit rate {stats['hitRate']}, {stats['available']}/{stats['size']} ready"
+    )
+    return thread_id
@@ -0,0 +1,165 @@
+import azure.functions as func
+import logging
+import json
+import time
+from typing import Any, Dict, Optional
+from chat_function import ACTIVE_RUN_STATUSES, busy_response, run_response, settle_thread
+from chat_function.initialize_client import initialize_client
+from chat_function.thread_pool import new_thread_id
+from shared.context_policy import context_run_options, run_usage
+from shared.chat_leases import (
+    Busy, acquire_run_slot, acquire_thread, attach_lease, message_key, prompt_hash, retry_after_from, thread_state
+)
+from shared.profiling import profiled
+
+# Long-poll wait of GET chat/runs/{runId}; well below the HTTP front end timeout
+DEFAULT_WAIT_SECONDS = 20
+MAX_WAIT_SECONDS = 25
+POLL_INTERVAL_SECONDS = 1
+# Submitting only waits briefly for a synchronous chat request on the same thread
+SUBMIT_THREAD_WAIT_SECONDS = 2
+
+def json_response(body: Dict[str, Any], status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> func.HttpResponse:
+    return func.HttpResponse(
+        json.dumps(body),
+        mimetype="application/json",
+        status_code=status_code,
+        headers=headers
+    )
+
+def run_slot_lease(thread_id: str, run_id: str):
+    """The admission slot held for a run, when this run is the thread's latest"""
+    state = thread_state(thread_id)
+    if state.get("runid") != run_id or not state.get("slot"):
+        return None
+    return attach_lease(state["slot"], state["slotlease"])
+
+def update_slot(thread_id: str, run_id: str, status: str) -> None:
+    """Keep the run's slot while it is active and free it once it has ended"""
+    try:
+        slot = run_slot_lease(thread_id, run_id)
+        if slot is None:
+            return
+        if status in ACTIVE_RUN_STATUSES:
+            slot.renew(force=True)
+        else:
+            slot.release()
+    except Exception as e:
+        # The slot lease expires on its own
+        logging.warning(f"Could not update run slot of {run_id}: {str(e)}")
+
+def run_status(project_client, thread_id: str, run) -> Dict[str, Any]:
+    body = {"runId": run.id, "threadId": thread_id, "status": run.status}
+    if run.status == "completed":
+        body["message"] = run_response(project_client, thread_id, run.id)
+        body["usage"] = run_usage(run)
+    elif run.status in ("failed", "expired"):
+        body["error"] = str(run.last_error)
+    return body
+
+def submit_run(req: func.HttpRequest) -> func.HttpResponse:
+    req_body = req.get_json()
+    prompt = req_body.get('prompt')
+    thread_id = req_body.get('threadId')
+    # Set by clients so a retried request is recognised
+    message_id = req_body.get('messageId')
+    if not prompt:
+        return json_response({"error": "Missing prompt"}, status_code=400)
+
+    project_client, agent_id = initialize_client()
+    if not thread_id:
+        thread_id = new_thread_id()
+        logging.info(f'Created thread {thread_id}')
+
+    with acquire_thread(thread_id, wait=SUBMIT_THREAD_WAIT_SECONDS) as thread_lease:
+        # A busy thread is reported right away; the client retries after Retry-After
+        existing_run_id = settle_thread(project_client, thread_id, thread_lease, prompt, wait=0, message_id=message_id)
+        if existing_run_id:
+            logging.info(f'Request is already answered by run {existing_run_id}, not running it again')
+            run = project_client.agents.get_run(thread_id=thread_id, run_id=existing_run_id)
+            return json_response({"threadId": thread_id, "runId": run.id, "status": run.status}, status_code=202)
+
+        run_slot = acquire_run_slot()
+        try:
+            message = project_client.agents.create_message(
+                thread_id=thread_id,
+                role="user",
+                content=prompt,
+            )
+            logging.info(f"Created message with ID: {message.id}")
+            run_options, context_stats = context_run_options(project_client, thread_id)
+            run = project_client.agents.create_run(
+                thread_id=thread_id,
+                assistant_id=agent_id,
+                **run_options
+            )
+        except Exception:
+            run_slot.release()
+            raise
+        logging.info(f"Created run with ID: {run.id}")
+        # The slot stays taken until a poll sees the run end, or its lease expires
+        thread_lease.record(
+            prompt=prompt_hash(prompt), message=message_key(message_id), runid=run.id, status=run.status,
+            slot=run_slot.name, slotlease=run_slot.lease_id
+        )
+
+    return json_response(
+        {"threadId": thread_id, "runId": run.id, "status": run.status, "context": context_stats},
+        status_code=202,
+        headers={"Location": f"/api/chat/runs/{run.id}?threadId={thread_id}"}
+    )
+
+def poll_run(req: func.HttpRequest, run_id: str, thread_id: str) -> func.HttpResponse:
+    try:
+        wait = max(0.0, min(float(req.params.get('wait', DEFAULT_WAIT_SECONDS)), MAX_WAIT_SECONDS))
+    except ValueError:
+        return json_response({"error": "wait must be a number of seconds"}, status_code=400)
+
+    project_client, _ = initialize_client()
+    deadline = time.time() + wait
+    run = project_client.agents.get_run(thread_id=thread_id, run_id=run_id)
+    while run.status in ACTIVE_RUN_STATUSES and time.time() < deadline:
+        time.sleep(POLL_INTERVAL_SECONDS)
+        run = project_client.agents.get_run(thread_id=thread_id, run_id=run_id)
+
+    update_slot(thread_id, run_id, run.status)
+    return json_response(run_status(project_client, thread_id, run))
+
+def cancel_run(run_id: str, thread_id: str) -> func.HttpResponse:
+    project_client, _ = initialize_client()
+    run = project_client.agents.get_run(thread_id=thread_id, run_id=run_id)
+    if run.status in ACTIVE_RUN_STATUSES and run.status != "cancelling":
+        logging.info(f'Cancelling run {run_id}')
+        run = project_client.agents.cancel_run(thread_id=thread_id, run_id=run_id)
+    # A cancelled run no longer counts against the concurrency cap
+    update_slot(thread_id, run_id, "cancelled")
+    return json_response({"runId": run.id, "threadId": thread_id, "status": run.status})
+
+@profiled("chat_runs_function")
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    run_id = req.route_params.get('runId')
+    logging.info(f'Chat runs request: {req.method} {run_id or ""}')
+
+    try:
+        if req.method == "POST" and not run_id:
+            return submit_run(req)
+
+        thread_id = req.params.get('threadId')
+        if not run_id or not thread_id:
+            return json_response({"error": "Missing runId or threadId"}, status_code=400)
+        if req.method == "GET":
+            return poll_run(req, run_id, thread_id)
+        if req.method == "DELETE":
+            return cancel_run(run_id, thread_id)
+        return json_response({"error": f"Method {req.method} not allowed"}, status_code=405)
+
+    except Busy as e:
+        logging.warning(f"Shedding chat run request: {str(e)}")
+        return busy_response(e)
+    except Exception as e:
+        retry_after = retry_after_from(e)
+        if retry_after is not None:
+            return busy_response(Busy(f"Agent service is throttling requests: {str(e)}", retry_after=retry_after))
+        error_msg = f"Chat runs function error: {str(e)}"
+        logging.error(error_msg)
+        return json_response({"error": error_msg}, status_code=500)
@@ -1,20 +1,17 @@
 import azure.functions as func
 import logging
 import json
-from chat_function.initialize_client import initialize_client
+from chat_function.thread_pool import new_thread_id
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Creating new chat thread')
     
     try:
-        # Initialize client
-        project_client, agent_id = initialize_client()
-        
-        # Create new thread
-        thread = project_client.agents.create_thread()
+        # Pre-created by the warm-up or an earlier request; neither config nor agent is needed
+        thread_id = new_thread_id()
         
         return func.HttpResponse(
-            json.dumps({"threadId": thread.id}),
+            json.dumps({"threadId": thread_id}),
             mimetype="application/json",
             status_code=200
         )
@@ -1,8 +1,7 @@
 import azure.functions as func
 import logging
-import os
-from azure.storage.blob import BlobServiceClient
 import mimetypes
+from shared.storage import blob_service_client
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Processing get file request')
@@ -14,8 +13,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             return func.HttpResponse("Filename not provided", status_code=400)
 
         # Get blob storage connection
-        blob_conn_str = os.environ["STORAGE_CONNECTION_STRING"]
-        blob_client = BlobServiceClient.from_connection_string(blob_conn_str)
+        blob_client = blob_service_client()
         
         # Get container client
         container = blob_client.get_container_client("files")
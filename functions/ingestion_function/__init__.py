@@ -1,15 +1,28 @@
 import azure.functions as func
 import logging
-import json
-import os
-from azure.storage.blob import BlobServiceClient
 from .markdown_chunker import MarkdownChunker
 from .audio_chunker import AudioTranscriptChunker 
 from .content_understanding_utils import analyze_file
-from azure.search.documents import SearchClient
-from azure.core.credentials import AzureKeyCredential
+from shared.search_clients import get_search_client
+from shared.schema_plan import compile_schema
+from shared.analysis_store import ANALYSIS_CONTAINER, load_analysis, save_analysis
+from shared.ingestion_checkpoints import (
+    PERMANENT_ERRORS, STAGES, UnprocessableContent, clear_checkpoint, clear_dead_letter, complete_stage,
+    content_hash, dead_letter, load_checkpoint, load_dead_letter, load_documents, max_attempts, save_checkpoint,
+    save_documents, schema_hash
+)
+from shared.storage import container_client, load_user_config
+from shared.index_versions import get_index_versions, project_document, write_indexes
+from shared.dedup import deduplicate_chunks, search_lookup
+from shared.profiling import profiled
 from datetime import datetime
 import base64
+import time
+
+UPLOAD_BATCH_SIZE = 1000
+FILES_CONTAINER = "files"
+# Blob metadata (keys are lower case) a backfill sets on files it already ingested
+INGESTED_METADATA = "ingestedhash"
 
 def sanitize_document_id(id_str: str) -> str:
     """Convert a string to a valid document key using URL-safe Base64 encoding"""
@@ -20,25 +33,6 @@ def process_content_item(content_item: dict, metadata: dict, schema_json: dict)
     """Process a single content item and return artifact doc and chunks"""
     content_kind = content_item.get("kind", "document")
     
-    # Extract fields and their values from content item
-    fields = content_item.get("fields", {})
-    content_metadata = {
-        **metadata
-    }
-    
-    # Extract values from fields, handling complex field structures
-    for k, v in fields.items():
-        if isinstance(v, dict):
-            if v.get("type") == "array":
-                content_metadata[k] = [
-                    item.get("valueString", "") 
-                    for item in v.get("valueArray", [])
-                ] or []
-            else:
-                content_metadata[k] = v.get("valueString", "")
-        else:
-            content_metadata[k] = v
-
     # Create artifact document with correct field names (no chunk prefix)
     artifact_doc = {
         "id": metadata["id"],  # Use id for artifacts
@@ -48,21 +42,22 @@ def process_content_item(content_item: dict, metadata: dict, schema_json: dict)
         "fileName": metadata["fileName"]
     }
     
-    # Add schema-defined fields
-    for k, v in content_metadata.items():
-        if k in [f["name"] for f in schema_json.get("fields", [])]:
-            artifact_doc[k] = v
+    # Add schema-defined fields, typed and flattened by the compiled plan
+    plan = compile_schema(schema_json)
+    field_values = plan.extract(content_item.get("fields", {}))
+    artifact_doc.update(field_values)
     
-    # Create chunks
+    # Create chunks carrying the same values as chunk_<field> columns
+    chunk_fields = plan.chunk_values(field_values)
     chunks = []
     if content_kind == "audioVisual":
         chunker = AudioTranscriptChunker()
         markdown_content = content_item.get("markdown", "")
-        chunks = chunker.create_chunks(markdown_content, metadata)
+        chunks = chunker.create_chunks(markdown_content, metadata, chunk_fields)
     else:
         chunker = MarkdownChunker()
         markdown_content = content_item.get("markdown", "")
-        chunks = chunker.create_chunks(markdown_content, metadata)
+        chunks = chunker.create_chunks(markdown_content, metadata, chunk_fields)
     
     return artifact_doc, chunks
 
@@ -70,70 +65,164 @@ def format_datetime(dt):
     """Format datetime in ISO 8601 format with Z suffix"""
     return dt.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
 
-def main(myblob: func.InputStream):
-    logging.info(f"Processing new blob: {myblob.name}")
-    
-    try:
-        # Get blob content
-        content = myblob.read()
-        blob_name = myblob.name.split("/")[-1]
-        
-        # Sanitize the document ID
-        safe_id = sanitize_document_id(blob_name)
-        
-        # Get user configuration
-        blob_client = BlobServiceClient.from_connection_string(os.environ["STORAGE_CONNECTION_STRING"])
-        container_client = blob_client.get_container_client("schemas")
-        config_blob = container_client.get_blob_client("user_config.json")
-        schema_json = json.loads(config_blob.download_blob().readall())
-        
-        # Create base metadata with properly formatted timestamp and safe ID
-        base_metadata = {
-            "id": safe_id,
-            "fileName": blob_name,
-            "timestamp": format_datetime(datetime.utcnow()),
-            "docType": "artifact"
-        }
-        
+def build_documents(blob_name: str, analyze_result: dict, schema_json: dict, timestamp: datetime = None) -> tuple[list, list]:
+    """Turn an analyze_result into artifact and chunk documents"""
+    # Create base metadata with properly formatted timestamp and safe ID
+    base_metadata = {
+        "id": sanitize_document_id(blob_name),
+        "fileName": blob_name,
+        "timestamp": format_datetime(timestamp or datetime.utcnow()),
+        "docType": "artifact"
+    }
+
+    all_artifacts = []
+    all_chunks = []
+    for content_item in analyze_result["contents"]:
+        artifact_doc, chunks = process_content_item(
+            content_item,
+            base_metadata,
+            schema_json  # Pass schema_json to process_content_item
+        )
+        all_artifacts.append(artifact_doc)
+        all_chunks.extend(chunks)
+    return all_artifacts, all_chunks
+
+def upload_to_indexes(documents: list, targets: list, client_factory=None):
+    """Upload documents to each physical index version, dropping fields it does not define"""
+    if not documents:
+        return
+    for target in targets:
+        client = (client_factory or get_search_client)(target["name"])
+        projected = [project_document(doc, target.get("fields")) for doc in documents]
+        # Azure AI Search accepts at most 1000 documents per indexing batch
+        for start in range(0, len(projected), UPLOAD_BATCH_SIZE):
+            client.upload_documents(documents=projected[start:start + UPLOAD_BATCH_SIZE])
+
+def merge_into_indexes(updates: list, targets: list, client_factory=None):
+    """Apply partial updates to documents that already exist in each index version"""
+    if not updates:
+        return
+    for target in targets:
+        client = (client_factory or get_search_client)(target["name"])
+        projected = [project_document(doc, target.get("fields")) for doc in updates]
+        for start in range(0, len(projected), UPLOAD_BATCH_SIZE):
+            # A canonical chunk may not have reached a building index yet; such updates fail per document
+            client.merge_documents(documents=projected[start:start + UPLOAD_BATCH_SIZE])
+
+def run_stages(blob_name: str, content: bytes, schema_json: dict, checkpoint: dict, outputs: dict):
+    """Run the stages the checkpoint does not list as done, recording each one as it completes.
+
+    The analysis is checkpointed as soon as it exists. Built documents are
+    only kept in ``outputs``; they are stored if indexing fails, which keeps
+    the writes off the path of files that index on the first attempt.
+    """
+    stages = checkpoint["stages"]
+    documents = load_documents(blob_name) if "chunked" in stages else None
+    if documents is None:
+        stages.pop("chunked", None)
+    analyze_result = None
+    if "analyzed" in stages and documents is None:
+        analyze_result = load_analysis(blob_name, container_client(ANALYSIS_CONTAINER))
+        if analyze_result is None:
+            del stages["analyzed"]
+    if "analyzed" not in stages:
+        started = time.perf_counter()
         # Get content understanding analysis
         analyze_result = analyze_file(schema_json.get("name"), content)
         if not analyze_result or not analyze_result.get("contents"):
-            raise ValueError("No content analysis results")
-        
+            raise UnprocessableContent("No content analysis results")
+
+        # Keep the raw result so indexes can be rebuilt without re-analyzing
+        save_analysis(blob_name, analyze_result, container_client(ANALYSIS_CONTAINER))
+        complete_stage(checkpoint, "analyzed", started)
+    else:
+        logging.info(f"Resuming {blob_name} after {', '.join(stages)}")
+
+    versions = get_index_versions()
+    chunk_targets = write_indexes("chunks", versions)
+    if documents is None:
+        started = time.perf_counter()
         # Process all content items
-        all_artifacts = []
-        all_chunks = []
-        
-        for content_item in analyze_result["contents"]:
-            artifact_doc, chunks = process_content_item(
-                content_item,
-                base_metadata,
-                schema_json  # Pass schema_json to process_content_item
-            )
-            all_artifacts.append(artifact_doc)
-            all_chunks.extend(chunks)
-        
-        # Upload to search
-        search_endpoint = os.environ["SEARCH_ENDPOINT"]
-        search_key = os.environ["SEARCH_ADMIN_KEY"]
-        
-        artifact_client = SearchClient(
-            endpoint=search_endpoint,
-            index_name="artifacts",
-            credential=AzureKeyCredential(search_key)
+        all_artifacts, all_chunks = build_documents(blob_name, analyze_result, schema_json)
+
+        # Collapse near-duplicate chunks against this file and the active index
+        all_chunks, source_updates, dedup_stats = deduplicate_chunks(
+            all_chunks, lookup=search_lookup(get_search_client(chunk_targets[0]["name"]))
         )
-        
-        chunk_client = SearchClient(
-            endpoint=search_endpoint,
-            index_name="chunks",
-            credential=AzureKeyCredential(search_key)
+        logging.info(
+            f"Deduplicated {blob_name}: kept {dedup_stats['kept']} of {dedup_stats['chunks']} chunks "
+            f"({dedup_stats['reduction']:.1%} reduction, mode {dedup_stats['mode']})"
         )
-        
-        if all_artifacts:
-            artifact_client.upload_documents(documents=all_artifacts)
-        if all_chunks:
-            chunk_client.upload_documents(documents=all_chunks)
-            
+        documents = outputs["documents"] = {"artifacts": all_artifacts, "chunks": all_chunks, "sourceUpdates": source_updates}
+        stages["chunked"] = {"ms": round((time.perf_counter() - started) * 1000), "at": time.time()}
+
+    # Upload to search (active index and, during a rebuild, the new version); uploads are idempotent
+    started = time.perf_counter()
+    upload_to_indexes(documents["artifacts"], write_indexes("artifacts", versions))
+    upload_to_indexes(documents["chunks"], chunk_targets)
+    merge_into_indexes(documents["sourceUpdates"], chunk_targets)
+    # The checkpoint is deleted next, so the last stages are not written back
+    checkpoint["stages"]["indexed"] = {"ms": round((time.perf_counter() - started) * 1000), "at": time.time()}
+
+def ingest(blob_name: str, content: bytes, schema_json: dict = None) -> str:
+    """Ingest one file, resuming from its checkpoint.
+
+    Returns ``"ingested"``, ``"dead-lettered"`` or ``"skipped"`` (dead-lettered
+    before with the same content); raises when the file should be retried.
+    """
+    content_sha = content_hash(content)
+
+    dead = load_dead_letter(blob_name)
+    if dead and dead.get("contentHash") == content_sha:
+        logging.warning(f"Skipping {blob_name}: dead-lettered after {dead['failedStage']} failed ({dead['error']})")
+        return "skipped"
+
+    # Get user configuration
+    schema_json = schema_json or load_user_config()
+    checkpoint = load_checkpoint(blob_name, content_sha, schema_hash(schema_json))
+    attempt = {"at": time.time()}
+    checkpoint["attempts"].append(attempt)
+    started = time.perf_counter()
+    outputs = {}
+
+    try:
+        run_stages(blob_name, content, schema_json, checkpoint, outputs)
     except Exception as e:
-        logging.error(f"Error in ingestion function: {str(e)}")
-        raise
\ No newline at end of file
+        if "documents" in outputs:
+            try:
+                save_documents(blob_name, outputs["documents"])
+            except Exception as save_error:
+                logging.warning(f"Could not store the documents of {blob_name}: {str(save_error)}")
+                checkpoint["stages"].pop("chunked", None)
+        stage = next(s for s in STAGES if s not in checkpoint["stages"])
+        attempt.update({"stage": stage, "error": str(e), "ms": round((time.perf_counter() - started) * 1000)})
+        logging.error(f"Error in ingestion function at stage {stage} (attempt {len(checkpoint['attempts'])}): {str(e)}")
+        if isinstance(e, PERMANENT_ERRORS) or len(checkpoint["attempts"]) >= max_attempts():
+            # Not retried: the blob trigger would otherwise run the failing stages again
+            dead_letter(checkpoint, stage, e)
+            clear_checkpoint(blob_name)
+            logging.error(f"Dead-lettered {blob_name} after {len(checkpoint['attempts'])} attempts")
+            return "dead-lettered"
+        save_checkpoint(checkpoint)
+        raise
+
+    clear_checkpoint(blob_name)
+    if dead:
+        clear_dead_letter(blob_name)
+    timings = ", ".join(f"{name} {info['ms']}ms" for name, info in checkpoint["stages"].items())
+    logging.info(f"Ingested {blob_name} in {len(checkpoint['attempts'])} attempt(s): {timings}")
+    return "ingested"
+
+@profiled("ingestion_function")
+def main(myblob: func.InputStream):
+    logging.info(f"Processing new blob: {myblob.name}")
+    
+    # Get blob content
+    content = myblob.read()
+    blob_name = myblob.name.split("/")[-1]
+    metadata = getattr(myblob, "metadata", None) or {}
+    if metadata.get(INGESTED_METADATA) == content_hash(content):
+        # Stored by scripts/backfill.py after it indexed this content itself
+        logging.info(f"Skipping {blob_name}: already ingested by a backfill")
+        return
+    ingest(blob_name, content)
@@ -19,8 +19,8 @@ class AudioTranscriptChunker:
             
         logging.info(f"Parsing WEBVTT content: {markdown_content[:200]}...")
         
-        # Match timestamps and text with or without speaker tags
-        pattern = r'(\d{2}:\d{2}\.\d{3}) --> (\d{2}:\d{2}\.\d{3})\n(?:<v ([^>]+)>)?([^\n]+)'
+        # Match timestamps (hours are optional) and text with or without speaker tags
+        pattern = r'((?:\d{2,}:)?\d{2}:\d{2}\.\d{3}) --> ((?:\d{2,}:)?\d{2}:\d{2}\.\d{3})\n(?:<v ([^>]+)>)?([^\n]+)'
         matches = re.finditer(pattern, markdown_content, re.MULTILINE)
         
         segments = []
@@ -48,8 +48,8 @@ class AudioTranscriptChunker:
     def timestamp_to_ms(self, timestamp: str) -> int:
         """Convert WEBVTT timestamp to milliseconds"""
         try:
-            minutes, seconds = timestamp.split(':')
-            total_seconds = int(minutes) * 60 + float(seconds)
+            *hours, minutes, seconds = timestamp.split(':')
+            total_seconds = int(hours[0] if hours else 0) * 3600 + int(minutes) * 60 + float(seconds)
             return int(total_seconds * 1000)
         except Exception as e:
             logging.error(f"Error converting timestamp {timestamp}: {str(e)}")
@@ -58,9 +58,13 @@ class AudioTranscriptChunker:
     def create_chunks(
         self,
         content: str,
-        metadata: Dict[str, Any]
+        metadata: Dict[str, Any],
+        fields: Dict[str, Any] = None
     ) -> List[Dict[str, Any]]:
-        """Create overlapping chunks from WEBVTT content"""
+        """Create overlapping chunks from WEBVTT content
+
+        ``fields`` (chunk-prefixed schema values) are copied onto every chunk.
+        """
         segments = self.parse_webvtt(content)
         chunks = []
         
@@ -82,7 +86,7 @@ class AudioTranscriptChunker:
             
             # Use chunk_ prefix for all fields in chunks
             chunk = {
-                "chunk_id": f"{metadata['id']}_chunk_{i//self.chunk_size}",  # Use chunk_id for chunks
+                "chunk_id": f"{metadata['id']}_chunk_{len(chunks)}",  # Windows overlap, so number them in order
                 "chunk_content": chunk_content,
                 "chunk_docType": "chunk",
                 "chunk_fileName": metadata["fileName"],
@@ -95,6 +99,8 @@ class AudioTranscriptChunker:
             for k, v in metadata.items():
                 if k not in ["id", "fileName", "timestamp", "docType"]:
                     chunk[f"chunk_{k}"] = v
+            if fields:
+                chunk.update(fields)
             
             chunks.append(chunk)
             
@@ -1,11 +1,14 @@
 import os
 import logging
-import requests
 import time
 import uuid
+from shared.rate_limits import rate_limiter
 
 def analyze_file(analyzer_id: str, content: bytes) -> dict:
     """Analyze file content using Azure AI Content Understanding binary API."""
+    import requests
+
+    limiter = rate_limiter("content_understanding")
     try:
         endpoint = os.environ["CO_AI_ENDPOINT"].rstrip('/')
         key = os.environ["CO_AI_KEY"]
@@ -24,9 +27,16 @@ def analyze_file(analyzer_id: str, content: bytes) -> dict:
         logging.info(f"Making binary analyze request to {url}")
         logging.info(f"Request headers: {headers}")
         logging.info(f"Payload" + f"Size: {len(content)} bytes")
-        response = requests.post(url, headers=headers, data=content)
+        # One of the service's shared slots is held for the whole analysis;
+        # throttled (429/503) requests are retried after their Retry-After
+        with limiter.slot() as slot:
+            response = limiter.call(lambda: requests.post(url, headers=headers, data=content))
         
-        if response.status_code == 202:  # Accepted - async operation
+            if response.status_code != 202:  # Accepted - async operation
+                logging.error(f"Error response: {response.text}")
+                response.raise_for_status()
+                raise ValueError(f"Unexpected analyze response status {response.status_code}")
+
             operation_url = response.headers.get('Operation-Location')
             if not operation_url:
                 raise ValueError("No Operation-Location header in response")
@@ -36,10 +46,12 @@ def analyze_file(analyzer_id: str, content: bytes) -> dict:
             
             for attempt in range(max_retries):
                 logging.info(f"Polling attempt {attempt + 1} of {max_retries}")
-                result_response = requests.get(
+                if slot is not None:
+                    slot.renew()
+                result_response = limiter.call(lambda: requests.get(
                     operation_url,
                     headers={"Ocp-Apim-Subscription-Key": key}
-                )
+                ))
                 logging.info(f"Response received, status: {result_response.status_code}")
                 logging.info(f"Status: {result_response.status_code}")
                 logging.info(f"Response content: {result_response.text}")
@@ -65,10 +77,6 @@ def analyze_file(analyzer_id: str, content: bytes) -> dict:
             
             raise TimeoutError("Analysis timed out")
             
-        else:
-            logging.error(f"Error response: {response.text}")
-            response.raise_for_status()
-            
     except Exception as e:
         logging.error(f"Error in analyze_file: {str(e)}")
         if isinstance(e, requests.exceptions.HTTPError):
@@ -1,106 +1,222 @@
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Tuple
 from datetime import datetime
+from shared.settings import env_number
+
+# Hard cap on the characters of every chunk, about 512 tokens and well inside embedding model input limits
+DEFAULT_MAX_CHARS = 2048
+
+_HEADER = re.compile(r"^(#{1,6})\s+(.+)$")
+_FENCE = re.compile(r"^\s*(`{3,}|~{3,})")
+_TABLE_ROW = re.compile(r"<tr\b.*?</tr>", re.IGNORECASE | re.DOTALL)
+_PIPE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{3,}")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
 
 class MarkdownChunker:
-    """Markdown document chunker with header preservation"""
-    
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 100):
-        self.chunk_size = chunk_size
+    """Markdown document chunker with header preservation.
+
+    Chunks hold about ``chunk_size`` characters and never more than
+    ``max_chars``. Code blocks and tables larger than a chunk
+    are split on their own boundaries: code by lines with the fence reopened
+    in every piece, HTML and pipe tables by rows with the header row repeated.
+    Blank content makes no chunk.
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 100, max_chars: int = None):
+        self.max_chars = max_chars or env_number("CHUNK_MAX_CHARS", DEFAULT_MAX_CHARS, int)
+        self.chunk_size = min(chunk_size, self.max_chars)
         self.chunk_overlap = chunk_overlap
 
     def create_chunks(
         self,
         content: str,
-        metadata: Dict[str, Any]
+        metadata: Dict[str, Any],
+        fields: Dict[str, Any] = None
     ) -> List[Dict[str, Any]]:
         """
         Chunk markdown content preserving header structure
+
+        ``fields`` (chunk-prefixed schema values) are copied onto every chunk.
+        Each chunk records the h1-h6 path it sits under as ``chunk_headers``.
         """
         chunks = []
-        lines = content.split("\n")
-        
         current_chunk = []
+        current_size = 0
         current_headers = {}
-        chunk_number = 0
-        current_code_block = False
-        code_fence = ""
-        
-        for line in lines:
-            # Handle code blocks
-            if line.strip().startswith("```"):
-                if not current_code_block:
-                    current_code_block = True
-                    code_fence = "```"
-                elif code_fence == "```":
-                    current_code_block = False
-                    code_fence = ""
-            elif line.strip().startswith("~~~"):
-                if not current_code_block:
-                    current_code_block = True
-                    code_fence = "~~~"
-                elif code_fence == "~~~":
-                    current_code_block = False
-                    code_fence = ""
-
-            # If in code block, keep adding lines
-            if current_code_block:
-                current_chunk.append(line)
-                continue
+        # Header path from h1 down, e.g. ["Annual Report", "Pricing"]; shared
+        # by all chunks of a section and rebuilt only when a header changes
+        header_path = []
+        # Whether the current chunk holds only a header (and blank lines)
+        heading_only = False
+
+        def emit() -> None:
+            for part in self._hard_split("\n".join(current_chunk), self.max_chars):
+                if not part.strip():
+                    continue
+                chunk_id = f"{metadata['id']}_chunk_{len(chunks)}"
+                chunks.append(self._create_chunk(chunk_id, part, metadata, fields, header_path))
 
-            # Check for headers
-            header_match = re.match(r"^(#{1,6})\s+(.+)$", line)
-            if header_match:
+        for kind, block in self._blocks(content.split("\n")):
+            if kind == "header":
                 # If we have content, create a chunk before starting new section
                 if current_chunk:
-                    chunk_id = f"{metadata['id']}_chunk_{chunk_number}"
-                    chunk_content = "\n".join(current_chunk)
-                    chunk_data = self._create_chunk(chunk_id, chunk_content, metadata)
-                    chunks.append(chunk_data)
-                    chunk_number += 1
-                    current_chunk = []
-
-                # Update current headers
+                    emit()
+                header_match = _HEADER.match(block[0])
                 level = len(header_match.group(1))
-                header_text = header_match.group(2)
+                header_text = header_match.group(2).rstrip("#").strip() or header_match.group(2)
                 current_headers[f"h{level}"] = header_text
                 # Clear any lower-level headers
                 current_headers = {k:v for k,v in current_headers.items() if int(k[1]) <= level}
-                
-            # Add line to current chunk
-            current_chunk.append(line)
-            
-            # Check if current chunk is too large
-            if len("\n".join(current_chunk)) >= self.chunk_size:
-                chunk_id = f"{metadata['id']}_chunk_{chunk_number}"
-                chunk_content = "\n".join(current_chunk)
-                chunk_data = self._create_chunk(chunk_id, chunk_content, metadata)
-                chunks.append(chunk_data)
-                chunk_number += 1
-                # Keep overlap portion
-                overlap_lines = current_chunk[-self.chunk_overlap:]
-                current_chunk = overlap_lines
+                header_path = [current_headers[k] for k in sorted(current_headers)]
+                current_chunk, current_size = [block[0]], len(block[0])
+                heading_only = True
+                continue
+
+            for piece in self._split_block(kind, block):
+                # A header alone is no chunk; it goes with the first piece of its section while under the cap
+                limit = self.max_chars if heading_only else self.chunk_size
+                if current_chunk and current_size + 1 + len(piece) > limit:
+                    emit()
+                    # Carry the end of a text line over; code and table pieces restate their own context
+                    tail = self._overlap(current_chunk[-1]) if kind == "text" else ""
+                    current_chunk, current_size = ([tail], len(tail)) if tail else ([], 0)
+                    heading_only = False
+                current_chunk.append(piece)
+                heading_only = heading_only and not piece.strip()
+                current_size += len(piece) + (1 if len(current_chunk) > 1 else 0)
 
         # Add final chunk if any content remains
         if current_chunk:
-            chunk_id = f"{metadata['id']}_chunk_{chunk_number}"
-            chunk_content = "\n".join(current_chunk)
-            chunk_data = self._create_chunk(chunk_id, chunk_content, metadata)
-            chunks.append(chunk_data)
+            emit()
 
         return chunks
 
+    def _blocks(self, lines: List[str]) -> Iterator[Tuple[str, List[str]]]:
+        """Group lines into headers, fenced code, tables and single text lines"""
+        i = 0
+        while i < len(lines):
+            line = lines[i]
+            stripped = line.strip()
+            fence = _FENCE.match(line) if stripped[:1] in ("`", "~") else None
+            if not stripped or stripped[0] not in "`~<|#":
+                yield "text", [line]
+                i += 1
+            elif fence:
+                # Up to the closing fence, or the end of an unterminated block
+                marker = fence.group(1)
+                end = i + 1
+                while end < len(lines) and not lines[end].strip().startswith(marker):
+                    end += 1
+                yield "code", lines[i:end + 1]
+                i = end + 1
+            elif stripped.lower().startswith("<table"):
+                end = i
+                while end < len(lines) - 1 and "</table>" not in lines[end].lower():
+                    end += 1
+                yield "html_table", lines[i:end + 1]
+                i = end + 1
+            elif stripped.startswith("|"):
+                end = i
+                while end + 1 < len(lines) and lines[end + 1].strip().startswith("|"):
+                    end += 1
+                yield "pipe_table", lines[i:end + 1]
+                i = end + 1
+            elif _HEADER.match(line):
+                yield "header", [line]
+                i += 1
+            else:
+                yield "text", [line]
+                i += 1
+
+    def _split_block(self, kind: str, block: List[str]) -> List[str]:
+        """The block as one piece, or as pieces of at most a chunk when it is larger"""
+        text = "\n".join(block) if len(block) > 1 else block[0]
+        if len(text) <= self.chunk_size:
+            return [text]
+        if kind == "code":
+            closed = len(block) > 1 and block[-1].strip().startswith(_FENCE.match(block[0]).group(1))
+            opener, closer = block[0], block[-1].strip() if closed else _FENCE.match(block[0]).group(1)
+            body = block[1:-1] if closed else block[1:]
+            return self._pack([opener], body, [closer], "\n")
+        if kind == "html_table":
+            rows = _TABLE_ROW.findall(text)
+            if not rows:
+                return self._hard_split(text, self.chunk_size)
+            # Leading rows of header cells are repeated in every piece
+            header_count = 0
+            while header_count < len(rows) - 1 and "<th" in rows[header_count].lower():
+                header_count += 1
+            header = rows[:header_count] or rows[:1]
+            return self._pack(["<table>"] + header, rows[len(header):], ["</table>"], "")
+        if kind == "pipe_table":
+            header_count = 2 if len(block) > 2 and _PIPE_SEPARATOR.match(block[1]) else 1
+            return self._pack(block[:header_count], block[header_count:], [], "\n")
+        pieces = []
+        for sentence in _SENTENCE_END.split(text):
+            if pieces and len(pieces[-1]) + 1 + len(sentence) <= self.chunk_size:
+                pieces[-1] += " " + sentence
+            else:
+                pieces.extend(self._hard_split(sentence, self.chunk_size))
+        return pieces
+
+    def _pack(self, head: List[str], items: List[str], tail: List[str], separator: str) -> List[str]:
+        """Pieces of ``items`` of at most a chunk each, every one wrapped in ``head`` and ``tail``"""
+        frame = len(separator.join(head + tail)) + len(separator)
+        budget = max(self.chunk_size - frame, self.chunk_size // 2)
+        pieces, current, size = [], [], 0
+        for item in items:
+            parts = self._hard_split(item, budget) if len(item) > budget else [item]
+            for part in parts:
+                if current and size + len(separator) + len(part) > budget:
+                    pieces.append(separator.join(head + current + tail))
+                    current, size = [], 0
+                current.append(part)
+                size += len(part) + len(separator)
+        if current or not pieces:
+            pieces.append(separator.join(head + current + tail))
+        return pieces
+
+    def _overlap(self, line: str) -> str:
+        """The last ``chunk_overlap`` characters of a line, from a word boundary"""
+        if self.chunk_overlap <= 0 or len(line) <= self.chunk_overlap:
+            return line if 0 < len(line) <= self.chunk_overlap else ""
+        tail = line[-self.chunk_overlap:]
+        space = tail.find(" ")
+        return tail[space + 1:] if 0 <= space < len(tail) - 1 else tail
+
+    @staticmethod
+    def _hard_split(text: str, limit: int) -> List[str]:
+        """``text`` in parts of at most ``limit`` characters, cut at line or word breaks where possible"""
+        parts = []
+        while len(text) > limit:
+            cut = text.rfind("\n", limit // 2, limit)
+            if cut < 0:
+                cut = text.rfind(" ", limit // 2, limit)
+            if cut < 0:
+                cut = limit
+            parts.append(text[:cut])
+            text = text[cut:].lstrip("\n ") if cut < limit else text[cut:]
+        if text or not parts:
+            parts.append(text)
+        return parts
+
     def _create_chunk(
         self,
         chunk_id: str,
         content: str,
-        metadata: Dict[str, Any]
+        metadata: Dict[str, Any],
+        fields: Dict[str, Any] = None,
+        headers: List[str] = None
     ) -> Dict[str, Any]:
         """Create chunk document with common fields"""
-        return {
+        chunk = {
             "chunk_id": chunk_id,
             "chunk_content": content,
             "chunk_docType": "chunk",
             "chunk_fileName": metadata.get("fileName"),
-            "chunk_timestamp": metadata.get("timestamp")
-        }
\ No newline at end of file
+            "chunk_timestamp": metadata.get("timestamp"),
+            "chunk_headers": headers or []
+        }
+        if fields:
+            chunk.update(fields)
+        return chunk
@@ -0,0 +1,122 @@
+import azure.functions as func
+import logging
+import json
+import os
+import time
+from ingestion_function import build_documents, merge_into_indexes, upload_to_indexes
+from ingestion_function.content_understanding_utils import analyze_file
+from shared.analysis_store import ANALYSIS_CONTAINER, load_analysis, save_analysis
+from shared.storage import container_client, load_user_config
+from shared.index_versions import CACHE_TTL_SECONDS, activate_building, building_index, get_index_versions
+from shared.dedup import deduplicate_chunks, search_lookup
+from shared.search_clients import get_search_client
+
+REINDEX_QUEUE = "reindex-jobs"
+PAGE_SIZE = 50
+# Stay well below the function timeout; the job continues in a new message
+TIME_BUDGET_SECONDS = 240
+MAX_RETRIES = 3
+
+def enqueue_reindex(targets: dict, reanalyze: bool = False):
+    """Start a background rebuild of the building index versions in ``targets``"""
+    from azure.storage.queue import QueueClient, TextBase64EncodePolicy
+
+    queue = QueueClient.from_connection_string(
+        os.environ["STORAGE_CONNECTION_STRING"],
+        REINDEX_QUEUE,
+        message_encode_policy=TextBase64EncodePolicy()
+    )
+    try:
+        queue.create_queue()
+    except Exception:
+        pass
+    job = {"targets": targets, "reanalyze": reanalyze, "requestedAt": time.time(), "processed": 0}
+    queue.send_message(json.dumps(job))
+    logging.info(f"Queued reindex of {targets}")
+
+def reindex_blob(blob, schema_json: dict, targets: dict, files, analysis, reanalyze: bool):
+    """Index one source file into the building versions"""
+    analyze_result = None if reanalyze else load_analysis(blob.name, analysis)
+    if analyze_result is None:
+        content = files.get_blob_client(blob.name).download_blob().readall()
+        analyze_result = analyze_file(schema_json.get("name"), content)
+        save_analysis(blob.name, analyze_result, analysis)
+    if not analyze_result or not analyze_result.get("contents"):
+        logging.warning(f"No content analysis results for {blob.name}, skipping")
+        return
+    artifacts, chunks = build_documents(blob.name, analyze_result, schema_json, blob.last_modified)
+    upload_to_indexes(artifacts, [targets["artifacts"]] if "artifacts" in targets else [])
+    if "chunks" in targets:
+        # Fingerprint and collapse duplicates against the new version, as ingestion does
+        chunks, source_updates, _ = deduplicate_chunks(
+            chunks, lookup=search_lookup(get_search_client(targets["chunks"]["name"]))
+        )
+        upload_to_indexes(chunks, [targets["chunks"]])
+        merge_into_indexes(source_updates, [targets["chunks"]])
+
+def main(msg: func.QueueMessage, nextJob: func.Out[str]) -> None:
+    job = json.loads(msg.get_body().decode("utf-8"))
+    versions = get_index_versions(refresh=True)
+
+    # A newer schema change replaces the building versions; its own job takes over
+    targets = {}
+    for base_name, name in job["targets"].items():
+        building = building_index(base_name, versions)
+        if not building or building["name"] != name:
+            logging.info(f"Reindex of {name} superseded, stopping")
+            return
+        targets[base_name] = building
+
+    # Writers cache the version state; wait until all of them dual-write
+    wait = job["requestedAt"] + CACHE_TTL_SECONDS - time.time()
+    if wait > 0 and job["processed"] == 0:
+        time.sleep(wait)
+
+    schema_json = load_user_config()
+    files = container_client("files")
+    analysis = container_client(ANALYSIS_CONTAINER)
+
+    start = time.monotonic()
+    reanalyze = job.get("reanalyze", False)
+
+    def process(blob):
+        try:
+            reindex_blob(blob, schema_json, targets, files, analysis, reanalyze)
+        except Exception as e:
+            logging.error(f"Error reindexing {blob.name}: {str(e)}")
+            job.setdefault("failed", []).append(blob.name)
+        job["processed"] += 1
+
+    if job.get("retry"):
+        # Second pass over files that failed in the listing pass
+        for name in job.pop("retry"):
+            process(files.get_blob_client(name).get_blob_properties())
+    else:
+        pages = files.list_blobs(results_per_page=PAGE_SIZE).by_page(continuation_token=job.get("continuation"))
+        for page in pages:
+            for blob in page:
+                process(blob)
+            job["continuation"] = pages.continuation_token
+            if not job["continuation"]:
+                break
+            if time.monotonic() - start > TIME_BUDGET_SECONDS:
+                logging.info(f"Reindexed {job['processed']} files so far, continuing in a new job")
+                nextJob.set(json.dumps(job))
+                return
+
+    if job.get("failed"):
+        job["attempt"] = job.get("attempt", 0) + 1
+        if job["attempt"] > MAX_RETRIES:
+            logging.error(f"Reindex failed for {len(job['failed'])} files; {list(targets)} stay inactive")
+            return
+        job["retry"], job["failed"] = job["failed"], []
+        nextJob.set(json.dumps(job))
+        return
+
+    # Setup imports this module to enqueue jobs, so its index helpers load here
+    from setup_agent_function.create_ai_search_index import delete_search_index
+
+    retired = activate_building(list(targets))
+    logging.info(f"Reindexed {job['processed']} files, activated {[t['name'] for t in targets.values()]}")
+    for entry in retired.values():
+        delete_search_index(entry["name"])
@@ -0,0 +1 @@
+"""Operational command-line jobs for the function app (run from the functions/ directory)."""
@@ -0,0 +1,287 @@
+"""Ingest an existing blob container or local directory in bulk.
+
+Runs every file through the same pipeline as the blob trigger
+(``ingestion_function.ingest``: analyze, chunk, index, with its per-file
+checkpoints and dead-lettering) on a thread pool, instead of uploading the
+files one by one to ``files`` and waiting for the trigger. Analysis dominates
+and is network-bound, so threads overlap it; Content Understanding calls stay
+within the limits of ``shared/rate_limits.py``.
+
+Each ingested file is then copied to the ``files`` container under its source
+name, unless the source is that container, so index rebuilds and
+``get_file`` find it like an uploaded file. The copy carries the hash of the
+ingested content in its metadata, and the blob trigger skips it instead of
+analyzing it again.
+
+Usage (from the functions/ directory):
+
+    python -m scripts.backfill --source ./export --workers 16 --checkpoint backfill.jsonl
+    python -m scripts.backfill --source container:customer-export --workers 32
+    python -m scripts.backfill --source ./docs --schema schema.json --storage memory --search local --analyze text
+
+``--source`` is a directory (searched recursively) or ``container:<name>``.
+Each finished file is appended to ``--checkpoint`` with its fingerprint (size
+and modification time, or the blob ETag); re-running with the same checkpoint
+skips files that were ingested and have not changed since, so an interrupted
+backfill resumes where it stopped. Files that fail with a retryable error are
+not recorded and are picked up by the next run.
+
+For a dry run without Azure, ``--storage memory`` keeps checkpoints and
+analysis archives in memory, ``--search local`` or ``sink`` replaces Azure AI
+Search, and ``--analyze text`` analyzes each file as UTF-8 markdown with a
+local stand-in of Content Understanding.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .replay_analysis import sink_client
+
+
+class DirectorySource:
+    """Files below a local directory, named by their relative path"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def list(self) -> Iterator[Tuple[str, int, str]]:
+        for root, dirs, files in os.walk(self.path):
+            dirs.sort()
+            for file_name in sorted(files):
+                path = os.path.join(root, file_name)
+                stat = os.stat(path)
+                name = os.path.relpath(path, self.path).replace(os.sep, "/")
+                yield name, stat.st_size, f"{stat.st_size}-{stat.st_mtime_ns}"
+
+    def read(self, name: str) -> bytes:
+        with open(os.path.join(self.path, *name.split("/")), "rb") as f:
+            return f.read()
+
+
+class ContainerSource:
+    """Blobs of a storage container"""
+
+    def __init__(self, container_name: str):
+        from shared.storage import container_client
+        self.container = container_client(container_name)
+
+    def list(self) -> Iterator[Tuple[str, int, str]]:
+        for blob in self.container.list_blobs():
+            yield blob.name, blob.size, blob.etag
+
+    def read(self, name: str) -> bytes:
+        return self.container.get_blob_client(name).download_blob().readall()
+
+
+def open_source(spec: str):
+    if spec.startswith("container:"):
+        return ContainerSource(spec[len("container:"):])
+    return DirectorySource(spec)
+
+
+def load_checkpoint(path: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """The last record of every file in the checkpoint"""
+    records = {}
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    records[record["name"]] = record
+    return records
+
+
+def text_analyzer():
+    """Content Understanding stand-in that reads each file as markdown (``--analyze text``)"""
+    from benchmarks.fake_content_understanding import FakeContentUnderstandingServer
+
+    server = FakeContentUnderstandingServer().start()
+    os.environ.update({
+        "CO_AI_ENDPOINT": server.endpoint,
+        "CO_AI_KEY": "backfill",
+        # The stand-in is local; the service limits do not apply to it
+        "RATE_LIMIT_CONTENT_UNDERSTANDING_RPS": "0",
+        "RATE_LIMIT_CONTENT_UNDERSTANDING_CONCURRENCY": "0",
+    })
+
+    def register(content: bytes) -> None:
+        markdown = content.decode("utf-8", errors="replace")
+        server.register(content, {"contents": [{"kind": "document", "markdown": markdown, "fields": {}}]})
+
+    return server, register
+
+
+def configure(storage: str, search: str, schema_json: Dict[str, Any]) -> None:
+    """Point the pipeline at in-memory storage and the chosen search backend"""
+    import ingestion_function
+
+    if storage == "memory":
+        from benchmarks.stand_ins import StaticBlobServiceClient
+        from shared import storage as shared_storage
+        os.environ.setdefault("STORAGE_CONNECTION_STRING", "UseDevelopmentStorage=true")
+        # Blob leases need real storage
+        os.environ["RATE_LIMIT_BACKEND"] = "local"
+        StaticBlobServiceClient.set_schema(schema_json)
+        shared_storage.use_blob_service_client(StaticBlobServiceClient())
+    if search == "local":
+        os.environ["SEARCH_BACKEND"] = "local"
+    elif search == "sink":
+        ingestion_function.get_search_client = sink_client
+
+
+def backfill(
+    source_spec: str,
+    schema_json: Dict[str, Any],
+    workers: int = 8,
+    checkpoint: Optional[str] = None,
+    progress_interval: float = 5.0,
+    limit: Optional[int] = None,
+    prepare=None,
+) -> Dict[str, Any]:
+    """Ingest every new or changed file of ``source_spec``; returns totals.
+
+    ``prepare(content)`` runs before each file is ingested, e.g. to register
+    it with a Content Understanding stand-in.
+    """
+    from ingestion_function import FILES_CONTAINER, INGESTED_METADATA, ingest
+    from shared.ingestion_checkpoints import content_hash
+    from shared.storage import container_client, upload_blob
+
+    source = open_source(source_spec)
+    files = None if source_spec == f"container:{FILES_CONTAINER}" else container_client(FILES_CONTAINER)
+    done = load_checkpoint(checkpoint)
+    listed = list(source.list())
+    pending = [
+        (name, size, fingerprint) for name, size, fingerprint in listed
+        if done.get(name, {}).get("fingerprint") != fingerprint
+    ]
+    unchanged = len(listed) - len(pending)
+    if limit:
+        pending = pending[:limit]
+    total_files, total_bytes = len(pending), sum(size for _, size, _ in pending)
+    print(f"Backfilling {total_files} files ({total_bytes / 1e6:.1f} MB), {unchanged} unchanged, {workers} workers")
+
+    totals = {"files": 0, "bytes": 0, "ingested": 0, "skipped": 0, "dead-lettered": 0, "failed": []}
+    start = last_report = time.monotonic()
+
+    def report(final: bool = False) -> None:
+        elapsed = max(time.monotonic() - start, 1e-9)
+        rate = totals["files"] / elapsed
+        # Bytes predict the remaining time better than files when sizes vary
+        byte_rate = totals["bytes"] / elapsed
+        eta = (total_bytes - totals["bytes"]) / byte_rate if byte_rate else 0.0
+        print(
+            f"{'done' if final else 'progress'}: {totals['files']}/{total_files} files, "
+            f"{totals['ingested']} ingested, {totals['skipped']} skipped, {totals['dead-lettered']} dead-lettered, "
+            f"{len(totals['failed'])} failed, "
+            f"{rate:.2f} files/s, {byte_rate / 1e6:.2f} MB/s, "
+            f"{'elapsed' if final else 'eta'} {elapsed if final else eta:.0f}s"
+        )
+
+    def run(name: str, size: int, fingerprint: str) -> Tuple[str, Optional[str]]:
+        try:
+            content = source.read(name)
+            if prepare:
+                prepare(content)
+            status = ingest(name, content, schema_json)
+            if status == "ingested" and files is not None:
+                # Rebuilds list the files container; without the copy the file would drop out of the next version
+                upload_blob(files, name, content, metadata={INGESTED_METADATA: content_hash(content)})
+            return status, None
+        except Exception as e:
+            return "failed", f"{type(e).__name__}: {e}"
+
+    checkpoint_file = open(checkpoint, "a", encoding="utf-8") if checkpoint else None
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            queue = iter(pending)
+            in_flight = {}
+            while True:
+                # Keep a bounded number of files queued so memory stays flat
+                while len(in_flight) < workers * 2:
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    in_flight[pool.submit(run, *item)] = item
+                if not in_flight:
+                    break
+                finished, _ = wait(in_flight, timeout=progress_interval, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name, size, fingerprint = in_flight.pop(future)
+                    status, error = future.result()
+                    totals["files"] += 1
+                    totals["bytes"] += size
+                    if error:
+                        totals["failed"].append((name, error))
+                    else:
+                        totals[status] += 1
+                    if checkpoint_file and not error:
+                        checkpoint_file.write(json.dumps({"name": name, "fingerprint": fingerprint, "status": status}) + "\n")
+                        checkpoint_file.flush()
+                if time.monotonic() - last_report >= progress_interval:
+                    report()
+                    last_report = time.monotonic()
+    finally:
+        if checkpoint_file:
+            checkpoint_file.close()
+
+    report(final=True)
+    totals["elapsed_s"] = round(time.monotonic() - start, 3)
+    return totals
+
+
+def load_schema(path: Optional[str]) -> Dict[str, Any]:
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    from shared.storage import load_user_config
+    return load_user_config()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Ingest a directory or blob container in bulk")
+    parser.add_argument("--source", required=True, help="A directory, or container:<name>")
+    parser.add_argument("--schema", help="Schema JSON file (default: schemas/user_config.json)")
+    parser.add_argument("--workers", type=int, default=8, help="Files ingested concurrently")
+    parser.add_argument("--checkpoint", help="File recording finished files, for skipping and resuming")
+    parser.add_argument("--limit", type=int, help="Ingest at most this many files")
+    parser.add_argument("--storage", choices=["azure", "memory"], default="azure",
+                        help="Keep checkpoints and analysis archives in Azure storage or in memory")
+    parser.add_argument("--search", choices=["azure", "local", "sink"], default="azure",
+                        help="Index into Azure AI Search, the embedded engine, or an in-memory sink")
+    parser.add_argument("--analyze", choices=["service", "text"], default="service",
+                        help="Analyze with Content Understanding, or read files as markdown locally")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="Seconds between progress lines")
+    args = parser.parse_args(argv)
+    if args.storage == "memory" and not args.schema:
+        parser.error("--storage memory needs --schema")
+    if args.source.startswith("container:") and args.storage == "memory":
+        parser.error("container sources need --storage azure")
+
+    logging.getLogger().setLevel(logging.WARNING)
+    schema_json = load_schema(args.schema)
+    configure(args.storage, args.search, schema_json)
+    server, prepare = text_analyzer() if args.analyze == "text" else (None, None)
+    try:
+        totals = backfill(
+            args.source, schema_json, workers=args.workers, checkpoint=args.checkpoint,
+            progress_interval=args.progress_interval, limit=args.limit, prepare=prepare
+        )
+    finally:
+        if server:
+            server.stop()
+    if totals["failed"]:
+        print(f"{len(totals['failed'])} files failed and will be retried by the next run:")
+        for name, error in totals["failed"][:20]:
+            print(f"  - {name}: {error}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""Replay archived analysis results through chunking and indexing.
+
+Reads the gzip-compressed ``analyze_result`` archives written by ingestion
+(``shared/analysis_store.py``), runs them through ``process_content_item``,
+the chunkers and the index upload in a process pool, and never calls Content
+Understanding. Use it after changing chunking, field mappings or embeddings.
+
+Usage (from the functions/ directory):
+
+    python -m scripts.replay_analysis --workers 8
+    python -m scripts.replay_analysis --source ./archives --schema schema.json --search local
+    python -m scripts.replay_analysis --target artifacts=artifacts_v4 --target chunks=chunks_v4
+
+``--source`` is ``blob`` (the ``analysis`` container) or a directory of
+``<name>.json.gz`` files. Completed files are appended to ``--checkpoint``;
+re-running with the same checkpoint skips them, so an interrupted replay
+resumes where it stopped.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+ARCHIVE_SUFFIX = ".json.gz"
+
+
+class DirectorySource:
+    """Archives stored as files, e.g. exported from the analysis container"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def list(self) -> Iterator[Tuple[str, int]]:
+        for entry in sorted(os.scandir(self.path), key=lambda e: e.name):
+            if entry.is_file() and entry.name.endswith(ARCHIVE_SUFFIX):
+                yield entry.name[:-len(ARCHIVE_SUFFIX)], entry.stat().st_size
+
+    def read(self, name: str) -> Tuple[bytes, datetime]:
+        path = os.path.join(self.path, name + ARCHIVE_SUFFIX)
+        with open(path, "rb") as f:
+            data = f.read()
+        return data, datetime.fromtimestamp(os.path.getmtime(path), tz=timezone.utc)
+
+
+class BlobSource:
+    """Archives in the ``analysis`` blob container"""
+
+    def __init__(self):
+        from shared.analysis_store import get_analysis_container
+        self.container = get_analysis_container()
+
+    def list(self) -> Iterator[Tuple[str, int]]:
+        for blob in self.container.list_blobs():
+            if blob.name.endswith(ARCHIVE_SUFFIX):
+                yield blob.name[:-len(ARCHIVE_SUFFIX)], blob.size
+
+    def read(self, name: str) -> Tuple[bytes, datetime]:
+        downloader = self.container.get_blob_client(name + ARCHIVE_SUFFIX).download_blob()
+        return downloader.readall(), downloader.properties.last_modified
+
+
+def open_source(spec: str):
+    return BlobSource() if spec == "blob" else DirectorySource(spec)
+
+
+def sink_client(index_name: str):
+    """Client factory that records uploads in memory (``--search sink``)"""
+    from benchmarks.stand_ins import InMemorySearchSink
+    return InMemorySearchSink(index_name=index_name)
+
+
+# Per-process state of pool workers, set up once by _init_worker
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(source_spec: str, schema_json: Dict[str, Any], targets: Dict[str, Dict[str, Any]], search: str) -> None:
+    logging.getLogger().setLevel(logging.WARNING)
+    if search == "local":
+        os.environ["SEARCH_BACKEND"] = "local"
+    _worker.update({
+        "source": open_source(source_spec),
+        "schema": schema_json,
+        "targets": targets,
+        "client_factory": sink_client if search == "sink" else None,
+    })
+
+
+def replay_batch(names: List[str]) -> Dict[str, Any]:
+    """Replay a batch of archives in a worker; returns counts and failures"""
+    from ingestion_function import build_documents, merge_into_indexes, upload_to_indexes
+    from shared.analysis_store import decode_analysis
+    from shared.dedup import deduplicate_chunks, search_lookup
+    from shared.search_clients import get_search_client
+
+    result = {"done": [], "failed": [], "artifacts": 0, "chunks": 0, "bytes": 0}
+    targets = _worker["targets"]
+    for name in names:
+        try:
+            data, timestamp = _worker["source"].read(name)
+            analyze_result = decode_analysis(data)
+            artifacts, chunks = build_documents(name, analyze_result, _worker["schema"], timestamp)
+            if "artifacts" in targets:
+                upload_to_indexes(artifacts, [targets["artifacts"]], _worker["client_factory"])
+            if "chunks" in targets:
+                # The in-memory sink cannot be queried, so it only sees duplicates within a file
+                lookup = None if _worker["client_factory"] else search_lookup(get_search_client(targets["chunks"]["name"]))
+                chunks, source_updates, _ = deduplicate_chunks(chunks, lookup=lookup)
+                upload_to_indexes(chunks, [targets["chunks"]], _worker["client_factory"])
+                merge_into_indexes(source_updates, [targets["chunks"]], _worker["client_factory"])
+        except Exception as e:
+            result["failed"].append((name, f"{type(e).__name__}: {e}"))
+            continue
+        result["done"].append(name)
+        result["artifacts"] += len(artifacts)
+        result["chunks"] += len(chunks)
+        result["bytes"] += len(data)
+    return result
+
+
+def load_checkpoint(path: Optional[str]) -> Set[str]:
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+def replay(
+    source_spec: str,
+    schema_json: Dict[str, Any],
+    targets: Dict[str, Dict[str, Any]],
+    workers: int = 4,
+    batch_size: int = 8,
+    checkpoint: Optional[str] = None,
+    search: str = "azure",
+    progress_interval: float = 5.0,
+    limit: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Replay every archive of ``source_spec`` into ``targets``; returns totals"""
+    completed = load_checkpoint(checkpoint)
+    pending = [(name, size) for name, size in open_source(source_spec).list() if name not in completed]
+    if limit:
+        pending = pending[:limit]
+    total_files, total_bytes = len(pending), sum(size for _, size in pending)
+    batches = [[name for name, _ in pending[i:i + batch_size]] for i in range(0, len(pending), batch_size)]
+    print(f"Replaying {total_files} archives ({total_bytes / 1e6:.1f} MB), {len(completed)} already done, {workers} workers")
+
+    totals = {"files": 0, "artifacts": 0, "chunks": 0, "bytes": 0, "failed": []}
+    start = last_report = time.monotonic()
+
+    def report(final: bool = False) -> None:
+        elapsed = max(time.monotonic() - start, 1e-9)
+        rate = totals["files"] / elapsed
+        eta = (total_files - totals["files"]) / rate if rate else 0.0
+        print(
+            f"{'done' if final else 'progress'}: {totals['files']}/{total_files} files, "
+            f"{totals['chunks']} chunks, {rate:.1f} files/s, {totals['chunks'] / elapsed:.0f} chunks/s, "
+            f"{totals['bytes'] / 1e6 / elapsed:.2f} MB/s, "
+            f"{'elapsed' if final else 'eta'} {elapsed if final else eta:.0f}s"
+        )
+
+    checkpoint_file = open(checkpoint, "a", encoding="utf-8") if checkpoint else None
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=ctx, initializer=_init_worker,
+            initargs=(source_spec, schema_json, targets, search)
+        ) as pool:
+            queue = iter(batches)
+            in_flight = set()
+            while True:
+                # Keep a bounded number of batches queued so memory stays flat
+                while len(in_flight) < workers * 2:
+                    batch = next(queue, None)
+                    if batch is None:
+                        break
+                    in_flight.add(pool.submit(replay_batch, batch))
+                if not in_flight:
+                    break
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    result = future.result()
+                    totals["files"] += len(result["done"]) + len(result["failed"])
+                    for key in ("artifacts", "chunks", "bytes"):
+                        totals[key] += result[key]
+                    totals["failed"].extend(result["failed"])
+                    if checkpoint_file and result["done"]:
+                        checkpoint_file.write("".join(f"{name}\n" for name in result["done"]))
+                        checkpoint_file.flush()
+                if time.monotonic() - last_report >= progress_interval:
+                    report()
+                    last_report = time.monotonic()
+    finally:
+        if checkpoint_file:
+            checkpoint_file.close()
+
+    report(final=True)
+    totals["elapsed_s"] = round(time.monotonic() - start, 3)
+    return totals
+
+
+def resolve_targets(target_args: List[str], search: str) -> Dict[str, Dict[str, Any]]:
+    """Explicit ``--target`` indexes, else the building (or active) index versions"""
+    if target_args:
+        targets = {}
+        for arg in target_args:
+            base_name, _, index_name = arg.partition("=")
+            targets[base_name] = {"name": index_name or base_name, "fields": None}
+        return targets
+    if search == "sink" or not os.environ.get("STORAGE_CONNECTION_STRING"):
+        return {"artifacts": {"name": "artifacts", "fields": None}, "chunks": {"name": "chunks", "fields": None}}
+    from shared.index_versions import active_index, building_index, get_index_versions
+    versions = get_index_versions(refresh=True)
+    return {
+        base_name: building_index(base_name, versions) or active_index(base_name, versions)
+        for base_name in ("artifacts", "chunks")
+    }
+
+
+def load_schema(path: Optional[str]) -> Dict[str, Any]:
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    from azure.storage.blob import BlobServiceClient
+    client = BlobServiceClient.from_connection_string(os.environ["STORAGE_CONNECTION_STRING"])
+    return json.loads(client.get_container_client("schemas").get_blob_client("user_config.json").download_blob().readall())
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay archived analysis results into the search indexes")
+    parser.add_argument("--source", default="blob", help="'blob' or a directory of <name>.json.gz archives")
+    parser.add_argument("--schema", help="Schema JSON file (default: schemas/user_config.json)")
+    parser.add_argument("--search", choices=["azure", "local", "sink"], default="azure",
+                        help="Index into Azure AI Search, the embedded engine, or an in-memory sink")
+    parser.add_argument("--target", action="append", default=[], metavar="BASE=INDEX",
+                        help="Physical index for 'artifacts' or 'chunks' (repeatable)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=8, help="Archives per worker task")
+    parser.add_argument("--checkpoint", help="File recording completed archives, for resuming")
+    parser.add_argument("--limit", type=int, help="Replay at most this many archives")
+    args = parser.parse_args(argv)
+    if args.search == "local" and not os.environ.get("LOCAL_SEARCH_PATH"):
+        parser.error("--search local needs LOCAL_SEARCH_PATH so worker processes share the index")
+
+    totals = replay(
+        args.source, load_schema(args.schema), resolve_targets(args.target, args.search),
+        workers=args.workers, batch_size=args.batch_size, checkpoint=args.checkpoint,
+        search=args.search, limit=args.limit
+    )
+    if totals["failed"]:
+        print(f"{len(totals['failed'])} archives failed:")
+        for name, error in totals["failed"][:20]:
+            print(f"  - {name}: {error}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,21 +2,29 @@ import azure.functions as func
 import os
 import json
 import logging
-from .agent_service_utils import create_or_update_agent
-from .content_understanding_utils import create_or_update_analyzer
-from azure.storage.blob import BlobServiceClient, ContainerClient
-from azure.core.exceptions import ResourceExistsError
-from .create_ai_search_index import create_search_indexes
-
-def get_or_create_container(conn_str: str, container_name: str) -> ContainerClient:
-    blob_client = BlobServiceClient.from_connection_string(conn_str)
-    container_client = blob_client.get_container_client(container_name)
+import time
+from shared.storage import container_client as get_container_client
+from shared.vector_profiles import resolve_vector_profiles
+
+def get_or_create_container(conn_str: str, container_name: str):
+    from azure.core.exceptions import ResourceExistsError
+
+    container_client = get_container_client(container_name, conn_str)
     try:
         container_client.create_container()
     except ResourceExistsError:
         pass
     return container_client
 
+def load_provisioning_state(container) -> dict:
+    from azure.core.exceptions import ResourceNotFoundError
+    from .provisioning import STATE_BLOB
+
+    try:
+        return json.loads(container.get_blob_client(STATE_BLOB).download_blob().readall())
+    except ResourceNotFoundError:
+        return {}
+
 def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info("Processing setup agent request")
 
@@ -78,25 +86,56 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 "template": body.get("template"),
                 "scenario": body.get("scenario", "document")  # Add this line
             }
-            
-            # Create search indexes first
+
+            # Validate vector profiles before anything is provisioned
             try:
-                create_search_indexes(schema_data["fields"])
-                logging.info("Created search indexes")
-            except Exception as e:
-                logging.error(f"Error creating search indexes: {str(e)}")
+                schema_data["vectorProfiles"] = resolve_vector_profiles(body.get("vectorProfiles"))
+            except ValueError as e:
                 return func.HttpResponse(
-                    "Error creating search indexes",
-                    status_code=500
+                    str(e),
+                    status_code=400
                 )
-
-            # Store config in blob storage
+            
+            # Provision indexes, analyzer and agent, skipping unchanged ones
             try:
                 container = get_or_create_container(
                     os.environ["STORAGE_CONNECTION_STRING"],
                     "schemas"
                 )
-                
+                state = load_provisioning_state(container)
+            except Exception as e:
+                logging.error(f"Error loading provisioning state: {str(e)}")
+                return func.HttpResponse(
+                    "Error loading provisioning state",
+                    status_code=500
+                )
+
+            # Provisioning pulls in the search, agent and analyzer SDKs; only setup needs them
+            from .provisioning import STATE_BLOB, pending_state, provision
+            from reindex_function import enqueue_reindex
+
+            start = time.perf_counter()
+            resources, new_state = provision(schema_data, state, force=bool(body.get("force")))
+            duration_ms = round((time.perf_counter() - start) * 1000)
+            # Rebuilt indexes are recorded once their reindex job is queued, so a failure below retries them
+            container.upload_blob(STATE_BLOB, json.dumps(pending_state(new_state, state, resources), indent=2), overwrite=True)
+
+            failed = [name for name, result in resources.items() if result["status"] == "failed"]
+            if failed:
+                return func.HttpResponse(
+                    json.dumps({
+                        "status": "error",
+                        "message": f"Error provisioning {', '.join(failed)}",
+                        "durationMs": duration_ms,
+                        "resources": resources
+                    }),
+                    status_code=500,
+                    mimetype="application/json"
+                )
+
+            # Store config in blob storage once everything it refers to exists
+            schema_data["agentId"] = resources["agent"]["id"]
+            try:
                 container.upload_blob(
                     "user_config.json",
                     json.dumps(schema_data, indent=2),
@@ -109,30 +148,25 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                     status_code=500
                 )
 
-            # Create/update analyzer and agent
-            try:
-                analyzer_result = create_or_update_analyzer(schema_data)
-                agent_result = create_or_update_agent(schema_data)
-            except Exception as e:
-                import requests
-                if isinstance(e, requests.exceptions.HTTPError) and e.response.status_code == 409:
-                    # Return success even if analyzer already exists
-                    return func.HttpResponse(
-                        json.dumps({
-                            "status": "success",
-                            "message": "Using existing analyzer",
-                            "analyzerId": schema_data["name"]
-                        }),
-                        status_code=200,
-                        mimetype="application/json"
-                    )
-                raise
+            # Changed indexes are rebuilt in the background and switched when caught up
+            rebuilding = {
+                name.split(":", 1)[1]: result["id"]
+                for name, result in resources.items()
+                if name.startswith("index:") and result["status"] == "building"
+            }
+            if rebuilding:
+                # A changed analyzer extracts different fields, so archived results are stale
+                reanalyze = resources["analyzer"]["status"] in ("created", "updated")
+                enqueue_reindex(rebuilding, reanalyze=reanalyze)
+                container.upload_blob(STATE_BLOB, json.dumps(new_state, indent=2), overwrite=True)
 
             return func.HttpResponse(
                 json.dumps({
                     "status": "success",
-                    "analyzerId": analyzer_result.get("analyzerId"),
-                    "agentId": agent_result.get("id"),
+                    "analyzerId": resources["analyzer"]["id"],
+                    "agentId": resources["agent"]["id"],
+                    "durationMs": duration_ms,
+                    "resources": resources
                 }),
                 status_code=200,
                 mimetype="application/json"
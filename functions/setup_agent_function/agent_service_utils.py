@@ -1,12 +1,14 @@
 import os
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from azure.ai.projects import AIProjectClient
 from azure.ai.projects.models import (
     AzureFunctionStorageQueue, 
     AzureFunctionTool,
 )
 from azure.identity import DefaultAzureCredential
+from azure.core.exceptions import ResourceNotFoundError
+from shared.schema_plan import compile_schema
 
 def parse_project_connection_string(conn_string: str) -> Dict[str, str]:
     """Parse the project connection string into components."""
@@ -17,52 +19,18 @@ def parse_project_connection_string(conn_string: str) -> Dict[str, str]:
             components[key.lower()] = value
     return components
 
-def create_or_update_agent(schema_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Create or update an agent in Azure AI Agent Service."""
-    try:
-        # Get function app name from WEBSITE_CONTENTSHARE
-        function_app_name = os.environ.get("WEBSITE_CONTENTSHARE", "")
-        if not function_app_name:
-            raise ValueError("Could not determine function app name from WEBSITE_CONTENTSHARE")
-
-        storage_account_name = os.environ.get("STORAGE_ACCOUNT_NAME", "")
-        queue_service_uri = f"https://{storage_account_name}.queue.core.windows.net"
-        
-            
-        # Construct base function URL
-        function_base_url = f"https://{function_app_name}.azurewebsites.net/api"
-
-        project_client = AIProjectClient.from_connection_string(
-            credential=DefaultAzureCredential(),
-            conn_str=os.environ["AI_PROJECT_CONNECTION_STRING"]
-        )
+def build_agent_definition(schema_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the model, name, instructions and tools of the agent for a schema."""
+    storage_account_name = os.environ.get("STORAGE_ACCOUNT_NAME", "")
+    queue_service_uri = f"https://{storage_account_name}.queue.core.windows.net"
 
-        # Build field instructions with filter examples
-        field_instructions = []
-        filter_examples = []
-        
-        for field in schema_data["fields"]:
-            field_name = field["name"]
-            field_type = field["type"]
-            description = field.get("description", "")
-            
-            if field_type == "array":
-                field_instructions.append(
-                    f"- {field_name}: List of strings. {description}"
-                )
-                filter_examples.append(f"array_contains({field_name}, 'value')")
-            elif field_type == "date":
-                field_instructions.append(
-                    f"- {field_name}: Date/time value (ISO 8601). {description}"
-                )
-                filter_examples.append(f"{field_name} gt '2023-01-01T00:00:00Z'")
-            else:
-                field_instructions.append(
-                    f"- {field_name}: Text value. {description}"
-                )
-                filter_examples.append(f"{field_name} eq 'value'")
+    # Build field instructions with filter examples from the compiled schema
+    plan = compile_schema(schema_data)
+    field_instructions = plan.field_instructions()
+    filter_examples = plan.filter_examples()
+    chunk_filter_examples = plan.filter_examples("chunk_")
 
-        base_instructions = f"""{schema_data['instructions']}
+    base_instructions = f"""{schema_data['instructions']}
 
 Available fields for searching and filtering (Artifact-level):
 {chr(10).join(field_instructions)}
@@ -70,68 +38,188 @@ Available fields for searching and filtering (Artifact-level):
 You can create filters using OData syntax. Examples:
 {chr(10).join(filter_examples)}
 
-You can filter by individual document chunks by using the 'ArtifactChunk' tool and applying the filter: chunk_fileName eq 'original_filename.pdf'.
+You can filter by individual document chunks by using the 'ArtifactChunk' tool and applying the filter: chunk_sources/any(s: s eq 'original_filename.pdf'). Near-identical chunks are stored once and list every file they occur in as 'sources', so do not filter on chunk_fileName.
+
+Every chunk also carries the fields above prefixed with 'chunk_', so a single ArtifactChunk call can filter on them directly; do not look up matching files with Artifact first. Examples:
+{chr(10).join(chunk_filter_examples)}
+
+Chunk results include 'headers', the section path of the chunk (e.g. "Annual Report > Pricing"). To read one section of a document in a single call, pass its header text as the ArtifactChunk 'section' parameter together with a chunk_sources filter.
 
 Use the Artifact tool for high-level document searches and metadata queries.
 Use the ArtifactChunk tool for searching within specific documents or when you need detailed content analysis
+Use the Aggregate tool for counting questions ("how many", "per customer", "per month"): it counts every matching document in one call, so never count search results yourself. Pass the fields above as 'groupBy', narrow the documents with 'filter' and 'searchText', and set 'dateInterval' (year, quarter, month, week or day) with optional 'from'/'to' timestamps for counts over time. Use scope 'chunks' to count chunks instead of documents.
 
 IMPORTANT:
 When you invoke the Artifact, ALWAYS specify the output queue uri parameter as '{queue_service_uri}/artifact-input'.
 When you invoke the ArtifactChunk, ALWAYS specify the output queue uri parameter as '{queue_service_uri}/artifactchunk-input'.
+When you invoke the Aggregate, ALWAYS specify the output queue uri parameter as '{queue_service_uri}/aggregate-input'.
+"""
+    if schema_data.get("scenario") == "conversation":
+        base_instructions += f"""
+Transcript chunks carry 'segmentStartTime' and 'segmentEndTime' in milliseconds. To read what was said at a point or during a period of a recording ("around minute 42", "in the first five minutes"), call TranscriptWindow with the file name and either 'center' (with an optional 'radius', default 60 seconds) or 'start' and 'end', given as seconds or [hh:]mm:ss. It returns the whole transcript of that range in one call; do not page through it with ArtifactChunk searches.
+When you invoke the TranscriptWindow, ALWAYS specify the output queue uri parameter as '{queue_service_uri}/transcriptwindow-input'.
 """
 
-        # Create function tools
-        artifact_tool = AzureFunctionTool(
-            name="Artifact",
-            description="Search high-level artifact information using semantic search",
-            parameters={
-                "type": "object",
-                "properties": {
-                    "searchText": {"type": "string", "description": "Search text"},
-                    "filter": {"type": "string", "description": "OData filter expression"},
-                    "outputqueueuri": {"type": "string", "description": f"""The full output queue uri. must always be set to {queue_service_uri}/artifact-input"""}
-                }
-            },
-            input_queue=AzureFunctionStorageQueue(
-                queue_name="artifact-input",
-                storage_service_endpoint=queue_service_uri
-            ),
-            output_queue=AzureFunctionStorageQueue(
-                queue_name="artifact-output",
-                storage_service_endpoint=queue_service_uri
-            )
+    # Create function tools
+    artifact_tool = AzureFunctionTool(
+        name="Artifact",
+        description="Search high-level artifact information using semantic search",
+        parameters={
+            "type": "object",
+            "properties": {
+                "searchText": {"type": "string", "description": "Search text"},
+                "filter": {"type": "string", "description": "OData filter expression"},
+                "semanticRanking": {"type": "boolean", "description": "Rerank results by meaning with the semantic ranker and drop weak matches; use for natural-language questions (default false)"},
+                "topK": {"type": "integer", "description": "Maximum number of results, 1-50 (default 5); fewer are returned when only some results are strong matches"},
+                "minScore": {"type": "number", "description": "Drop results scoring below this (reranker score 0-4 with semanticRanking, else search score)"},
+                "collapseDuplicates": {"type": "boolean", "description": "Fold near-identical documents into the best ranked one, which lists their count and file names (default false)"},
+                "outputqueueuri": {"type": "string", "description": f"""The full output queue uri. must always be set to {queue_service_uri}/artifact-input"""}
+            }
+        },
+        input_queue=AzureFunctionStorageQueue(
+            queue_name="artifact-input",
+            storage_service_endpoint=queue_service_uri
+        ),
+        output_queue=AzureFunctionStorageQueue(
+            queue_name="artifact-output",
+            storage_service_endpoint=queue_service_uri
+        )
+    )
+
+    chunk_tool = AzureFunctionTool(
+        name="ArtifactChunk",
+        description="Search detailed chunk-level information using semantic search",
+        parameters={
+            "type": "object",
+            "properties": {
+                "searchText": {"type": "string"},
+                "filter": {"type": "string", "description": "OData filter expression"},
+                "section": {"type": "string", "description": "Only return chunks under this section header (exact header text, as shown in a result's headers)"},
+                "semanticRanking": {"type": "boolean", "description": "Rerank results by meaning with the semantic ranker and drop weak matches; use for natural-language questions (default false)"},
+                "topK": {"type": "integer", "description": "Maximum number of results, 1-50 (default 5); fewer are returned when only some results are strong matches"},
+                "minScore": {"type": "number", "description": "Drop results scoring below this (reranker score 0-4 with semanticRanking, else search score)"},
+                "questionRewriting": {"type": "boolean", "description": "Also search rephrasings and the separate parts of the question and merge the results; use for compound or broadly worded questions (default false)"},
+                "collapseDuplicates": {"type": "boolean", "description": "Fold near-identical results into the best ranked one, which lists their count and file names (default false)"},
+                "outputqueueuri": {"type": "string", "description": f"""The full output queue uri. must always be set to {queue_service_uri}/artifactchunk-input"""}
+            }
+        },
+        input_queue=AzureFunctionStorageQueue(
+            queue_name="artifactchunk-input",
+            storage_service_endpoint=queue_service_uri
+        ),
+        output_queue=AzureFunctionStorageQueue(
+            queue_name="artifactchunk-output",
+            storage_service_endpoint=queue_service_uri
         )
+    )
+
+    aggregate_tool = AzureFunctionTool(
+        name="Aggregate",
+        description="Count documents matching a filter, grouped by field values and date buckets",
+        parameters={
+            "type": "object",
+            "properties": {
+                "groupBy": {"type": "array", "items": {"type": "string"}, "description": "Fields to count values of"},
+                "filter": {"type": "string", "description": "OData filter expression"},
+                "searchText": {"type": "string", "description": "Only count documents matching this search text"},
+                "scope": {"type": "string", "enum": ["artifacts", "chunks"], "description": "Count documents (default) or chunks"},
+                "dateInterval": {"type": "string", "enum": ["year", "quarter", "month", "week", "day"], "description": "Also count documents per date bucket"},
+                "dateField": {"type": "string", "description": "Date field to bucket and range on (default timestamp)"},
+                "from": {"type": "string", "description": "Only count documents at or after this ISO 8601 timestamp"},
+                "to": {"type": "string", "description": "Only count documents before this ISO 8601 timestamp"},
+                "top": {"type": "integer", "description": "Values returned per groupBy field (default 10, max 50)"},
+                "outputqueueuri": {"type": "string", "description": f"""The full output queue uri. must always be set to {queue_service_uri}/aggregate-input"""}
+            }
+        },
+        input_queue=AzureFunctionStorageQueue(
+            queue_name="aggregate-input",
+            storage_service_endpoint=queue_service_uri
+        ),
+        output_queue=AzureFunctionStorageQueue(
+            queue_name="aggregate-output",
+            storage_service_endpoint=queue_service_uri
+        )
+    )
 
-        chunk_tool = AzureFunctionTool(
-            name="ArtifactChunk",
-            description="Search detailed chunk-level information using semantic search",
+    tools = chunk_tool.definitions + artifact_tool.definitions + aggregate_tool.definitions
+    if schema_data.get("scenario") == "conversation":
+        transcript_tool = AzureFunctionTool(
+            name="TranscriptWindow",
+            description="Read the transcript of a recording between two times, or around a point in time",
             parameters={
                 "type": "object",
                 "properties": {
-                    "searchText": {"type": "string"},
-                    "filter": {"type": "string", "description": "OData filter expression"},
-                    "outputqueueuri": {"type": "string", "description": f"""The full output queue uri. must always be set to {queue_service_uri}/artifactchunk-input"""}
-                }
+                    "fileName": {"type": "string", "description": "File name of the recording"},
+                    "start": {"type": "string", "description": "Start of the range, in seconds or [hh:]mm:ss"},
+                    "end": {"type": "string", "description": "End of the range, in seconds or [hh:]mm:ss"},
+                    "center": {"type": "string", "description": "Point in time to read around, in seconds or [hh:]mm:ss"},
+                    "radius": {"type": "string", "description": "Time to read before and after 'center' (default 60 seconds)"},
+                    "outputqueueuri": {"type": "string", "description": f"""The full output queue uri. must always be set to {queue_service_uri}/transcriptwindow-input"""}
+                },
+                "required": ["fileName"]
             },
             input_queue=AzureFunctionStorageQueue(
-                queue_name="artifactchunk-input",
+                queue_name="transcriptwindow-input",
                 storage_service_endpoint=queue_service_uri
             ),
             output_queue=AzureFunctionStorageQueue(
-                queue_name="artifactchunk-output",
+                queue_name="transcriptwindow-output",
                 storage_service_endpoint=queue_service_uri
             )
         )
+        tools += transcript_tool.definitions
+
+    return {
+        "model": os.environ["GPT_DEPLOYMENT_NAME"],
+        "name": schema_data["name"],
+        "instructions": base_instructions,
+        "tools": tools,
+    }
+
+def find_agent_id(project_client: AIProjectClient, name: str) -> Optional[str]:
+    """Return the id of the most recent agent with this name, if any."""
+    agents = project_client.agents.list_agents(limit=100)
+    for agent in getattr(agents, "data", None) or []:
+        if agent.name == name:
+            return agent.id
+    return None
+
+def create_or_update_agent(schema_data: Dict[str, Any], agent_id: Optional[str] = None) -> Dict[str, Any]:
+    """Create or update an agent in Azure AI Agent Service.
+
+    The agent is updated in place when ``agent_id`` (or an agent with the
+    schema name) exists, so repeated setup calls do not create duplicates.
+    """
+    try:
+        # Get function app name from WEBSITE_CONTENTSHARE
+        function_app_name = os.environ.get("WEBSITE_CONTENTSHARE", "")
+        if not function_app_name:
+            raise ValueError("Could not determine function app name from WEBSITE_CONTENTSHARE")
 
-        agent = project_client.agents.create_agent(
-            model=os.environ["GPT_DEPLOYMENT_NAME"],
-            name=schema_data["name"],
-            headers={"x-ms-enable-preview": "true"},
-            instructions=base_instructions,
-            tools=chunk_tool.definitions + artifact_tool.definitions,
+        definition = build_agent_definition(schema_data)
+        project_client = AIProjectClient.from_connection_string(
+            credential=DefaultAzureCredential(),
+            conn_str=os.environ["AI_PROJECT_CONNECTION_STRING"]
         )
 
+        agent_id = agent_id or find_agent_id(project_client, definition["name"])
+        if agent_id:
+            try:
+                agent = project_client.agents.update_agent(
+                    agent_id,
+                    headers={"x-ms-enable-preview": "true"},
+                    **definition
+                )
+                logging.info(f"Updated agent {agent_id}")
+                return agent
+            except ResourceNotFoundError:
+                logging.info(f"Agent {agent_id} no longer exists, creating a new one")
 
+        agent = project_client.agents.create_agent(
+            headers={"x-ms-enable-preview": "true"},
+            **definition
+        )
+        logging.info(f"Created agent {agent.id}")
         return agent
 
     except Exception as e:
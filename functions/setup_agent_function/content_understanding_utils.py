@@ -5,8 +5,90 @@ import requests
 import json
 import uuid
 
-def create_or_update_analyzer(schema_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Create or update an analyzer in Azure AI Content Understanding."""
+def build_analyzer_config(schema_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the analyzer definition for a schema."""
+    analyzer_id = schema_data["name"]
+
+    # Match the exact structure of the working example
+    analyzer_config = {
+        "analyzerId": analyzer_id,
+        "description": schema_data.get("description", f"Analyzer for {analyzer_id}"),
+        "scenario": schema_data.get("scenario", "conversation"),
+        "fieldSchema": {
+            "fields": {},
+            "definitions": {}
+        },
+        "tags": {
+            "projectId": str(uuid.uuid4()),
+            "templateId": f"{analyzer_id}-2024-12-01"
+        },
+        "config": {
+            "locales": [],
+            "returnDetails": False
+        }
+    }
+
+    # Add fields based on schema
+    fields = {}
+    for field in schema_data["fields"]:
+        field_name = field["name"]
+        field_type = field["type"]
+        description = field.get("description", "")
+        
+        method = "extract" if schema_data.get("scenario") == "document" else "generate"
+        
+        if field_name == "summary":
+            fields[field_name] = {
+                "type": "string",
+                "method": method,
+                "description": description
+            }
+        elif field_type == "table":
+            # Tables are arrays of row objects; ingestion flattens them per column
+            fields[field_name] = {
+                "type": "array",
+                "method": method,
+                "description": description,
+                "items": {
+                    "type": "object",
+                    "method": method,
+                    "properties": {
+                        sub["name"]: {
+                            "type": sub.get("type", "string"),
+                            "method": method,
+                            "description": sub.get("description", "")
+                        }
+                        for sub in field.get("fields", [])
+                    }
+                }
+            }
+        elif field_type == "array":
+            fields[field_name] = {
+                "type": "array",
+                "method": method,
+                "description": description,
+                "items": {
+                "type": "string",
+                "method": method
+                }
+            }
+        else:
+            fields[field_name] = {
+                "type": field_type,
+                "method": method,
+                "description": description
+            }
+
+    analyzer_config["fieldSchema"]["fields"] = fields
+
+    return analyzer_config
+
+def create_or_update_analyzer(schema_data: Dict[str, Any], replace: bool = False) -> Dict[str, Any]:
+    """Create or update an analyzer in Azure AI Content Understanding.
+
+    Analyzers cannot be modified once created; with ``replace`` an existing
+    analyzer is deleted and recreated instead of being kept as is.
+    """
     try:
         endpoint = os.environ["CO_AI_ENDPOINT"]
         if endpoint.endswith("/"):
@@ -16,59 +98,7 @@ def create_or_update_analyzer(schema_data: Dict[str, Any]) -> Dict[str, Any]:
         analyzer_id = schema_data["name"]
         
         url = f"{endpoint}/contentunderstanding/analyzers/{analyzer_id}?api-version={api_version}"
-        
-        # Match the exact structure of the working example
-        analyzer_config = {
-            "analyzerId": analyzer_id,
-            "description": schema_data.get("description", f"Analyzer for {analyzer_id}"),
-            "scenario": schema_data.get("scenario", "conversation"),
-            "fieldSchema": {
-                "fields": {},
-                "definitions": {}
-            },
-            "tags": {
-                "projectId": str(uuid.uuid4()),
-                "templateId": f"{analyzer_id}-2024-12-01"
-            },
-            "config": {
-                "locales": [],
-                "returnDetails": False
-            }
-        }
-
-        # Add fields based on schema
-        fields = {}
-        for field in schema_data["fields"]:
-            field_name = field["name"]
-            field_type = field["type"]
-            description = field.get("description", "")
-            
-            method = "extract" if schema_data.get("scenario") == "document" else "generate"
-            
-            if field_name == "summary":
-                fields[field_name] = {
-                    "type": "string",
-                    "method": method,
-                    "description": description
-                }
-            elif field_type == "array":
-                fields[field_name] = {
-                    "type": "array",
-                    "method": method,
-                    "description": description,
-                    "items": {
-                    "type": "string",
-                    "method": method
-                    }
-                }
-            else:
-                fields[field_name] = {
-                    "type": field_type,
-                    "method": method,
-                    "description": description
-                }
-
-        analyzer_config["fieldSchema"]["fields"] = fields
+        analyzer_config = build_analyzer_config(schema_data)
 
         headers = {
             "Ocp-Apim-Subscription-Key": key,
@@ -83,6 +113,15 @@ def create_or_update_analyzer(schema_data: Dict[str, Any]) -> Dict[str, Any]:
             json=analyzer_config
         )
         
+        if response.status_code == 409 and replace:
+            logging.info(f"Analyzer {analyzer_id} changed, replacing it")
+            requests.delete(url, headers=headers).raise_for_status()
+            response = requests.put(
+                url,
+                headers=headers,
+                json=analyzer_config
+            )
+
         # Handle 409 Conflict as an expected case
         if response.status_code == 409:
             logging.info(f"Analyzer {analyzer_id} already exists (expected)")
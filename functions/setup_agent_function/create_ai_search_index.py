@@ -1,6 +1,7 @@
 # /shared/create_ai_search_index.py
 import os
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import ResourceNotFoundError
 from azure.search.documents.indexes import SearchIndexClient
 from azure.search.documents.indexes.models import (
     SearchIndex,
@@ -10,107 +11,176 @@ from azure.search.documents.indexes.models import (
     SearchField,
     VectorSearch,
     HnswAlgorithmConfiguration,
+    HnswParameters,
+    ExhaustiveKnnAlgorithmConfiguration,
+    ExhaustiveKnnParameters,
+    ScalarQuantizationCompression,
+    ScalarQuantizationParameters,
+    BinaryQuantizationCompression,
     VectorSearchProfile,
     SemanticConfiguration,
     SemanticPrioritizedFields,
     SemanticField,
-    SemanticSearch
+    SemanticSearch,
+    ScoringProfile,
+    TextWeights
 )
+from shared import schema_plan
+from shared.schema_plan import compile_schema
+from shared.relevance import SEMANTIC_CONFIGURATIONS
+from shared.vector_profiles import DEFAULT_VECTOR_PROFILE, resolve_vector_profiles
 
-def create_base_fields(prefix=""):
+# Names used before profiles were configurable; kept for the default profile
+# so existing indexes are updated in place instead of needing a rebuild
+DEFAULT_ALGORITHM_NAME = "myHnsw"
+DEFAULT_PROFILE_NAME = "myHnswProfile"
+
+# Chunk matches on section headers rank above matches in body text only
+CHUNK_SCORING_PROFILE = "chunk-headers"
+CHUNK_TEXT_WEIGHTS = {"chunk_headers": 2.0, "chunk_content": 1.0}
+
+COLUMN_TYPES = {
+    schema_plan.STRING: SearchFieldDataType.String,
+    schema_plan.STRINGS: SearchFieldDataType.Collection(SearchFieldDataType.String),
+    schema_plan.DOUBLE: SearchFieldDataType.Double,
+    schema_plan.INT64: SearchFieldDataType.Int64,
+    schema_plan.BOOLEAN: SearchFieldDataType.Boolean,
+    schema_plan.DATETIME: SearchFieldDataType.DateTimeOffset,
+}
+
+def is_default_profile(profile):
+    return profile == DEFAULT_VECTOR_PROFILE
+
+def create_vector_search(profile):
+    """Create the vector search configuration for one index from its profile"""
+    if is_default_profile(profile):
+        algorithm_name, profile_name = DEFAULT_ALGORITHM_NAME, DEFAULT_PROFILE_NAME
+    else:
+        algorithm_name, profile_name = f"{profile['algorithm']}-config", "vector-profile"
+
+    if profile["algorithm"] == "hnsw":
+        algorithm = HnswAlgorithmConfiguration(
+            name=algorithm_name,
+            parameters=HnswParameters(
+                m=profile["m"],
+                ef_construction=profile["efConstruction"],
+                ef_search=profile["efSearch"],
+                metric=profile["metric"]
+            )
+        )
+    else:
+        algorithm = ExhaustiveKnnAlgorithmConfiguration(
+            name=algorithm_name,
+            parameters=ExhaustiveKnnParameters(metric=profile["metric"])
+        )
+
+    compressions = []
+    compression_name = None
+    if profile["compression"] == "scalar":
+        compression_name = "scalar-quantization"
+        compressions.append(ScalarQuantizationCompression(
+            compression_name=compression_name,
+            rerank_with_original_vectors=profile["rescore"],
+            default_oversampling=profile["oversampling"],
+            parameters=ScalarQuantizationParameters(quantized_data_type="int8")
+        ))
+    elif profile["compression"] == "binary":
+        compression_name = "binary-quantization"
+        compressions.append(BinaryQuantizationCompression(
+            compression_name=compression_name,
+            rerank_with_original_vectors=profile["rescore"],
+            default_oversampling=profile["oversampling"]
+        ))
+
+    return VectorSearch(
+        algorithms=[algorithm],
+        compressions=compressions or None,
+        profiles=[
+            VectorSearchProfile(
+                name=profile_name,
+                algorithm_configuration_name=algorithm_name,
+                compression_name=compression_name
+            )
+        ]
+    )
+
+def create_base_fields(prefix="", vector_profile=None):
     """Create base fields common to both indexes"""
+    vector_profile = vector_profile or DEFAULT_VECTOR_PROFILE
     return [
         SimpleField(name=f"{prefix}id", type=SearchFieldDataType.String, key=True),
         SearchableField(name=f"{prefix}content", type=SearchFieldDataType.String, analyzer_name="standard.lucene"),
         SimpleField(name=f"{prefix}docType", type=SearchFieldDataType.String, filterable=True),
-        SimpleField(name=f"{prefix}timestamp", type=SearchFieldDataType.DateTimeOffset, filterable=True, sortable=True),
+        SimpleField(name=f"{prefix}timestamp", type=SearchFieldDataType.DateTimeOffset, filterable=True, sortable=True, facetable=True),
         SimpleField(name=f"{prefix}fileName", type=SearchFieldDataType.String, filterable=True),
-        SimpleField(name=f"{prefix}segmentStartTime", type=SearchFieldDataType.Int64, filterable=True),
+        SimpleField(name=f"{prefix}segmentStartTime", type=SearchFieldDataType.Int64, filterable=True, sortable=True),
         SimpleField(name=f"{prefix}segmentEndTime", type=SearchFieldDataType.Int64, filterable=True),
         SearchField(
             name=f"{prefix}contentVector",
             type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
             searchable=True,
-            vector_search_dimensions=1536,
-            vector_search_profile_name="myHnswProfile"
+            stored=vector_profile["stored"],
+            vector_search_dimensions=vector_profile["dimensions"],
+            vector_search_profile_name=DEFAULT_PROFILE_NAME if is_default_profile(vector_profile) else "vector-profile"
         ),
     ]
 
-def create_search_indexes(fields_config=None):
-    """Create or update Azure AI Search indexes for artifacts and chunks"""
+def create_schema_fields(columns):
+    """Filterable, facetable fields for compiled schema columns"""
+    return [
+        SimpleField(
+            name=column_name,
+            type=COLUMN_TYPES[column_type],
+            filterable=True,
+            facetable=True,
+            sortable=column_type not in (schema_plan.STRINGS, schema_plan.STRING),
+            nullable=True
+        )
+        for column_name, column_type in columns
+    ]
+
+def get_index_client():
     endpoint = os.getenv("SEARCH_ENDPOINT")
     admin_key = os.getenv("SEARCH_ADMIN_KEY")
     
     if not endpoint or not admin_key:
         raise ValueError("Missing required environment variables")
 
-    index_client = SearchIndexClient(endpoint, credential=AzureKeyCredential(admin_key))
+    return SearchIndexClient(endpoint, credential=AzureKeyCredential(admin_key))
+
+def build_search_indexes(fields_config=None, vector_profiles=None):
+    """Build the artifacts and chunks index definitions, keyed by index name"""
+    profiles = resolve_vector_profiles(vector_profiles)
 
     # Create artifact index with user-defined fields
-    artifact_fields = create_base_fields()
-    if fields_config:
-        for field in fields_config:
-            field_name = field["name"]
-            field_type = field["type"]
-            
-            if field_type == "string":
-                artifact_fields.append(
-                    SimpleField(
-                        name=field_name,
-                        type=SearchFieldDataType.String,
-                        filterable=True,
-                        facetable=True,
-                        nullable=True  # Make string fields nullable
-                    )
-                )
-            elif field_type == "array":
-                artifact_fields.append(
-                    SimpleField(
-                        name=field_name,
-                        type=SearchFieldDataType.Collection(SearchFieldDataType.String),
-                        filterable=True,
-                        facetable=True,
-                        nullable=True  # Make array fields nullable
-                    )
-                )
-            elif field_type == "table":
-                # Handle table fields as nested structures
-                for subfield in field.get("fields", []):
-                    artifact_fields.append(
-                        SimpleField(
-                            name=f"{field_name}_{subfield['name']}",
-                            type=SearchFieldDataType.String,
-                            filterable=True
-                        )
-                    )
-
-    # Create chunk index with chunk-prefixed fields
-    chunk_fields = create_base_fields("chunk_")
-
-    # Common vector and semantic configurations
-    vector_search = VectorSearch(
-        algorithms=[
-            HnswAlgorithmConfiguration(
-                name="myHnsw",
-                parameters={
-                    "m": 4,
-                    "efConstruction": 400,
-                    "efSearch": 500,
-                    "metric": "cosine"
-                }
-            )
-        ],
-        profiles=[
-            VectorSearchProfile(
-                name="myHnswProfile",
-                algorithm_configuration_name="myHnsw"
-            )
-        ]
+    artifact_fields = create_base_fields(vector_profile=profiles["artifacts"])
+    # Add one column per extracted value; tables are flattened to {field}_{subfield}
+    plan = compile_schema({"fields": fields_config or []})
+    artifact_fields.extend(create_schema_fields(plan.columns))
+
+    # Create chunk index with chunk-prefixed fields; schema values are copied
+    # onto each chunk so chunk searches can filter and facet on them
+    chunk_fields = create_base_fields("chunk_", profiles["chunks"])
+    chunk_fields.append(
+        SearchableField(
+            name="chunk_headers",
+            collection=True,
+            filterable=True,
+            analyzer_name="standard.lucene"
+        )
     )
+    # Near-duplicate detection (shared/dedup.py): LSH band keys, the MinHash
+    # signature, and every file a collapsed chunk occurred in
+    chunk_fields.extend([
+        SimpleField(name="chunk_lshBands", type=SearchFieldDataType.Collection(SearchFieldDataType.String), filterable=True),
+        SimpleField(name="chunk_minhash", type=SearchFieldDataType.String),
+        SimpleField(name="chunk_sources", type=SearchFieldDataType.Collection(SearchFieldDataType.String), filterable=True, facetable=True),
+    ])
+    chunk_fields.extend(create_schema_fields(plan.chunk_columns))
 
     # Update semantic configurations to use correct field names
     artifact_semantic_config = SemanticConfiguration(
-        name="default",
+        name=SEMANTIC_CONFIGURATIONS["artifacts"],
         prioritized_fields=SemanticPrioritizedFields(
             content_fields=[SemanticField(field_name="content")],
             keywords_fields=[SemanticField(field_name="fileName")]
@@ -118,37 +188,83 @@ def create_search_indexes(fields_config=None):
     )
 
     chunk_semantic_config = SemanticConfiguration(
-        name="default",
+        name=SEMANTIC_CONFIGURATIONS["chunks"],
         prioritized_fields=SemanticPrioritizedFields(
             content_fields=[SemanticField(field_name="chunk_content")],
-            keywords_fields=[SemanticField(field_name="chunk_fileName")]
+            keywords_fields=[
+                SemanticField(field_name="chunk_headers"),
+                SemanticField(field_name="chunk_fileName")
+            ]
         )
     )
 
-    semantic_search_artifact = SemanticSearch(configurations=[artifact_semantic_config])
-    semantic_search_chunk = SemanticSearch(configurations=[chunk_semantic_config])
+    chunk_scoring_profile = ScoringProfile(
+        name=CHUNK_SCORING_PROFILE,
+        text_weights=TextWeights(weights=CHUNK_TEXT_WEIGHTS)
+    )
+
+    # The tools name their configuration (shared/relevance.py); it is also the default
+    semantic_search_artifact = SemanticSearch(
+        default_configuration_name=artifact_semantic_config.name, configurations=[artifact_semantic_config]
+    )
+    semantic_search_chunk = SemanticSearch(
+        default_configuration_name=chunk_semantic_config.name, configurations=[chunk_semantic_config]
+    )
 
     # Create both indexes with their respective semantic configurations
     artifact_index = SearchIndex(
         name="artifacts",
         fields=artifact_fields,
-        vector_search=vector_search,
+        vector_search=create_vector_search(profiles["artifacts"]),
         semantic_search=semantic_search_artifact
     )
 
     chunk_index = SearchIndex(
         name="chunks",
         fields=chunk_fields,
-        vector_search=vector_search,
-        semantic_search=semantic_search_chunk
+        vector_search=create_vector_search(profiles["chunks"]),
+        semantic_search=semantic_search_chunk,
+        scoring_profiles=[chunk_scoring_profile],
+        default_scoring_profile=CHUNK_SCORING_PROFILE
     )
 
+    return {
+        artifact_index.name: artifact_index,
+        chunk_index.name: chunk_index
+    }
+
+def create_search_index(index):
+    """Create or update a single index definition"""
+    try:
+        return get_index_client().create_or_update_index(index)
+    except Exception as e:
+        print(f"Error creating/updating index {index.name}: {str(e)}")
+        raise
+
+def index_exists(name):
+    try:
+        get_index_client().get_index(name)
+        return True
+    except ResourceNotFoundError:
+        return False
+
+def delete_search_index(name):
+    """Delete an index version that is no longer used"""
+    try:
+        get_index_client().delete_index(name)
+    except ResourceNotFoundError:
+        pass
+
+def create_search_indexes(fields_config=None, vector_profiles=None):
+    """Create or update Azure AI Search indexes for artifacts and chunks"""
+    indexes = build_search_indexes(fields_config, vector_profiles)
+    index_client = get_index_client()
     try:
-        index_client.create_or_update_index(artifact_index)
-        index_client.create_or_update_index(chunk_index)
+        for index in indexes.values():
+            index_client.create_or_update_index(index)
         return {
-            "artifacts_index": artifact_index.name,
-            "chunks_index": chunk_index.name
+            "artifacts_index": indexes["artifacts"].name,
+            "chunks_index": indexes["chunks"].name
         }
     except Exception as e:
         print(f"Error creating/updating indexes: {str(e)}")
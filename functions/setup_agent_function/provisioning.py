@@ -0,0 +1,133 @@
+import json
+import time
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Tuple
+from .agent_service_utils import build_agent_definition, create_or_update_agent
+from .content_understanding_utils import build_analyzer_config, create_or_update_analyzer
+from .create_ai_search_index import build_search_indexes, create_search_index, delete_search_index, index_exists
+from shared.index_versions import (
+    begin_build, get_index_versions, next_version, set_active, versioned_name
+)
+
+STATE_BLOB = "provisioning_state.json"
+
+def fingerprint(definition: Any) -> str:
+    """Stable hash of a resource definition"""
+    canonical = json.dumps(definition, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def build_resources(schema_data: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Tuple[str, Callable[[], Any]]]:
+    """Map each resource to its fingerprint and a function that provisions it.
+
+    The function returns the resource id and optionally a status overriding
+    created/updated.
+    """
+    resources = {}
+
+    for name, index in build_search_indexes(schema_data["fields"], schema_data.get("vectorProfiles")).items():
+        index_fingerprint = fingerprint(index.serialize(keep_readonly=False))
+        def provision_index(base_name=name, index=index):
+            return provision_index_version(base_name, index)
+        resources[f"index:{name}"] = (index_fingerprint, provision_index)
+
+    analyzer_config = build_analyzer_config(schema_data)
+    # Tags carry a random project id and do not affect extraction
+    analyzer_config.pop("tags", None)
+    def provision_analyzer():
+        # Analyzers are immutable, so a changed definition replaces the old one
+        return create_or_update_analyzer(schema_data, replace=True).get("analyzerId", schema_data["name"]), None
+    resources["analyzer"] = (fingerprint(analyzer_config), provision_analyzer)
+
+    agent_definition = build_agent_definition(schema_data)
+    agent_definition["tools"] = [tool.as_dict() for tool in agent_definition["tools"]]
+    def provision_agent():
+        agent_id = state.get("agent", {}).get("id")
+        return create_or_update_agent(schema_data, agent_id=agent_id).id, None
+    resources["agent"] = (fingerprint(agent_definition), provision_agent)
+
+    return resources
+
+def provision_index_version(base_name: str, index) -> Tuple[str, str]:
+    """Create the next version of an index.
+
+    A first index is activated right away. Otherwise the new version is
+    marked as building and filled by the reindex job, while queries keep
+    using the active version.
+    """
+    versions = get_index_versions(refresh=True)
+    version = next_version(base_name, versions)
+    index.name = versioned_name(base_name, version)
+    fields = [field.name for field in index.fields]
+    create_search_index(index)
+
+    entry = versions.get(base_name, {})
+    if not entry.get("active") and not index_exists(base_name):
+        set_active(base_name, version, fields)
+        return index.name, "active"
+
+    superseded = entry.get("building")
+    begin_build(base_name, version, fields)
+    if superseded:
+        # A rebuild for an older schema change is still running; drop it
+        delete_search_index(superseded["name"])
+    return index.name, "building"
+
+def provision(schema_data: Dict[str, Any], state: Dict[str, Any], force: bool = False) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Provision every resource whose fingerprint changed, concurrently.
+
+    Returns the per-resource results (status, duration, id, error) and the
+    new provisioning state to persist. Failed resources keep their previous
+    state so they are retried on the next call.
+    """
+    resources = build_resources(schema_data, state)
+    results: Dict[str, Any] = {}
+    new_state = dict(state)
+
+    def run(name: str, resource_fingerprint: str, action: Callable[[], Any]) -> Dict[str, Any]:
+        previous = state.get(name, {})
+        if not force and previous.get("fingerprint") == resource_fingerprint:
+            return {"status": "unchanged", "durationMs": 0, "id": previous.get("id")}
+        start = time.perf_counter()
+        try:
+            resource_id, status = action()
+            status = status or ("updated" if previous else "created")
+            return {"status": status, "durationMs": round((time.perf_counter() - start) * 1000), "id": resource_id}
+        except Exception as e:
+            logging.error(f"Error provisioning {name}: {str(e)}")
+            return {
+                "status": "failed",
+                "durationMs": round((time.perf_counter() - start) * 1000),
+                "id": previous.get("id"),
+                "error": str(e)
+            }
+
+    with ThreadPoolExecutor(max_workers=len(resources)) as executor:
+        futures = {
+            name: executor.submit(run, name, resource_fingerprint, action)
+            for name, (resource_fingerprint, action) in resources.items()
+        }
+        for name, future in futures.items():
+            results[name] = future.result()
+            if results[name]["status"] != "failed":
+                new_state[name] = {"fingerprint": resources[name][0], "id": results[name]["id"]}
+
+    logging.info("Provisioning results: " + ", ".join(f"{n}={r['status']} ({r['durationMs']} ms)" for n, r in results.items()))
+    return results, new_state
+
+def pending_state(new_state: Dict[str, Any], state: Dict[str, Any], results: Dict[str, Any]) -> Dict[str, Any]:
+    """``new_state`` with the indexes still to be rebuilt left at their previous state.
+
+    A building version counts as provisioned only once its reindex job is
+    queued; until then the next call sees its fingerprint as changed and
+    provisions a new version, which supersedes the one left behind.
+    """
+    pending = dict(new_state)
+    for name, result in results.items():
+        if name.startswith("index:") and result["status"] == "building":
+            if name in state:
+                pending[name] = state[name]
+            else:
+                pending.pop(name, None)
+    return pending
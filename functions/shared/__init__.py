@@ -0,0 +1 @@
+"""Code shared by several functions in this app (not a function itself)."""
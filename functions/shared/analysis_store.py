@@ -0,0 +1,49 @@
+"""Archive of raw Content Understanding results.
+
+Each ``analyze_result`` is stored gzip-compressed in the ``analysis``
+container under the name of its source blob, so indexes can be rebuilt
+without analyzing the files again. It is a separate container because every
+blob written to ``files`` triggers ingestion.
+"""
+import gzip
+import json
+from typing import Any, Dict, Optional
+
+from .storage import container_client, upload_blob
+
+ANALYSIS_CONTAINER = "analysis"
+
+
+def archive_name(blob_name: str) -> str:
+    return f"{blob_name}.json.gz"
+
+
+def get_analysis_container():
+    return container_client(ANALYSIS_CONTAINER)
+
+
+def encode_analysis(analyze_result: Dict[str, Any]) -> bytes:
+    return gzip.compress(json.dumps(analyze_result, separators=(",", ":")).encode("utf-8"), compresslevel=1)
+
+
+def decode_analysis(data: bytes) -> Dict[str, Any]:
+    return json.loads(gzip.decompress(data))
+
+
+def save_analysis(blob_name: str, analyze_result: Dict[str, Any], container=None) -> int:
+    """Archive ``analyze_result`` for ``blob_name``; returns the compressed size"""
+    container = container or get_analysis_container()
+    data = encode_analysis(analyze_result)
+    upload_blob(container, archive_name(blob_name), data)
+    return len(data)
+
+
+def load_analysis(blob_name: str, container=None) -> Optional[Dict[str, Any]]:
+    """Return the archived ``analyze_result`` for ``blob_name``, or None"""
+    from azure.core.exceptions import ResourceNotFoundError
+
+    container = container or get_analysis_container()
+    try:
+        return decode_analysis(container.get_blob_client(archive_name(blob_name)).download_blob().readall())
+    except ResourceNotFoundError:
+        return None
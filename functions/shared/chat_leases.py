@@ -0,0 +1,301 @@
+"""Per-thread run leases and admission control for chat runs.
+
+A thread accepts one run at a time, so every request that starts a run first
+takes the thread's lease. A follow-up prompt for a busy thread waits for the
+lease (up to ``CHAT_THREAD_WAIT_SECONDS``) and then runs in turn. A prompt
+identical to the one the thread's active run is answering (a double-send) is
+attached to that run instead of starting another; once a run has ended, the
+same prompt is a new message. A request repeating the ``messageId`` a client
+sent with an earlier one (a retry) gets that message's run, also after it
+ended.
+
+Admission control caps the runs in flight across all instances at
+``CHAT_MAX_CONCURRENT_RUNS``: each run also holds one of that many slot
+leases. When none is free the request is shed with ``Busy``, which the HTTP
+functions turn into 429 with ``Retry-After``.
+
+Leases are blob leases in the ``chat-leases`` container, so they expire on
+their own when an instance dies mid-run; holders renew them while polling.
+``CHAT_LEASE_BACKEND=local`` uses an in-process stand-in with the same
+semantics for local runs.
+
+Asynchronous runs outlive the request that started them: the thread lease is
+only held while a run is submitted, and the run's slot lease is handed over by
+id (``lease_id`` / ``attach_lease``) to the requests that poll or cancel it.
+"""
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from .settings import env_number
+from .storage import container_client
+
+LEASE_CONTAINER = "chat-leases"
+# Blob leases last 15-60 seconds; holders renew well before they expire
+LEASE_SECONDS = 60
+RENEW_INTERVAL_SECONDS = 20
+DEFAULT_MAX_CONCURRENT_RUNS = 16
+DEFAULT_THREAD_WAIT_SECONDS = 20
+DEFAULT_RETRY_AFTER_SECONDS = 5
+POLL_INTERVAL_SECONDS = 0.5
+
+
+class Busy(Exception):
+    """No lease is available; retry after ``retry_after`` seconds"""
+
+    def __init__(self, message: str, retry_after: int = DEFAULT_RETRY_AFTER_SECONDS):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def max_concurrent_runs() -> int:
+    return max(1, env_number("CHAT_MAX_CONCURRENT_RUNS", DEFAULT_MAX_CONCURRENT_RUNS, int))
+
+
+def thread_wait_seconds() -> float:
+    return env_number("CHAT_THREAD_WAIT_SECONDS", DEFAULT_THREAD_WAIT_SECONDS)
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(" ".join(prompt.split()).encode("utf-8")).hexdigest()[:32]
+
+
+def message_key(message_id: Optional[str]) -> str:
+    """Lease state value of a client message id ("" without one)"""
+    return hashlib.sha256(message_id.encode("utf-8")).hexdigest()[:32] if message_id else ""
+
+
+class Lease:
+    """A held lease; renew it while working and release it when done"""
+
+    def __init__(self, store: Any, name: str, token: Any, state: Dict[str, str]):
+        self.store = store
+        self.name = name
+        self.token = token
+        # State the previous holder left on the lease (last prompt and run)
+        self.state = state
+        self._renewed_at = time.monotonic()
+
+    @property
+    def lease_id(self) -> str:
+        """Id that ``attach_lease`` accepts to act on this lease from another request"""
+        return self.store.lease_id(self)
+
+    def renew(self, force: bool = False) -> None:
+        if force or time.monotonic() - self._renewed_at >= RENEW_INTERVAL_SECONDS:
+            self.store.renew(self)
+            self._renewed_at = time.monotonic()
+
+    def record(self, **state: str) -> None:
+        """Store state on the lease for the next holder"""
+        self.state = {**self.state, **{k: str(v) for k, v in state.items()}, "updated": str(int(time.time()))}
+        self.store.set_state(self)
+
+    def release(self) -> None:
+        try:
+            self.store.release(self)
+        except Exception as e:
+            # The lease expires on its own
+            logging.warning(f"Could not release lease {self.name}: {str(e)}")
+
+    def __enter__(self) -> "Lease":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class LocalLeaseStore:
+    """In-process leases with expiry, for local runs"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._leases: Dict[str, tuple] = {}
+        self._state: Dict[str, Dict[str, str]] = {}
+
+    def try_acquire(self, name: str) -> Optional[Lease]:
+        with self._lock:
+            held = self._leases.get(name)
+            if held and held[1] > time.monotonic():
+                return None
+            token = uuid.uuid4().hex
+            self._leases[name] = (token, time.monotonic() + LEASE_SECONDS)
+            return Lease(self, name, token, dict(self._state.get(name, {})))
+
+    def attach(self, name: str, lease_id: str) -> Lease:
+        return Lease(self, name, lease_id, {})
+
+    def lease_id(self, lease: Lease) -> str:
+        return lease.token
+
+    def read_state(self, name: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._state.get(name, {}))
+
+    def _check(self, lease: Lease) -> None:
+        held = self._leases.get(lease.name)
+        if not held or held[0] != lease.token:
+            raise RuntimeError(f"Lease {lease.name} was lost")
+
+    def renew(self, lease: Lease) -> None:
+        with self._lock:
+            self._check(lease)
+            self._leases[lease.name] = (lease.token, time.monotonic() + LEASE_SECONDS)
+
+    def set_state(self, lease: Lease) -> None:
+        with self._lock:
+            self._check(lease)
+            self._state[lease.name] = dict(lease.state)
+
+    def release(self, lease: Lease) -> None:
+        with self._lock:
+            if self._leases.get(lease.name, (None,))[0] == lease.token:
+                del self._leases[lease.name]
+
+
+class BlobLeaseStore:
+    """Leases on empty blobs; lease state is kept in the blob metadata"""
+
+    def __init__(self, container=None):
+        self.container = container if container is not None else container_client(LEASE_CONTAINER)
+
+    def _blob(self, name: str):
+        from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+
+        blob = self.container.get_blob_client(name)
+        try:
+            blob.upload_blob(b"", overwrite=False)
+        except ResourceExistsError:
+            pass
+        except ResourceNotFoundError:
+            try:
+                self.container.create_container()
+            except ResourceExistsError:
+                pass
+            return self._blob(name)
+        return blob
+
+    @staticmethod
+    def _acquire(blob):
+        from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
+
+        try:
+            return blob.acquire_lease(lease_duration=LEASE_SECONDS)
+        except ResourceNotFoundError:
+            raise
+        except HttpResponseError as e:
+            # 409 LeaseAlreadyPresent
+            if e.status_code == 409:
+                return None
+            raise
+
+    def try_acquire(self, name: str) -> Optional[Lease]:
+        from azure.core.exceptions import ResourceNotFoundError
+
+        blob = self.container.get_blob_client(name)
+        try:
+            lease_client = self._acquire(blob)
+        except ResourceNotFoundError:
+            # First use of this lease name
+            lease_client = self._acquire(self._blob(name))
+        if lease_client is None:
+            return None
+        return Lease(self, name, lease_client, dict(blob.get_blob_properties().metadata or {}))
+
+    def attach(self, name: str, lease_id: str) -> Lease:
+        from azure.storage.blob import BlobLeaseClient
+
+        return Lease(self, name, BlobLeaseClient(self.container.get_blob_client(name), lease_id=lease_id), {})
+
+    def lease_id(self, lease: Lease) -> str:
+        return lease.token.id
+
+    def read_state(self, name: str) -> Dict[str, str]:
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            return dict(self.container.get_blob_client(name).get_blob_properties().metadata or {})
+        except ResourceNotFoundError:
+            return {}
+
+    def renew(self, lease: Lease) -> None:
+        lease.token.renew()
+
+    def set_state(self, lease: Lease) -> None:
+        self.container.get_blob_client(lease.name).set_blob_metadata(lease.state, lease=lease.token)
+
+    def release(self, lease: Lease) -> None:
+        lease.token.release()
+
+
+_stores: Dict[str, Any] = {}
+_stores_lock = threading.Lock()
+
+
+def lease_store() -> Any:
+    """The lease store of the configured backend, shared within the process"""
+    backend = os.environ.get("CHAT_LEASE_BACKEND", "blob").lower()
+    with _stores_lock:
+        if backend not in _stores:
+            _stores[backend] = LocalLeaseStore() if backend == "local" else BlobLeaseStore()
+        return _stores[backend]
+
+
+def acquire_thread(thread_id: str, wait: Optional[float] = None, store: Any = None) -> Lease:
+    """Take the lease of a thread, waiting up to ``wait`` seconds for its active run"""
+    store = store or lease_store()
+    wait = thread_wait_seconds() if wait is None else wait
+    deadline = time.monotonic() + wait
+    while True:
+        lease = store.try_acquire(f"threads/{thread_id}")
+        if lease is not None:
+            return lease
+        if time.monotonic() >= deadline:
+            raise Busy(f"Thread {thread_id} is still answering a previous message")
+        time.sleep(POLL_INTERVAL_SECONDS)
+
+
+def thread_state(thread_id: str, store: Any = None) -> Dict[str, str]:
+    """State the last holder left on a thread's lease, without taking it"""
+    return (store or lease_store()).read_state(f"threads/{thread_id}")
+
+
+def attach_lease(name: str, lease_id: str, store: Any = None) -> Lease:
+    """A lease taken by another request, to renew or release it"""
+    return (store or lease_store()).attach(name, lease_id)
+
+
+def acquire_run_slot(store: Any = None) -> Lease:
+    """Take one of the ``CHAT_MAX_CONCURRENT_RUNS`` run slots, or shed the request"""
+    store = store or lease_store()
+    slots = max_concurrent_runs()
+    # Start at a random slot so concurrent requests do not all probe slot 0 first
+    offset = random.randrange(slots)
+    for i in range(slots):
+        lease = store.try_acquire(f"slots/{(offset + i) % slots}")
+        if lease is not None:
+            return lease
+    raise Busy("Too many chat runs in progress", retry_after=DEFAULT_RETRY_AFTER_SECONDS + random.randint(0, 5))
+
+
+def previous_run(lease: Lease, message_id: Optional[str]) -> Optional[str]:
+    """The run already started for the client message ``message_id`` on this thread, for retried requests"""
+    if not message_id or lease.state.get("message") != message_key(message_id):
+        return None
+    return lease.state.get("runid")
+
+
+def retry_after_from(error: Exception) -> Optional[int]:
+    """Retry-After of a throttled (429) service response, or None for other errors"""
+    if getattr(error, "status_code", None) != 429:
+        return None
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return max(1, int(float(headers.get("Retry-After", DEFAULT_RETRY_AFTER_SECONDS))))
+    except ValueError:
+        return DEFAULT_RETRY_AFTER_SECONDS
@@ -0,0 +1,155 @@
+"""Context policies for agent runs.
+
+Without a policy every run sends the whole thread to the model, so latency
+and token cost grow with each turn. ``CHAT_CONTEXT_POLICY`` selects how much
+of the history a run sees:
+
+- ``full``: the whole thread
+- ``last_messages`` (default): the last ``CHAT_CONTEXT_LAST_MESSAGES`` messages
+- ``token_budget``: the newest messages that fit ``CHAT_CONTEXT_TOKEN_BUDGET``
+- ``summarize``: the whole thread while it fits the token budget; beyond
+  that, the last ``CHAT_CONTEXT_KEEP_MESSAGES`` messages plus a summary of the
+  older turns, pinned through ``additional_instructions``
+
+Truncation itself is done by the agent service (``truncation_strategy`` of
+type ``last_messages``), so messages are never deleted from the thread and
+the chat history stays complete. The summary is extractive: the questions
+and the opening of each answer, without a second model call on the request
+path. Token counts are estimates (``shared/tokens.py``).
+"""
+import logging
+import os
+from typing import Any, Dict, List, Tuple
+
+from .settings import env_number
+from .tokens import CHARS_PER_TOKEN, estimate_tokens
+
+POLICIES = ("full", "last_messages", "token_budget", "summarize")
+DEFAULT_POLICY = "last_messages"
+DEFAULT_LAST_MESSAGES = 20
+DEFAULT_TOKEN_BUDGET = 12000
+DEFAULT_KEEP_MESSAGES = 6
+# Messages read to size the history; older ones are not reported or summarized
+HISTORY_LIMIT = 100
+SUMMARY_TOKENS = 1000
+SUMMARY_CHARS_PER_MESSAGE = {"user": 300, "assistant": 400}
+
+
+def context_settings() -> Dict[str, Any]:
+    policy = os.environ.get("CHAT_CONTEXT_POLICY", DEFAULT_POLICY).lower()
+    return {
+        "policy": policy if policy in POLICIES else DEFAULT_POLICY,
+        "last_messages": max(1, env_number("CHAT_CONTEXT_LAST_MESSAGES", DEFAULT_LAST_MESSAGES, int)),
+        "token_budget": max(1, env_number("CHAT_CONTEXT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET, int)),
+        "keep_messages": max(1, env_number("CHAT_CONTEXT_KEEP_MESSAGES", DEFAULT_KEEP_MESSAGES, int)),
+    }
+
+
+def message_text(message: Any) -> str:
+    parts = []
+    for content in getattr(message, "content", None) or []:
+        text = getattr(content, "text", None)
+        if text is not None:
+            parts.append(getattr(text, "value", "") or "")
+    return "\n".join(parts)
+
+
+def _excerpt(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > 0 else limit] + " …"
+
+
+def summarize_messages(messages: List[Tuple[str, str]]) -> str:
+    """Extractive summary of ``(role, text)`` turns, oldest first, newest kept when it is too long"""
+    lines = [
+        f"{'User' if role == 'user' else 'Assistant'}: {_excerpt(text, SUMMARY_CHARS_PER_MESSAGE.get(role, 300))}"
+        for role, text in messages if text.strip()
+    ]
+    budget = SUMMARY_TOKENS * CHARS_PER_TOKEN
+    kept: List[str] = []
+    for line in reversed(lines):
+        budget -= len(line) + 1
+        if budget < 0:
+            break
+        kept.append(line)
+    omitted = len(lines) - len(kept)
+    if omitted:
+        kept.append(f"({omitted} earlier messages omitted)")
+    return "\n".join(reversed(kept))
+
+
+def plan_context(messages: List[Any], settings: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """``create_run`` options for a thread and stats on the history they keep.
+
+    ``messages`` are the thread messages newest first, as ``list_messages``
+    returns them.
+    """
+    history = [(message.role, message_text(message)) for message in reversed(messages)]
+    tokens = [estimate_tokens(text) for _, text in history]
+    total = sum(tokens)
+    policy = settings["policy"]
+    keep = len(history)
+    options: Dict[str, Any] = {}
+    summary_tokens = 0
+
+    if policy == "last_messages":
+        keep = min(keep, settings["last_messages"])
+    elif policy == "token_budget":
+        used, keep = 0, 0
+        for count in reversed(tokens):
+            if keep and used + count > settings["token_budget"]:
+                break
+            used += count
+            keep += 1
+    elif policy == "summarize" and total > settings["token_budget"]:
+        keep = min(keep, settings["keep_messages"])
+        summary = summarize_messages(history[:len(history) - keep])
+        if summary:
+            options["additional_instructions"] = f"Summary of the earlier conversation in this thread:\n{summary}"
+            summary_tokens = estimate_tokens(options["additional_instructions"])
+
+    # The agent service drops the older messages; the thread itself is unchanged
+    if keep < len(history) or policy == "last_messages":
+        from azure.ai.projects.models import TruncationObject, TruncationStrategy
+
+        options["truncation_strategy"] = TruncationObject(type=TruncationStrategy.LAST_MESSAGES, last_messages=max(keep, 1))
+
+    sent = sum(tokens[len(tokens) - keep:]) + summary_tokens
+    stats = {
+        "policy": policy,
+        "historyMessages": len(history),
+        "historyTokens": total,
+        "sentMessages": keep,
+        "sentTokens": sent,
+        "savedTokens": max(0, total - sent),
+    }
+    return options, stats
+
+
+def context_run_options(project_client: Any, thread_id: str, settings: Dict[str, Any] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Plan the context of the next run on ``thread_id`` under the configured policy"""
+    settings = settings or context_settings()
+    if settings["policy"] == "full":
+        return {}, {"policy": "full"}
+    messages = project_client.agents.list_messages(thread_id=thread_id, limit=HISTORY_LIMIT)
+    options, stats = plan_context(list(getattr(messages, "data", None) or []), settings)
+    logging.info(
+        f"Context policy {stats['policy']}: sending {stats['sentMessages']}/{stats['historyMessages']} messages, "
+        f"~{stats['sentTokens']} of ~{stats['historyTokens']} tokens (~{stats['savedTokens']} saved)"
+    )
+    return options, stats
+
+
+def run_usage(run: Any) -> Dict[str, int]:
+    """Token usage the service reported for a finished run"""
+    usage = getattr(run, "usage", None)
+    if not usage:
+        return {}
+    return {
+        "promptTokens": getattr(usage, "prompt_tokens", None),
+        "completionTokens": getattr(usage, "completion_tokens", None),
+        "totalTokens": getattr(usage, "total_tokens", None),
+    }
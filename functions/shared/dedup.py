@@ -0,0 +1,275 @@
+"""Near-duplicate detection for chunks with MinHash and LSH banding.
+
+Each chunk text is reduced to a 64-value MinHash signature over its
+whitespace-token 3-shingles (one-permutation hashing: every shingle is
+hashed once and binned, so fingerprinting costs one pass over the text). The signature is split into
+16 bands of 4 values; chunks sharing a band key are candidates, and a
+candidate is a duplicate when the signatures agree on at least ``threshold``
+of their values (an estimate of the shingle Jaccard similarity).
+
+The persistent LSH index is the chunks index itself: band keys are stored in
+the filterable ``chunk_lshBands`` field and the signature in ``chunk_minhash``,
+so ingestion finds earlier near-duplicates with ``any()`` filter queries and
+no separate store has to be kept consistent with the index.
+
+``CHUNK_DEDUP`` selects what happens to a duplicate chunk:
+
+- ``off`` (default): chunks are fingerprinted but all of them are indexed
+- ``merge``: it is not indexed; its file name is added to the
+  ``chunk_sources`` of the canonical chunk
+- ``skip``: it is not indexed
+
+``merge`` and ``skip`` suit corpora of re-uploaded and copied files. Files
+from one template (contracts, invoices) differ in a few words and in their
+extracted ``chunk_<field>`` values, and a dropped chunk takes both with it:
+filters on those fields miss the file and answers cite the other file's text.
+"""
+import logging
+import os
+import zlib
+from operator import eq
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .settings import env_number
+
+NUM_HASHES = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_HASHES // BANDS
+SHINGLE_SIZE = 3
+DEFAULT_MODE = "off"
+DEFAULT_THRESHOLD = 0.85
+# Chunks shorter than this (headers, single lines) are never treated as duplicates
+MIN_TOKENS = 8
+LOOKUP_BATCH_SIZE = 500
+MODES = ("merge", "skip", "off")
+
+_BIN_MASK = NUM_HASHES - 1
+_KEY_MASK = (1 << 48) - 1
+
+Signature = List[int]
+Lookup = Callable[[List[str]], Iterable[Dict[str, Any]]]
+
+
+def dedup_mode() -> str:
+    mode = os.environ.get("CHUNK_DEDUP", DEFAULT_MODE).lower()
+    return mode if mode in MODES else DEFAULT_MODE
+
+
+def dedup_threshold() -> float:
+    return env_number("CHUNK_DEDUP_THRESHOLD", DEFAULT_THRESHOLD)
+
+
+def minhash(text: str, token_hashes: Optional[Dict[str, int]] = None) -> Optional[Signature]:
+    """MinHash signature of ``text``, or None when it is too short to compare"""
+    tokens = text.lower().split() if isinstance(text, str) else []
+    if len(tokens) < MIN_TOKENS:
+        return None
+    cache = token_hashes if token_hashes is not None else {}
+    # crc32 rather than hash(): str hashes are randomized per process
+    cache.update({token: zlib.crc32(token.encode("utf-8")) for token in set(tokens).difference(cache)})
+    ids = list(map(cache.__getitem__, tokens))
+
+    # Tuples of ints hash deterministically across processes. The low bits pick
+    # the bin; with the hashes in descending order the dict keeps the smallest
+    # per bin, so binning runs entirely in C.
+    hashes = sorted(set(map(hash, zip(ids, ids[1:], ids[2:]))), reverse=True)
+    bins = dict(zip(map(_BIN_MASK.__and__, hashes), hashes))
+
+    signature = [bins.get(slot) for slot in range(NUM_HASHES)]
+    if len(bins) < NUM_HASHES:
+        # Densify: an empty bin borrows the next filled bin's value, mixed with the distance
+        for slot in range(NUM_HASHES):
+            if signature[slot] is None:
+                step = next(step for step in range(1, NUM_HASHES) if (slot + step) % NUM_HASHES in bins)
+                signature[slot] = bins[(slot + step) % NUM_HASHES] ^ (step * 0x9E3779B97F4A7C15)
+    return signature
+
+
+def band_keys(signature: Signature) -> List[str]:
+    """LSH bucket keys of a signature, one per band"""
+    return [
+        f"{band:x}{hash(tuple(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])) & _KEY_MASK:012x}"
+        for band in range(BANDS)
+    ]
+
+
+def similarity(a: Signature, b: Signature) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(map(eq, a, b)) / NUM_HASHES
+
+
+def encode_signature(signature: Signature) -> str:
+    return ",".join(map("{:x}".format, signature))
+
+
+def decode_signature(data: Optional[str]) -> Optional[Signature]:
+    if not data:
+        return None
+    try:
+        signature = [int(value, 16) for value in data.split(",")]
+    except ValueError:
+        return None
+    return signature if len(signature) == NUM_HASHES else None
+
+
+class LshIndex:
+    """In-memory LSH buckets of signatures, keyed by an id"""
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self._buckets: Dict[str, List[str]] = {}
+        self._signatures: Dict[str, Signature] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._signatures
+
+    def add(self, key: str, signature: Signature, bands: Optional[List[str]] = None) -> None:
+        if key in self._signatures:
+            return
+        self._signatures[key] = signature
+        for band in bands or band_keys(signature):
+            self._buckets.setdefault(band, []).append(key)
+
+    def match(self, signature: Signature, bands: Optional[List[str]] = None) -> Optional[Tuple[str, float]]:
+        """The most similar indexed id at or above the threshold, with its similarity"""
+        best = None
+        seen = set()
+        for band in bands or band_keys(signature):
+            for key in self._buckets.get(band, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                score = similarity(signature, self._signatures[key])
+                if score >= self.threshold and (best is None or score > best[1]):
+                    best = (key, score)
+        return best
+
+
+def search_lookup(search_client) -> Lookup:
+    """Find indexed chunks sharing any of the band keys, in batched filter queries"""
+    def lookup(keys: List[str]) -> Iterable[Dict[str, Any]]:
+        for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+            batch = ",".join(keys[start:start + LOOKUP_BATCH_SIZE])
+            results = search_client.search(
+                search_text="*",
+                filter=f"chunk_lshBands/any(k: search.in(k, '{batch}', ','))",
+                select="chunk_id,chunk_fileName,chunk_minhash,chunk_lshBands,chunk_sources",
+                top=1000
+            )
+            yield from results
+    return lookup
+
+
+def deduplicate_chunks(
+    chunks: List[Dict[str, Any]],
+    mode: Optional[str] = None,
+    threshold: Optional[float] = None,
+    lookup: Optional[Lookup] = None,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Dict[str, Any]]:
+    """Fingerprint ``chunks`` and collapse near-duplicates.
+
+    Returns the chunks to upload, partial updates (``chunk_sources``) for
+    already indexed canonical chunks, and stats with the reduction ratio.
+    ``lookup`` queries the persistent index; without it only duplicates
+    within ``chunks`` are found.
+    """
+    mode = mode or dedup_mode()
+    index = LshIndex(threshold if threshold is not None else dedup_threshold())
+    token_hashes: Dict[str, int] = {}
+    fingerprints = []
+    for chunk in chunks:
+        signature = minhash(chunk.get("chunk_content", ""), token_hashes)
+        bands = band_keys(signature) if signature else []
+        chunk["chunk_minhash"] = encode_signature(signature) if signature else None
+        chunk["chunk_lshBands"] = bands
+        chunk.setdefault("chunk_sources", [chunk.get("chunk_fileName")])
+        fingerprints.append((signature, bands))
+
+    stats = {"chunks": len(chunks), "kept": len(chunks), "duplicates": 0, "reduction": 0.0, "mode": mode}
+    if mode == "off" or not chunks:
+        return chunks, [], stats
+
+    existing: Dict[str, Dict[str, Any]] = {}
+    own = {chunk["chunk_id"]: chunk for chunk in chunks}
+    if lookup is not None:
+        keys = sorted({band for _, bands in fingerprints for band in bands})
+        try:
+            for doc in lookup(keys):
+                if doc["chunk_id"] in own:
+                    # This file was ingested before: its chunks are overwritten, but
+                    # keep the sources other files merged into them
+                    sources = own[doc["chunk_id"]]["chunk_sources"]
+                    sources.extend(s for s in doc.get("chunk_sources") or [] if s not in sources)
+                    continue
+                signature = decode_signature(doc.get("chunk_minhash"))
+                if signature:
+                    existing[doc["chunk_id"]] = doc
+                    index.add(doc["chunk_id"], signature, doc.get("chunk_lshBands"))
+        except Exception as e:
+            logging.warning(f"Duplicate lookup failed, deduplicating within the file only: {str(e)}")
+
+    kept = []
+    canonical: Dict[str, Dict[str, Any]] = {}
+    for chunk, (signature, bands) in zip(chunks, fingerprints):
+        match = index.match(signature, bands) if signature else None
+        if match is None:
+            if signature:
+                index.add(chunk["chunk_id"], signature, bands)
+                canonical[chunk["chunk_id"]] = chunk
+            kept.append(chunk)
+            continue
+        stats["duplicates"] += 1
+        if mode == "merge":
+            target = canonical.get(match[0]) or existing[match[0]]
+            sources = target["chunk_sources"] = list(target.get("chunk_sources") or [])
+            if chunk.get("chunk_fileName") not in sources:
+                sources.append(chunk.get("chunk_fileName"))
+                target["_sourcesChanged"] = True
+
+    updates = [
+        {"chunk_id": doc["chunk_id"], "chunk_sources": doc["chunk_sources"]}
+        for doc in existing.values() if doc.pop("_sourcesChanged", False)
+    ]
+    for chunk in kept:
+        chunk.pop("_sourcesChanged", None)
+    stats["kept"] = len(kept)
+    stats["reduction"] = round(stats["duplicates"] / len(chunks), 4)
+    return kept, updates, stats
+
+
+def collapse_duplicates(
+    results: List[Dict[str, Any]],
+    text_field: str,
+    threshold: float = DEFAULT_THRESHOLD,
+    max_chars: int = 20000,
+    name_field: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Drop search results that are near-duplicates of a higher ranked one.
+
+    Kept results get ``duplicates``, the number of results folded into them,
+    and with ``name_field`` also ``duplicate_names``, the distinct names of
+    those results other than the kept one's, in rank order. Signatures are
+    computed from the returned text, so this also works for documents indexed
+    without fingerprints.
+    """
+    index = LshIndex(threshold)
+    token_hashes: Dict[str, int] = {}
+    kept = []
+    for result in results:
+        text = result.get(text_field)
+        signature = minhash(text[:max_chars], token_hashes) if isinstance(text, str) else None
+        match = index.match(signature) if signature else None
+        if match is not None:
+            leader = kept[int(match[0])]
+            leader["duplicates"] = leader.get("duplicates", 0) + 1
+            name = result.get(name_field) if name_field else None
+            if name and name != leader.get(name_field) and name not in leader.setdefault("duplicate_names", []):
+                leader["duplicate_names"].append(name)
+            continue
+        if signature:
+            index.add(str(len(kept)), signature)
+        kept.append(result)
+    return kept
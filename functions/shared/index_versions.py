@@ -0,0 +1,204 @@
+"""Versioned search indexes (blue/green).
+
+Each logical index (``artifacts``, ``chunks``) is served by a physical index
+``<name>_v<version>``. ``schemas/index_versions.json`` records, per logical
+index, the ``active`` version that queries use and an optional ``building``
+version that is being rebuilt in the background:
+
+    {"artifacts": {"active": {"name": "artifacts_v2", "version": 2, "fields": [...]},
+                   "building": {"name": "artifacts_v3", "version": 3, "fields": [...]},
+                   "previous": {...}}}
+
+Ingestion writes to both the active and the building index, so the new
+version only has to catch up on files that existed when the build started.
+Switching is a single conditional write of the state blob. Without a state
+blob the unversioned index names are used, with the fields of their live
+definition (read from the service and cached like the state), so documents
+with fields added since that index was created are projected onto it.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .storage import SCHEMAS_CONTAINER, container_client
+
+VERSIONS_BLOB = "index_versions.json"
+# Functions re-read the state at most this often; the reindex job waits this
+# long before listing files so every writer has seen the building index
+CACHE_TTL_SECONDS = 30
+
+_cache: Dict[str, Any] = {"state": None, "loaded_at": 0.0}
+_cache_lock = threading.Lock()
+# index name -> (field names or None, loaded at)
+_live_fields: Dict[str, tuple] = {}
+
+
+def _schemas_container():
+    return container_client(SCHEMAS_CONTAINER)
+
+
+def _read_versions(container) -> tuple:
+    from azure.core.exceptions import ResourceNotFoundError
+
+    try:
+        downloader = container.get_blob_client(VERSIONS_BLOB).download_blob()
+        return json.loads(downloader.readall()), downloader.properties.etag
+    except ResourceNotFoundError:
+        return {}, None
+
+
+def get_index_versions(refresh: bool = False) -> Dict[str, Any]:
+    """Return the version state, cached for ``CACHE_TTL_SECONDS``"""
+    with _cache_lock:
+        if refresh or _cache["state"] is None or time.monotonic() - _cache["loaded_at"] > CACHE_TTL_SECONDS:
+            _cache["state"], _ = _read_versions(_schemas_container())
+            _cache["loaded_at"] = time.monotonic()
+        return _cache["state"]
+
+
+def live_index_fields(index_name: str) -> Optional[List[str]]:
+    """Field names of an existing index as defined in the service, or None when unknown.
+
+    Cached for ``CACHE_TTL_SECONDS``. The embedded backend accepts any field,
+    so it has none to report, and neither has an app without a search service.
+    """
+    from .search_clients import use_local_search
+
+    if use_local_search() or not os.environ.get("SEARCH_ENDPOINT"):
+        return None
+    cached = _live_fields.get(index_name)
+    if cached and time.monotonic() - cached[1] <= CACHE_TTL_SECONDS:
+        return cached[0]
+    from azure.core.credentials import AzureKeyCredential
+    from azure.core.exceptions import ResourceNotFoundError
+    from azure.search.documents.indexes import SearchIndexClient
+
+    try:
+        client = SearchIndexClient(os.environ["SEARCH_ENDPOINT"], credential=AzureKeyCredential(os.environ["SEARCH_ADMIN_KEY"]))
+        fields = [field.name for field in client.get_index(index_name).fields]
+    except ResourceNotFoundError:
+        fields = None
+    except Exception as e:
+        # Without the definition documents go out unprojected, as before versioning
+        logging.warning(f"Could not read the fields of index {index_name}: {e}")
+        fields = cached[0] if cached else None
+    _live_fields[index_name] = (fields, time.monotonic())
+    return fields
+
+
+def active_index(base_name: str, versions: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """The physical index queries should use, as ``{"name", "version", "fields"}``"""
+    versions = get_index_versions() if versions is None else versions
+    active = versions.get(base_name, {}).get("active")
+    if active:
+        return active
+    # An index from before versioning; its fields are those it was created with
+    return {"name": base_name, "version": 0, "fields": live_index_fields(base_name)}
+
+
+def active_index_name(base_name: str) -> str:
+    return active_index(base_name)["name"]
+
+
+def write_indexes(base_name: str, versions: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """The physical indexes new documents must be written to (active, then building)"""
+    versions = get_index_versions() if versions is None else versions
+    targets = [active_index(base_name, versions)]
+    building = versions.get(base_name, {}).get("building")
+    if building:
+        targets.append(building)
+    return targets
+
+
+def building_index(base_name: str, versions: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    versions = get_index_versions() if versions is None else versions
+    return versions.get(base_name, {}).get("building")
+
+
+def project_document(document: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """Drop the properties an index version does not define"""
+    if fields is None:
+        return document
+    return {k: v for k, v in document.items() if k in fields}
+
+
+def update_index_versions(mutate: Callable[[Dict[str, Any]], None], retries: int = 5) -> Dict[str, Any]:
+    """Apply ``mutate`` to the stored state with optimistic concurrency"""
+    from azure.core import MatchConditions
+    from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+
+    container = _schemas_container()
+    for _ in range(retries):
+        state, etag = _read_versions(container)
+        mutate(state)
+        blob = container.get_blob_client(VERSIONS_BLOB)
+        try:
+            if etag:
+                blob.upload_blob(json.dumps(state, indent=2), overwrite=True, etag=etag,
+                                 match_condition=MatchConditions.IfNotModified)
+            else:
+                blob.upload_blob(json.dumps(state, indent=2), overwrite=False)
+        except (ResourceModifiedError, ResourceExistsError):
+            logging.info("Index versions changed concurrently, retrying")
+            continue
+        with _cache_lock:
+            _cache["state"], _cache["loaded_at"] = state, time.monotonic()
+        return state
+    raise RuntimeError("Could not update index versions after concurrent modifications")
+
+
+def next_version(base_name: str, versions: Dict[str, Any]) -> int:
+    entry = versions.get(base_name, {})
+    return max(
+        (entry.get(slot) or {}).get("version", 0) for slot in ("active", "building", "previous")
+    ) + 1
+
+
+def versioned_name(base_name: str, version: int) -> str:
+    return f"{base_name}_v{version}"
+
+
+def begin_build(base_name: str, version: int, fields: List[str]) -> Dict[str, Any]:
+    """Record ``version`` as the building index of ``base_name``"""
+    entry = {"name": versioned_name(base_name, version), "version": version, "fields": fields,
+             "startedAt": time.time()}
+
+    def mutate(state):
+        state.setdefault(base_name, {})["building"] = entry
+    update_index_versions(mutate)
+    return entry
+
+
+def set_active(base_name: str, version: int, fields: List[str]) -> Dict[str, Any]:
+    """Make ``version`` active directly (for a new index with nothing to rebuild)"""
+    entry = {"name": versioned_name(base_name, version), "version": version, "fields": fields}
+
+    def mutate(state):
+        state.setdefault(base_name, {})["active"] = entry
+    update_index_versions(mutate)
+    return entry
+
+
+def activate_building(base_names: List[str]) -> Dict[str, Any]:
+    """Atomically make the building versions of ``base_names`` active.
+
+    Returns the superseded ``previous`` entries so callers can drop them.
+    """
+    retired = {}
+
+    def mutate(state):
+        retired.clear()
+        for base_name in base_names:
+            entry = state.setdefault(base_name, {})
+            if not entry.get("building"):
+                continue
+            if entry.get("previous"):
+                retired[base_name] = entry["previous"]
+            entry["previous"] = entry.get("active")
+            entry["active"] = entry.pop("building")
+            entry["active"].pop("startedAt", None)
+    update_index_versions(mutate)
+    return retired
@@ -0,0 +1,150 @@
+"""Per-blob checkpoints of ingestion, so a retried blob resumes where it failed.
+
+Ingestion runs three stages per blob:
+
+- ``analyzed``: Content Understanding has analyzed the file; the result is
+  the archive in the ``analysis`` container (``shared/analysis_store.py``)
+- ``chunked``: artifact and deduplicated chunk documents are built; they are
+  stored gzip-compressed next to the checkpoint
+- ``indexed``: the documents are in the search indexes
+
+The checkpoint record (``ingestion-checkpoints/<blob>.json``) lists the
+completed stages with their timings, the attempts and the last error. It is
+tied to a hash of the blob content, so a re-uploaded file starts over, and to
+a hash of the schema, so documents built under an older schema are rebuilt.
+Once a blob is indexed its checkpoint is deleted.
+
+A blob whose content cannot be ingested (``UnprocessableContent``, e.g. no
+analysis results), or that fails ``INGESTION_MAX_ATTEMPTS`` times, gets a dead-letter record
+(``ingestion-deadletter/<blob>.json``) with the error and the stage timings
+and is not retried; the same content is skipped until the record is deleted.
+"""
+import gzip
+import hashlib
+import json
+import time
+from typing import Any, Dict, Optional
+
+from .settings import env_number
+from .storage import container_client, upload_blob
+
+CHECKPOINT_CONTAINER = "ingestion-checkpoints"
+DEADLETTER_CONTAINER = "ingestion-deadletter"
+STAGES = ("analyzed", "chunked", "indexed")
+# The blob trigger delivers a blob up to five times (queues.maxDequeueCount)
+DEFAULT_MAX_ATTEMPTS = 5
+
+
+class UnprocessableContent(Exception):
+    """The file itself cannot be ingested; retrying would only repeat the analysis"""
+
+
+# Errors about the content itself; configuration and service errors are retried
+PERMANENT_ERRORS = (UnprocessableContent,)
+
+
+def max_attempts() -> int:
+    return max(1, env_number("INGESTION_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS, int))
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def schema_hash(schema_json: Dict[str, Any]) -> str:
+    """Hash of the schema parts that shape the indexed documents"""
+    shape = {"name": schema_json.get("name"), "fields": schema_json.get("fields")}
+    return hashlib.sha256(json.dumps(shape, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _read_json(container, name: str) -> Optional[Dict[str, Any]]:
+    from azure.core.exceptions import ResourceNotFoundError
+
+    try:
+        return json.loads(container.get_blob_client(name).download_blob().readall())
+    except ResourceNotFoundError:
+        return None
+
+
+def _delete(container, name: str) -> None:
+    from azure.core.exceptions import ResourceNotFoundError
+
+    try:
+        container.delete_blob(name)
+    except ResourceNotFoundError:
+        pass
+
+
+def load_checkpoint(blob_name: str, content_sha: str, schema_sha: str, container=None) -> Dict[str, Any]:
+    """The checkpoint of ``blob_name``, reset where content or schema changed since it was written"""
+    container = container or container_client(CHECKPOINT_CONTAINER)
+    checkpoint = _read_json(container, f"{blob_name}.json")
+    if not checkpoint or checkpoint.get("contentHash") != content_sha:
+        return {"blob": blob_name, "contentHash": content_sha, "schemaHash": schema_sha, "stages": {}, "attempts": []}
+    if checkpoint.get("schemaHash") != schema_sha:
+        # The analysis still holds; documents are rebuilt under the new schema
+        checkpoint["stages"] = {k: v for k, v in checkpoint["stages"].items() if k == "analyzed"}
+        checkpoint["schemaHash"] = schema_sha
+    return checkpoint
+
+
+def save_checkpoint(checkpoint: Dict[str, Any], container=None) -> None:
+    container = container or container_client(CHECKPOINT_CONTAINER)
+    upload_blob(container, f"{checkpoint['blob']}.json", json.dumps(checkpoint))
+
+
+def complete_stage(checkpoint: Dict[str, Any], stage: str, started: float, container=None) -> None:
+    """Record ``stage`` as done (``started`` is its ``time.perf_counter()`` start)"""
+    checkpoint["stages"][stage] = {"ms": round((time.perf_counter() - started) * 1000), "at": time.time()}
+    save_checkpoint(checkpoint, container)
+
+
+def save_documents(blob_name: str, documents: Dict[str, Any], container=None) -> None:
+    """Store the output of the ``chunked`` stage"""
+    container = container or container_client(CHECKPOINT_CONTAINER)
+    data = gzip.compress(json.dumps(documents, separators=(",", ":")).encode("utf-8"), compresslevel=1)
+    upload_blob(container, f"{blob_name}.documents.json.gz", data)
+
+
+def load_documents(blob_name: str, container=None) -> Optional[Dict[str, Any]]:
+    from azure.core.exceptions import ResourceNotFoundError
+
+    container = container or container_client(CHECKPOINT_CONTAINER)
+    try:
+        return json.loads(gzip.decompress(
+            container.get_blob_client(f"{blob_name}.documents.json.gz").download_blob().readall()
+        ))
+    except ResourceNotFoundError:
+        return None
+
+
+def clear_checkpoint(blob_name: str, container=None) -> None:
+    """Drop the checkpoint and stage outputs of a blob that is fully indexed"""
+    container = container or container_client(CHECKPOINT_CONTAINER)
+    _delete(container, f"{blob_name}.documents.json.gz")
+    _delete(container, f"{blob_name}.json")
+
+
+def load_dead_letter(blob_name: str, container=None) -> Optional[Dict[str, Any]]:
+    return _read_json(container or container_client(DEADLETTER_CONTAINER), f"{blob_name}.json")
+
+
+def dead_letter(checkpoint: Dict[str, Any], stage: str, error: Exception, container=None) -> Dict[str, Any]:
+    """Record a blob that will not be retried, with its error and stage timings"""
+    record = {
+        "blob": checkpoint["blob"],
+        "contentHash": checkpoint["contentHash"],
+        "failedStage": stage,
+        "error": str(error),
+        "errorType": type(error).__name__,
+        "permanent": isinstance(error, PERMANENT_ERRORS),
+        "stages": checkpoint["stages"],
+        "attempts": checkpoint["attempts"],
+        "at": time.time(),
+    }
+    upload_blob(container or container_client(DEADLETTER_CONTAINER), f"{checkpoint['blob']}.json", json.dumps(record))
+    return record
+
+
+def clear_dead_letter(blob_name: str, container=None) -> None:
+    _delete(container or container_client(DEADLETTER_CONTAINER), f"{blob_name}.json")
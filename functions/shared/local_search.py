@@ -0,0 +1,570 @@
+"""Embedded search backend implementing the ``SearchClient`` subset this app uses.
+
+Selected with ``SEARCH_BACKEND=local`` (see ``shared.search_clients``). Each
+index keeps BM25 postings for its searchable text fields, an exhaustive or
+HNSW vector index for its vector field, and evaluates OData filters in-process.
+
+Set ``LOCAL_SEARCH_PATH`` to persist indexes as append-only JSON Lines logs so
+several worker processes (ingestion, tools, benchmarks) share the same data.
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from .odata_filter import compile_filter, parse_datetime
+from .vector_index import build_vector_index, cosine_score
+
+# Field layout of the indexes created by create_search_indexes
+INDEX_DEFINITIONS = {
+    "artifacts": {"key": "id", "searchable": ["content"], "vector": "contentVector"},
+    "chunks": {
+        "key": "chunk_id",
+        "searchable": ["chunk_content", "chunk_headers"],
+        "vector": "chunk_contentVector",
+        # Text weights of the default scoring profile (CHUNK_TEXT_WEIGHTS)
+        "weights": {"chunk_headers": 2.0, "chunk_content": 1.0},
+    },
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+DEFAULT_TOP = 50
+
+_WRITER_ID = uuid.uuid4().hex
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: Any) -> List[str]:
+    if isinstance(text, list):
+        # Searchable string collections are indexed as one text
+        text = " ".join(t for t in text if isinstance(t, str))
+    return _TOKEN.findall(text.lower()) if isinstance(text, str) else []
+
+
+def index_definition(index_name: str) -> Dict[str, Any]:
+    """Look up the field layout for an index (versioned names share their base layout)"""
+    base = re.sub(r"_v\d+$", "", index_name)
+    return INDEX_DEFINITIONS.get(base, {"key": "id", "searchable": ["content"], "vector": "contentVector"})
+
+
+class LocalIndexingResult:
+    """Mirrors ``azure.search.documents.models.IndexingResult``"""
+
+    def __init__(self, key: str, succeeded: bool = True, status_code: int = 200, error_message: str = None):
+        self.key = key
+        self.succeeded = succeeded
+        self.status_code = status_code
+        self.error_message = error_message
+
+
+class LocalSearchResults:
+    """Iterable search results with ``get_count()`` like ``SearchItemPaged``"""
+
+    def __init__(self, results: List[Dict[str, Any]], count: int, facets: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+        self._results = results
+        self._count = count
+        self._facets = facets
+
+    def __iter__(self):
+        return iter(self._results)
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get_count(self) -> int:
+        return self._count
+
+    def get_facets(self) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+        return self._facets
+
+
+def _bucket_start(value: Any, interval: str) -> Optional[str]:
+    instant = parse_datetime(value) if isinstance(value, str) else value
+    if not isinstance(instant, datetime):
+        return None
+    instant = instant.astimezone(timezone.utc) if instant.tzinfo else instant
+    if interval == "year":
+        instant = instant.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    elif interval == "quarter":
+        instant = instant.replace(month=(instant.month - 1) // 3 * 3 + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    elif interval == "month":
+        instant = instant.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    elif interval == "week":
+        instant = (instant - timedelta(days=instant.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    elif interval == "day":
+        instant = instant.replace(hour=0, minute=0, second=0, microsecond=0)
+    elif interval == "hour":
+        instant = instant.replace(minute=0, second=0, microsecond=0)
+    else:
+        instant = instant.replace(second=0, microsecond=0)
+    return instant.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def compute_facets(docs: Iterable[Dict[str, Any]], facets: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Facet counts in the shape Azure AI Search returns (``field,count:N``, ``field,interval:month``)"""
+    specs = []
+    for facet in facets:
+        field, *options = [part.strip() for part in facet.split(",")]
+        params = dict(option.split(":", 1) for option in options if ":" in option)
+        specs.append((field, params, {}))
+    for doc in docs:
+        for field, params, counts in specs:
+            value = doc.get(field)
+            values = value if isinstance(value, list) else [value]
+            if "interval" in params:
+                values = [_bucket_start(v, params["interval"]) for v in values]
+            for v in values:
+                if v is not None:
+                    counts[v] = counts.get(v, 0) + 1
+    result = {}
+    for field, params, counts in specs:
+        if "interval" in params:
+            entries = sorted(counts.items())
+        else:
+            entries = sorted(counts.items(), key=lambda e: (-e[1], str(e[0])))[:int(params.get("count", 10))]
+        result[field] = [{"value": value, "count": count} for value, count in entries]
+    return result
+
+
+class _Query:
+    """Simple-syntax query: terms, "phrases", +required, -excluded, prefix*"""
+
+    def __init__(self, search_text: Optional[str], search_mode: str = "any"):
+        self.optional: List[str] = []
+        self.required: List[str] = []
+        self.excluded: List[str] = []
+        self.prefixes: List[str] = []
+        self.phrases: List[str] = []
+        text = (search_text or "").strip()
+        self.match_all = text in ("", "*")
+        if self.match_all:
+            return
+        for token in re.findall(r'[+-]?"[^"]*"|\S+', text):
+            sign = token[0] if token[0] in "+-" else ""
+            body = token[len(sign):]
+            if body.startswith('"') and body.endswith('"') and len(body) > 1:
+                terms = tokenize(body[1:-1])
+                if sign == "-":
+                    self.excluded.extend(terms)
+                else:
+                    self.required.extend(terms)
+                    self.phrases.append(" ".join(terms))
+                continue
+            if body.endswith("*") and len(body) > 1 and sign != "-":
+                self.prefixes.extend(tokenize(body[:-1]))
+                continue
+            terms = tokenize(body)
+            if sign == "-":
+                self.excluded.extend(terms)
+            elif sign == "+" or search_mode == "all":
+                self.required.extend(terms)
+            else:
+                self.optional.extend(terms)
+
+    @property
+    def scoring_terms(self) -> List[str]:
+        return self.optional + self.required
+
+
+class LocalSearchIndex:
+    """One in-memory index; thread-safe, optionally backed by a JSONL log"""
+
+    def __init__(
+        self,
+        name: str,
+        key_field: str,
+        searchable_fields: List[str],
+        vector_field: Optional[str] = None,
+        path: Optional[str] = None,
+        vector_profile: Optional[Dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.key_field = key_field
+        self.searchable_fields = list(searchable_fields)
+        self.vector_field = vector_field
+        self.field_weights: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self._docs: List[Optional[Dict[str, Any]]] = []
+        self._slots: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[str, Dict[int, int]]] = {f: {} for f in self.searchable_fields}
+        self._lengths: Dict[str, Dict[int, int]] = {f: {} for f in self.searchable_fields}
+        self._total_length: Dict[str, int] = {f: 0 for f in self.searchable_fields}
+        # field -> value -> slots, built lazily for fields used in eq/search.in filters
+        self._value_index: Dict[str, Dict[Any, set]] = {}
+        self._vectors = build_vector_index(vector_profile)
+        self._log_path = os.path.join(path, f"{name}.jsonl") if path else None
+        self._log_offset = 0
+        if self._log_path:
+            os.makedirs(path, exist_ok=True)
+            self._refresh()
+
+    # -- document storage -------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _index_text(self, slot: int, doc: Dict[str, Any], sign: int) -> None:
+        for field in self.searchable_fields:
+            terms = tokenize(doc.get(field))
+            postings = self._postings[field]
+            counts: Dict[str, int] = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                if sign > 0:
+                    postings.setdefault(term, {})[slot] = count
+                else:
+                    entry = postings.get(term)
+                    if entry is not None:
+                        entry.pop(slot, None)
+                        if not entry:
+                            del postings[term]
+            if sign > 0:
+                self._lengths[field][slot] = len(terms)
+                self._total_length[field] += len(terms)
+            else:
+                self._total_length[field] -= self._lengths[field].pop(slot, 0)
+
+    def _index_values(self, slot: int, doc: Dict[str, Any], sign: int) -> None:
+        for field, values in self._value_index.items():
+            value = doc.get(field)
+            if not isinstance(value, (str, int)):
+                continue
+            if sign > 0:
+                values.setdefault(value, set()).add(slot)
+            else:
+                values.get(value, set()).discard(slot)
+
+    def _candidates(self, predicate) -> Optional[set]:
+        """Slots that can satisfy the filter's eq/search.in constraints (None = all)"""
+        constraints = getattr(predicate, "constraints", None)
+        if not constraints:
+            return None
+        candidates = None
+        for field, allowed in constraints:
+            values = self._value_index.get(field)
+            if values is None:
+                values = {}
+                for slot, doc in enumerate(self._docs):
+                    value = doc.get(field) if doc is not None else None
+                    if isinstance(value, (str, int)):
+                        values.setdefault(value, set()).add(slot)
+                self._value_index[field] = values
+            matched = set()
+            for value in allowed:
+                matched |= values.get(value, set())
+            candidates = matched if candidates is None else candidates & matched
+        return candidates
+
+    def _remove(self, key: str) -> bool:
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return False
+        self._index_text(slot, self._docs[slot], -1)
+        self._index_values(slot, self._docs[slot], -1)
+        self._vectors.remove(slot)
+        self._docs[slot] = None
+        return True
+
+    def _put(self, doc: Dict[str, Any]) -> None:
+        key = doc[self.key_field]
+        self._remove(key)
+        stored = dict(doc)
+        vector = stored.pop(self.vector_field, None) if self.vector_field else None
+        slot = len(self._docs)
+        self._docs.append(stored)
+        self._slots[key] = slot
+        self._index_text(slot, stored, 1)
+        self._index_values(slot, stored, 1)
+        if vector:
+            self._vectors.add(slot, vector)
+
+    def _apply(self, action: str, documents: Iterable[Dict[str, Any]]) -> List[LocalIndexingResult]:
+        results = []
+        for doc in documents:
+            key = doc.get(self.key_field)
+            if key is None:
+                results.append(LocalIndexingResult(None, False, 400, f"Missing key field '{self.key_field}'"))
+                continue
+            exists = key in self._slots
+            if action == "delete":
+                self._remove(key)
+                results.append(LocalIndexingResult(key, True, 200))
+            elif action == "merge" and not exists:
+                results.append(LocalIndexingResult(key, False, 404, "Document not found"))
+            elif action in ("merge", "mergeOrUpload") and exists:
+                merged = {**self._docs[self._slots[key]], **doc}
+                self._put(merged)
+                results.append(LocalIndexingResult(key, True, 200))
+            else:
+                self._put(doc)
+                results.append(LocalIndexingResult(key, True, 200 if exists else 201))
+        return results
+
+    def index_documents(self, action: str, documents: List[Dict[str, Any]]) -> List[LocalIndexingResult]:
+        with self._lock:
+            self._refresh()
+            results = self._apply(action, documents)
+            if self._log_path:
+                with open(self._log_path, "a", encoding="utf-8") as log:
+                    log.write(json.dumps({"writer": _WRITER_ID, "action": action, "documents": documents}) + "\n")
+            return results
+
+    def _refresh(self) -> None:
+        """Apply log entries written by other processes since the last read"""
+        if not self._log_path or not os.path.exists(self._log_path):
+            return
+        if os.path.getsize(self._log_path) <= self._log_offset:
+            return
+        with open(self._log_path, "r", encoding="utf-8") as log:
+            log.seek(self._log_offset)
+            for line in log:
+                if not line.endswith("\n"):
+                    break  # partially written entry; pick it up next time
+                self._log_offset += len(line.encode("utf-8"))
+                entry = json.loads(line)
+                if entry["writer"] != _WRITER_ID:
+                    self._apply(entry["action"], entry["documents"])
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            slot = self._slots.get(key)
+            return dict(self._docs[slot]) if slot is not None else None
+
+    # -- querying ---------------------------------------------------------
+
+    def _bm25(self, query: _Query, fields: List[str]) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        doc_count = len(self._slots) or 1
+        for field in fields:
+            postings = self._postings.get(field, {})
+            lengths = self._lengths[field]
+            avg_length = (self._total_length[field] / doc_count) or 1.0
+            weight = self.field_weights.get(field, 1.0)
+            terms = list(query.scoring_terms)
+            for prefix in query.prefixes:
+                terms.extend(t for t in postings if t.startswith(prefix))
+            for term in terms:
+                entry = postings.get(term)
+                if not entry:
+                    continue
+                idf = math.log(1 + (doc_count - len(entry) + 0.5) / (len(entry) + 0.5))
+                for slot, tf in entry.items():
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * lengths.get(slot, 0) / avg_length)
+                    scores[slot] = scores.get(slot, 0.0) + weight * idf * tf * (BM25_K1 + 1) / norm
+        return scores
+
+    def _text_matches(self, query: _Query, fields: List[str], candidates: Optional[set]) -> Dict[int, float]:
+        if query.match_all:
+            return {slot: 1.0 for slot in (self._slots.values() if candidates is None else candidates)}
+        scores = self._bm25(query, fields)
+        if not query.optional and not query.prefixes and query.excluded and not query.required:
+            # Only negative terms: everything except the excluded documents
+            scores = {slot: 1.0 for slot in self._slots.values()}
+
+        def contains(slot: int, term: str) -> bool:
+            return any(slot in self._postings[f].get(term, {}) for f in fields)
+
+        for term in query.required:
+            scores = {s: v for s, v in scores.items() if contains(s, term)}
+        for term in query.excluded:
+            scores = {s: v for s, v in scores.items() if not contains(s, term)}
+        for phrase in query.phrases:
+            scores = {
+                s: v for s, v in scores.items()
+                if any(phrase in " ".join(tokenize(self._docs[s].get(f))) for f in fields)
+            }
+        return scores
+
+    @staticmethod
+    def _sort_key(value: Any):
+        return (value is None, value)
+
+    def search(
+        self,
+        search_text: Optional[str] = None,
+        *,
+        filter: Optional[str] = None,
+        top: Optional[int] = None,
+        skip: Optional[int] = None,
+        select: Any = None,
+        search_fields: Any = None,
+        search_mode: Optional[str] = None,
+        order_by: Any = None,
+        vector_queries: Optional[List[Any]] = None,
+        scoring_profile: Optional[str] = None,
+        include_total_count: Optional[bool] = None,
+        facets: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> LocalSearchResults:
+        fields = _as_list(search_fields) or self.searchable_fields
+        fields = [f for f in fields if f in self._postings]
+        query = _Query(search_text, str(search_mode or "any").lower())
+        predicate = compile_filter(filter) if filter else None
+
+        with self._lock:
+            self._refresh()
+
+            candidates = self._candidates(predicate)
+
+            def allowed(slot: int) -> bool:
+                doc = self._docs[slot]
+                return (
+                    doc is not None
+                    and (candidates is None or slot in candidates)
+                    and (predicate is None or predicate(doc))
+                )
+
+            text_scores = None
+            if not (vector_queries and query.match_all):
+                matches = self._text_matches(query, fields, candidates)
+                text_scores = {s: v for s, v in matches.items() if allowed(s)}
+
+            if vector_queries:
+                ranked_lists = []
+                if text_scores is not None:
+                    ranked_lists.append(sorted(text_scores, key=lambda s: -text_scores[s]))
+                vector_scores: Dict[int, float] = {}
+                for vq in vector_queries:
+                    vector = _attr(vq, "vector")
+                    k = _attr(vq, "k_nearest_neighbors") or _attr(vq, "k") or DEFAULT_TOP
+                    hits = self._vectors.search(vector, k, allowed) if vector else []
+                    ranked_lists.append([slot for slot, _ in hits])
+                    for slot, similarity in hits:
+                        vector_scores[slot] = max(vector_scores.get(slot, 0.0), cosine_score(similarity))
+                if len(ranked_lists) == 1:
+                    scores = vector_scores
+                else:
+                    # Hybrid queries are fused with reciprocal rank fusion, as in Azure AI Search
+                    scores = {}
+                    for ranked in ranked_lists:
+                        for rank, slot in enumerate(ranked):
+                            scores[slot] = scores.get(slot, 0.0) + 1.0 / (RRF_K + rank + 1)
+            else:
+                scores = text_scores
+
+            ordering = _as_list(order_by)
+            slots = sorted(scores, key=lambda s: -scores[s])
+            for clause in reversed(ordering):
+                parts = clause.split()
+                field, direction = parts[0], (parts[1].lower() if len(parts) > 1 else "asc")
+                if field.lower() == "search.score()":
+                    key = lambda s: scores[s]
+                else:
+                    key = lambda s, f=field: self._sort_key(self._docs[s].get(f))
+                slots.sort(key=key, reverse=direction == "desc")
+
+            count = len(slots)
+            start = skip or 0
+            page = slots[start:start + (top if top is not None else DEFAULT_TOP)]
+            selected = _as_list(select)
+            results = []
+            for slot in page:
+                doc = self._docs[slot]
+                result = {k: doc[k] for k in selected if k in doc} if selected else dict(doc)
+                result["@search.score"] = scores[slot]
+                result["@search.reranker_score"] = None
+                result["@search.highlights"] = None
+                results.append(result)
+            facet_counts = compute_facets((self._docs[s] for s in slots), facets) if facets else None
+            return LocalSearchResults(results, count, facet_counts)
+
+
+def _attr(obj: Any, name: str) -> Any:
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+def _as_list(value: Any) -> List[str]:
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(",") if part.strip()]
+    return list(value)
+
+
+def _local_vector_profile() -> Dict[str, Any]:
+    algorithm = os.environ.get("LOCAL_SEARCH_VECTOR_ALGORITHM", "exhaustive").lower()
+    return {
+        "algorithm": "hnsw" if algorithm == "hnsw" else "exhaustiveKnn",
+        "compression": os.environ.get("LOCAL_SEARCH_VECTOR_COMPRESSION", "none").lower(),
+    }
+
+
+_INDEXES: Dict[str, LocalSearchIndex] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_local_index(index_name: str) -> LocalSearchIndex:
+    """Return the process-wide local index with this name, creating it on first use"""
+    with _REGISTRY_LOCK:
+        index = _INDEXES.get(index_name)
+        if index is None:
+            definition = index_definition(index_name)
+            index = LocalSearchIndex(
+                name=index_name,
+                key_field=definition["key"],
+                searchable_fields=definition["searchable"],
+                vector_field=definition.get("vector"),
+                path=os.environ.get("LOCAL_SEARCH_PATH") or None,
+                vector_profile=_local_vector_profile(),
+            )
+            index.field_weights.update(definition.get("weights", {}))
+            _INDEXES[index_name] = index
+            logging.info(f"Opened local search index {index_name} ({len(index)} documents)")
+        return index
+
+
+def reset_local_indexes() -> None:
+    """Drop all in-memory indexes (persisted logs are left untouched)"""
+    with _REGISTRY_LOCK:
+        _INDEXES.clear()
+
+
+class LocalSearchClient:
+    """Drop-in for ``azure.search.documents.SearchClient`` backed by a local index"""
+
+    def __init__(self, endpoint: str = None, index_name: str = "", credential: Any = None, **kwargs: Any):
+        self._index_name = index_name
+        self._index = get_local_index(index_name)
+
+    def search(self, search_text: Optional[str] = None, **kwargs: Any) -> LocalSearchResults:
+        return self._index.search(search_text, **kwargs)
+
+    def upload_documents(self, documents: List[Dict[str, Any]], **kwargs: Any) -> List[LocalIndexingResult]:
+        return self._index.index_documents("upload", documents)
+
+    def merge_documents(self, documents: List[Dict[str, Any]], **kwargs: Any) -> List[LocalIndexingResult]:
+        return self._index.index_documents("merge", documents)
+
+    def merge_or_upload_documents(self, documents: List[Dict[str, Any]], **kwargs: Any) -> List[LocalIndexingResult]:
+        return self._index.index_documents("mergeOrUpload", documents)
+
+    def delete_documents(self, documents: List[Dict[str, Any]], **kwargs: Any) -> List[LocalIndexingResult]:
+        return self._index.index_documents("delete", documents)
+
+    def get_document(self, key: str, selected_fields: Optional[List[str]] = None, **kwargs: Any) -> Dict[str, Any]:
+        doc = self._index.get(key)
+        if doc is None:
+            from azure.core.exceptions import ResourceNotFoundError
+            raise ResourceNotFoundError(f"Document {key} not found in local index {self._index_name}")
+        return {k: v for k, v in doc.items() if k in selected_fields} if selected_fields else doc
+
+    def get_document_count(self, **kwargs: Any) -> int:
+        return len(self._index)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "LocalSearchClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
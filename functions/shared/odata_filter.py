@@ -0,0 +1,324 @@
+"""Evaluator for the subset of OData ``$filter`` that the agent emits.
+
+Supports comparisons (``eq ne gt ge lt le``), ``and``/``or``/``not``,
+parentheses, ``search.in(field, 'a,b', ',')``, ``search.ismatch('text', 'fields')``
+and lambda expressions over string collections (``tags/any(t: t eq 'x')``,
+``tags/all(...)``). Filters compile to plain Python predicates over documents.
+"""
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Predicate = Callable[[Dict[str, Any], Dict[str, Any]], bool]
+
+_TOKEN_PATTERN = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<datetime>\d{4}-\d{2}-\d{2}T\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:\d{2})?)
+  | (?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<ident>[A-Za-z_][\w.]*)
+  | (?P<punct>[()/,:])
+""", re.VERBOSE)
+
+_DATETIME_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}")
+_COMPARISONS = {"eq", "ne", "gt", "ge", "lt", "le"}
+
+
+class ODataFilterError(ValueError):
+    """Raised for filters outside the supported subset or with syntax errors"""
+
+
+def quote_literal(value: str) -> str:
+    """An OData string literal for ``value`` (single quotes doubled)"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _tokenize(expression: str) -> List[Tuple[str, str]]:
+    tokens = []
+    pos = 0
+    while pos < len(expression):
+        match = _TOKEN_PATTERN.match(expression, pos)
+        if not match:
+            raise ODataFilterError(f"Invalid filter syntax at position {pos}: {expression[pos:pos + 20]!r}")
+        kind = match.lastgroup
+        if kind != "ws":
+            tokens.append((kind, match.group(kind)))
+        pos = match.end()
+    return tokens
+
+
+def parse_datetime(value: str) -> Optional[datetime]:
+    try:
+        value = value.replace("Z", "+00:00")
+        # fromisoformat on Python < 3.11 only accepts 3 or 6 fractional digits
+        match = re.match(r"^(.*\.)(\d+)(.*)$", value)
+        if match:
+            value = match.group(1) + match.group(2)[:6].ljust(6, "0") + match.group(3)
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def _normalize(a: Any, b: Any) -> Tuple[Any, Any]:
+    """Bring two operands to a comparable type (datetimes are compared as instants)"""
+    if isinstance(a, datetime) or isinstance(b, datetime) or (
+        isinstance(a, str) and isinstance(b, str) and _DATETIME_PATTERN.match(a) and _DATETIME_PATTERN.match(b)
+    ):
+        a = a if isinstance(a, datetime) else parse_datetime(a) if isinstance(a, str) else a
+        b = b if isinstance(b, datetime) else parse_datetime(b) if isinstance(b, str) else b
+        if isinstance(a, datetime) and isinstance(b, datetime) and (a.tzinfo is None) != (b.tzinfo is None):
+            a, b = a.replace(tzinfo=None), b.replace(tzinfo=None)
+    return a, b
+
+
+def _compare(op: str, a: Any, b: Any) -> bool:
+    a, b = _normalize(a, b)
+    if op == "eq":
+        return a == b
+    if op == "ne":
+        return a != b
+    if a is None or b is None:
+        return False
+    try:
+        if op == "gt":
+            return a > b
+        if op == "ge":
+            return a >= b
+        if op == "lt":
+            return a < b
+        return a <= b
+    except TypeError:
+        return False
+
+
+def _terms(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+class _Parser:
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self, offset: int = 0) -> Tuple[str, str]:
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else ("eof", "")
+
+    def take(self, kind: Optional[str] = None, value: Optional[str] = None) -> Tuple[str, str]:
+        token = self.peek()
+        if token[0] == "eof":
+            raise ODataFilterError(f"Unexpected end of filter, expected {value or kind or 'an operand'}")
+        if (kind and token[0] != kind) or (value and token[1].lower() != value):
+            raise ODataFilterError(f"Expected {value or kind} but found {token[1] or 'end of filter'!r}")
+        self.pos += 1
+        return token
+
+    def at_keyword(self, keyword: str) -> bool:
+        kind, value = self.peek()
+        return kind == "ident" and value.lower() == keyword
+
+    def parse(self) -> Predicate:
+        predicate = self.parse_or()
+        if self.peek()[0] != "eof":
+            raise ODataFilterError(f"Unexpected token {self.peek()[1]!r}")
+        return predicate
+
+    def parse_or(self) -> Predicate:
+        parts = [self.parse_and()]
+        while self.at_keyword("or"):
+            self.take()
+            parts.append(self.parse_and())
+        if len(parts) == 1:
+            return parts[0]
+        return lambda doc, scope: any(p(doc, scope) for p in parts)
+
+    def parse_and(self) -> Predicate:
+        parts = [self.parse_not()]
+        while self.at_keyword("and"):
+            self.take()
+            parts.append(self.parse_not())
+        if len(parts) == 1:
+            return parts[0]
+        predicate = lambda doc, scope: all(p(doc, scope) for p in parts)
+        # Conjunctions keep the index-friendly constraints of their parts
+        predicate.constraints = [c for p in parts for c in getattr(p, "constraints", [])]
+        return predicate
+
+    def parse_not(self) -> Predicate:
+        if self.at_keyword("not"):
+            self.take()
+            inner = self.parse_not()
+            return lambda doc, scope: not inner(doc, scope)
+        return self.parse_primary()
+
+    def parse_primary(self) -> Predicate:
+        kind, value = self.peek()
+        if kind == "punct" and value == "(":
+            self.take()
+            inner = self.parse_or()
+            self.take("punct", ")")
+            return inner
+        if kind == "ident" and value.lower() == "search.in":
+            return self.parse_search_in()
+        if kind == "ident" and value.lower() == "search.ismatch":
+            return self.parse_search_ismatch()
+        if kind == "ident" and value.lower() in ("true", "false") and not self._comparison_follows(1):
+            self.take()
+            result = value.lower() == "true"
+            return lambda doc, scope: result
+
+        left = self.parse_operand()
+        if callable(left) and getattr(left, "is_predicate", False):
+            return left
+        op_kind, op = self.peek()
+        if op_kind != "ident" or op.lower() not in _COMPARISONS:
+            # A bare boolean field, e.g. "isArchived"
+            return lambda doc, scope: left(doc, scope) is True
+        self.take()
+        right = self.parse_operand()
+        op = op.lower()
+        predicate = lambda doc, scope: _compare(op, left(doc, scope), right(doc, scope))
+        field = getattr(left, "field", None)
+        if op == "eq" and field and hasattr(right, "literal") and isinstance(right.literal, (str, int)):
+            predicate.constraints = [(field, frozenset([right.literal]))]
+        return predicate
+
+    def _comparison_follows(self, offset: int) -> bool:
+        kind, value = self.peek(offset)
+        return kind == "ident" and value.lower() in _COMPARISONS
+
+    def parse_operand(self) -> Callable[[Dict[str, Any], Dict[str, Any]], Any]:
+        kind, value = self.take()
+        if kind == "string":
+            literal = value[1:-1].replace("''", "'")
+            operand = lambda doc, scope: literal
+            operand.literal = literal
+            return operand
+        if kind == "number":
+            number = float(value) if any(c in value for c in ".eE") else int(value)
+            operand = lambda doc, scope: number
+            operand.literal = number
+            return operand
+        if kind == "datetime":
+            instant = parse_datetime(value)
+            return lambda doc, scope: instant
+        if kind != "ident":
+            raise ODataFilterError(f"Unexpected token {value!r}")
+        lowered = value.lower()
+        if lowered in ("true", "false"):
+            flag = lowered == "true"
+            return lambda doc, scope: flag
+        if lowered == "null":
+            return lambda doc, scope: None
+
+        path = [value]
+        while self.peek() == ("punct", "/"):
+            self.take()
+            segment = self.take("ident")[1]
+            if segment.lower() in ("any", "all"):
+                return self.parse_lambda(path, segment.lower())
+            path.append(segment)
+        return self._field_getter(path)
+
+    def _field_getter(self, path: List[str]):
+        def get(doc, scope):
+            head = path[0]
+            value = scope[head] if head in scope else doc.get(head)
+            for segment in path[1:]:
+                value = value.get(segment) if isinstance(value, dict) else None
+            return value
+        if len(path) == 1:
+            get.field = path[0]
+        return get
+
+    def parse_lambda(self, path: List[str], quantifier: str) -> Predicate:
+        collection = self._field_getter(path)
+        self.take("punct", "(")
+        if self.peek() == ("punct", ")"):
+            self.take()
+            # any() with no body tests for a non-empty collection
+            predicate = lambda doc, scope: bool(collection(doc, scope))
+            predicate.is_predicate = True
+            return predicate
+        variable = self.take("ident")[1]
+        self.take("punct", ":")
+        body = self.parse_or()
+        self.take("punct", ")")
+        test = any if quantifier == "any" else all
+
+        def predicate(doc, scope):
+            items = collection(doc, scope) or []
+            return test(body(doc, {**scope, variable: item}) for item in items)
+        predicate.is_predicate = True
+        return predicate
+
+    def parse_search_in(self) -> Predicate:
+        self.take()
+        self.take("punct", "(")
+        field = self.parse_operand()
+        self.take("punct", ",")
+        values = self.parse_operand()(None, {})
+        delimiters = " ,"
+        if self.peek() == ("punct", ","):
+            self.take()
+            delimiters = self.parse_operand()(None, {})
+        self.take("punct", ")")
+        pattern = "[" + re.escape(delimiters) + "]"
+        allowed = frozenset(v for v in re.split(pattern, values) if v)
+        predicate = lambda doc, scope: field(doc, scope) in allowed
+        if getattr(field, "field", None):
+            predicate.constraints = [(field.field, allowed)]
+        return predicate
+
+    def parse_search_ismatch(self) -> Predicate:
+        self.take()
+        self.take("punct", "(")
+        query = self.parse_operand()(None, {})
+        fields = None
+        if self.peek() == ("punct", ","):
+            self.take()
+            fields = [f.strip() for f in self.parse_operand()(None, {}).split(",") if f.strip()]
+        while self.peek() == ("punct", ","):
+            # queryType and searchMode arguments are accepted but ignored
+            self.take()
+            self.parse_operand()
+        self.take("punct", ")")
+        wanted = set(_terms(query))
+
+        def predicate(doc, scope):
+            names = fields or [k for k, v in doc.items() if isinstance(v, str)]
+            present = set()
+            for name in names:
+                value = doc.get(name)
+                if isinstance(value, str):
+                    present.update(_terms(value))
+                elif isinstance(value, list):
+                    for item in value:
+                        if isinstance(item, str):
+                            present.update(_terms(item))
+            return wanted <= present
+        return predicate
+
+
+class CompiledFilter:
+    """A compiled filter; call it with a document to test it.
+
+    ``constraints`` lists ``(field, allowed values)`` pairs that every matching
+    document must satisfy (top-level ``eq`` / ``search.in`` conjuncts), so an
+    index can narrow candidates before evaluating the full predicate.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self._predicate = _Parser(_tokenize(expression)).parse()
+        self.constraints: List[Tuple[str, frozenset]] = list(getattr(self._predicate, "constraints", []))
+
+    def __call__(self, doc: Dict[str, Any]) -> bool:
+        return bool(self._predicate(doc, {}))
+
+
+@lru_cache(maxsize=512)
+def compile_filter(expression: str) -> CompiledFilter:
+    """Compile an OData filter expression into a predicate over documents"""
+    return CompiledFilter(expression)
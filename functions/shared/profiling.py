@@ -0,0 +1,239 @@
+"""Opt-in profiling of single invocations, written to the profiles container.
+
+``profiled(name)`` wraps a function's ``main``. An invocation is profiled when
+
+- a random draw falls below ``PROFILE_SAMPLE_RATE`` (0 by default, so off), or
+- ``PROFILE_ON_REQUEST`` is on and an HTTP request carries ``X-Profile: 1``
+  (the HTTP functions need a function key, so this is not open to callers
+  without one)
+
+``PROFILER`` selects the profiler:
+
+- ``cprofile`` (the default) traces every call. It writes ``<id>.prof`` for
+  ``pstats`` or snakeviz, and ``<id>.collapsed``, whose stacks are rebuilt
+  from the caller graph with times in microseconds
+- ``sampling`` records the handler thread's stack every
+  ``PROFILE_SAMPLE_INTERVAL_MS`` from a background thread. It writes only
+  ``<id>.collapsed`` with sample counts, costs little enough to leave on at a
+  low rate, and misses work done in other threads
+
+Collapsed files take one stack per line ("outer;inner count"), the input of
+flamegraph.pl, speedscope and inferno. Blobs are named
+``<function>/<UTC time>-<duration>ms-<id>`` and are kept only for
+invocations of at least ``PROFILE_MIN_DURATION_MS``, so a low sample rate and
+a threshold catch the slow calls. An invocation that is not profiled only
+reads these settings and draws a random number. cProfile profiles one
+invocation at a time per process; others started meanwhile run unprofiled.
+Malformed settings leave profiling off, with one warning each.
+"""
+import functools
+import logging
+import marshal
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .settings import env_number, warn_once
+
+PROFILES_CONTAINER = "profiles"
+PROFILE_HEADER = "X-Profile"
+PROFILERS = ("cprofile", "sampling")
+DEFAULT_PROFILER = "cprofile"
+DEFAULT_SAMPLE_INTERVAL_MS = 5
+# Stacks of the cProfile call graph are cut below this depth and share of time
+MAX_STACK_DEPTH = 64
+MIN_STACK_MICROSECONDS = 10
+
+_cprofile_lock = threading.Lock()
+
+
+def profiling_settings() -> Dict[str, Any]:
+    """Profiling settings; off unless they are set and valid"""
+    on_request = os.environ.get("PROFILE_ON_REQUEST", "off").strip().lower()
+    if on_request not in ("on", "true", "1", "off", "false", "0", ""):
+        warn_once("PROFILE_ON_REQUEST", on_request, f"Ignoring PROFILE_ON_REQUEST={on_request!r}; expected on or off")
+    settings = {
+        "sample_rate": min(1.0, max(0.0, env_number("PROFILE_SAMPLE_RATE", 0.0))),
+        "on_request": on_request in ("on", "true", "1"),
+        "profiler": os.environ.get("PROFILER", DEFAULT_PROFILER).strip().lower() or DEFAULT_PROFILER,
+        "interval": max(1, env_number("PROFILE_SAMPLE_INTERVAL_MS", DEFAULT_SAMPLE_INTERVAL_MS, int)) / 1000,
+        "min_duration_ms": max(0.0, env_number("PROFILE_MIN_DURATION_MS", 0.0)),
+    }
+    if settings["profiler"] not in PROFILERS:
+        warn_once("PROFILER", settings["profiler"],
+                  f"Profiling is off: PROFILER={settings['profiler']!r} is not one of {', '.join(PROFILERS)}")
+        settings.update(sample_rate=0.0, on_request=False)
+    return settings
+
+
+def _frame_label(code: Any) -> str:
+    path = code.co_filename.replace("\\", "/").split("/")
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _stats_label(func: Tuple[str, int, str]) -> str:
+    filename, line, name = func
+    if filename == "~":
+        return name.replace(";", ",")
+    path = filename.replace("\\", "/").split("/")
+    return f"{name} ({'/'.join(path[-2:])}:{line})".replace(";", ",")
+
+
+def collapse_stats(stats: Dict[Any, tuple]) -> str:
+    """Collapsed stacks from ``pstats`` data, splitting each function's time over its callers"""
+    callees: Dict[Any, Dict[Any, float]] = {}
+    roots = []
+    for func, (_, _, _, cumulative, callers) in stats.items():
+        known = [caller for caller in callers if caller in stats]
+        if not known:
+            roots.append(func)
+        for caller in known:
+            callees.setdefault(caller, {})[func] = callers[caller][3]
+    folded: Counter = Counter()
+
+    def walk(func: Any, path: Tuple[str, ...], seen: frozenset, seconds: float) -> None:
+        _, _, own, cumulative, _ = stats[func]
+        share = seconds / cumulative if cumulative else 0.0
+        micros = int(own * share * 1e6)
+        if micros:
+            folded[";".join(path)] += micros
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        for callee, edge in callees.get(func, {}).items():
+            child = edge * share
+            if callee not in seen and child * 1e6 >= MIN_STACK_MICROSECONDS:
+                walk(callee, path + (_stats_label(callee),), seen | {callee}, child)
+
+    for root in roots:
+        walk(root, (_stats_label(root),), frozenset([root]), stats[root][3])
+    return "".join(f"{stack} {count}\n" for stack, count in folded.most_common())
+
+
+class StackSampler:
+    """Counts the stacks of one thread, sampled every ``interval`` seconds from a daemon thread"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def _requested(args: tuple, kwargs: Dict[str, Any]) -> bool:
+    for arg in list(args) + list(kwargs.values()):
+        headers = getattr(arg, "headers", None)
+        if headers is not None and hasattr(arg, "get_json"):
+            return str(headers.get(PROFILE_HEADER, "")).lower() in ("1", "true", "on")
+    return False
+
+
+def _trigger(args: tuple, kwargs: Dict[str, Any], settings: Dict[str, Any]) -> Optional[str]:
+    if settings["on_request"] and _requested(args, kwargs):
+        return "request"
+    if settings["sample_rate"] > 0 and random.random() < settings["sample_rate"]:
+        return "sample"
+    return None
+
+
+def save_profile(function_name: str, blobs: Dict[str, bytes], metadata: Dict[str, str]) -> None:
+    """Upload the files of one profile; failures are logged, never raised into the invocation"""
+    from .storage import container_client, upload_blob
+
+    try:
+        container = container_client(PROFILES_CONTAINER)
+        for name, data in blobs.items():
+            upload_blob(container, f"{function_name}/{name}", data, metadata=metadata)
+        logging.info(f"Saved profile {function_name}/{next(iter(blobs))} ({metadata['duration_ms']} ms)")
+    except Exception as e:
+        logging.warning(f"Could not save profile of {function_name}: {e}")
+
+
+def _run_profiled(function_name: str, handler: Callable, args: tuple, kwargs: Dict[str, Any],
+                  trigger: str, settings: Dict[str, Any]) -> Any:
+    profiler = settings["profiler"]
+    if profiler == "cprofile" and not _cprofile_lock.acquire(blocking=False):
+        return handler(*args, **kwargs)
+    start = time.perf_counter()
+    if profiler == "cprofile":
+        import cProfile
+
+        tracer = cProfile.Profile()
+        try:
+            return tracer.runcall(handler, *args, **kwargs)
+        finally:
+            _cprofile_lock.release()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if elapsed_ms >= settings["min_duration_ms"]:
+                # Same format as Profile.dump_stats, so ``python -m pstats`` and snakeviz open it
+                tracer.create_stats()
+                base = _profile_name(elapsed_ms)
+                save_profile(function_name, {
+                    f"{base}.prof": marshal.dumps(tracer.stats),
+                    f"{base}.collapsed": collapse_stats(tracer.stats).encode("utf-8"),
+                }, _metadata(function_name, trigger, profiler, elapsed_ms))
+    sampler = StackSampler(threading.get_ident(), settings["interval"]).start()
+    try:
+        return handler(*args, **kwargs)
+    finally:
+        sampler.stop()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        # An invocation shorter than the interval has no samples to keep
+        if elapsed_ms >= settings["min_duration_ms"] and sampler.samples:
+            save_profile(function_name, {f"{_profile_name(elapsed_ms)}.collapsed": sampler.collapsed().encode("utf-8")},
+                         _metadata(function_name, trigger, profiler, elapsed_ms))
+
+
+def _profile_name(elapsed_ms: float) -> str:
+    return f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{int(elapsed_ms)}ms-{uuid.uuid4().hex[:8]}"
+
+
+def _metadata(function_name: str, trigger: str, profiler: str, elapsed_ms: float) -> Dict[str, str]:
+    return {"function": function_name, "trigger": trigger, "profiler": profiler, "duration_ms": str(int(elapsed_ms))}
+
+
+def profiled(function_name: str) -> Callable[[Callable], Callable]:
+    """Decorate a function's ``main`` so that sampled or requested invocations are profiled"""
+    def decorate(handler: Callable) -> Callable:
+        # functools.wraps keeps the signature and annotations the Functions host binds by
+        @functools.wraps(handler)
+        def main(*args: Any, **kwargs: Any) -> Any:
+            try:
+                settings = profiling_settings()
+                trigger = _trigger(args, kwargs, settings)
+            except Exception as e:
+                # Profiling never fails an invocation
+                warn_once("profiling", type(e).__name__, f"Profiling is off: {e}")
+                trigger = None
+            if trigger is None:
+                return handler(*args, **kwargs)
+            return _run_profiled(function_name, handler, args, kwargs, trigger, settings)
+        return main
+    return decorate
+
@@ -0,0 +1,203 @@
+"""Multi-query expansion for the chunk search (``questionRewriting``).
+
+A rewriter turns the agent's query into up to ``QUESTION_REWRITING_VARIANTS``
+alternative queries. The original and its variants run concurrently against
+the chunks index and their rankings are merged with reciprocal rank fusion
+(``RRF_K``, as Azure AI Search fuses hybrid queries), one result per
+``chunk_id``. A chunk found by several variants ranks above one that a single
+variant ranks slightly higher. Fused results keep their best search and
+reranker scores; the fused score only orders them.
+
+``QUESTION_REWRITER`` selects the rewriter. ``rules`` (the default) is
+deterministic and needs no model call:
+
+- one query per part of a compound question ("pricing of X and warranty of
+  Y" becomes "pricing X" and "warranty Y")
+- the question without question and filler words, with the singular or
+  plural of each word added for analyzers that do not stem
+
+Other rewriters, e.g. a model call, are plugged in with ``register_rewriter``.
+Rewrites are cached per rewriter, query and variant count in a
+``QUESTION_REWRITING_CACHE_SIZE``-entry LRU, so a model-backed rewriter pays
+its latency once per distinct query and instance.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .settings import env_number
+from .snippets import query_terms
+
+DEFAULT_REWRITER = "rules"
+DEFAULT_VARIANTS = 3
+DEFAULT_CACHE_SIZE = 1024
+RRF_K = 60
+FUSION_SCORE = "@search.fusion_score"
+ORIGINAL_SCORES = ("@search.score", "@search.reranker_score")
+# Searches run at once per instance; variants of one query share them
+MAX_PARALLEL_SEARCHES = 8
+
+STOPWORDS = frozenset("""
+a an the of to in on at for from by with about into over under between and or
+is are was were be been being do does did has have had can could should would will
+what which who whom whose when where why how whats
+me my i we our you your it its this that these those there their they them
+please tell show find give list get any some all
+""".split())
+_PART_SEPARATORS = re.compile(r"\?|;|,|\band\b|\balso\b", re.IGNORECASE)
+
+
+def _keywords(text: str) -> List[str]:
+    return [t for t in query_terms(text) if t not in STOPWORDS]
+
+
+def _inflect(term: str) -> str:
+    """The singular of a plural term, or the plural of a singular one"""
+    if len(term) <= 3 or any(c.isdigit() for c in term):
+        return term
+    if term.endswith("ies"):
+        return term[:-3] + "y"
+    if term.endswith(("ses", "xes", "ches", "shes")):
+        return term[:-2]
+    if term.endswith("s") and not term.endswith("ss"):
+        return term[:-1]
+    if term.endswith("y") and term[-2] not in "aeiou":
+        return term[:-1] + "ies"
+    if term.endswith(("s", "x", "ch", "sh")):
+        return term + "es"
+    return term + "s"
+
+
+def rule_rewrites(search_text: str, count: int) -> List[str]:
+    """Deterministic variants of ``search_text``, most specific first"""
+    variants: List[str] = []
+    parts = [_keywords(part) for part in _PART_SEPARATORS.split(search_text)]
+    parts = [part for part in parts if part]
+    if len(parts) > 1:
+        variants.extend(" ".join(part) for part in parts)
+    keywords = _keywords(search_text)
+    if keywords:
+        # One keyword query; a separate one without the inflections would vote for the same matches twice
+        variants.append(" ".join(keywords + [_inflect(t) for t in keywords if _inflect(t) != t]))
+    return variants[:count]
+
+
+_rewriters: Dict[str, Callable[[str, int], List[str]]] = {"rules": rule_rewrites}
+_cache: "OrderedDict[tuple, List[str]]" = OrderedDict()
+_cache_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def register_rewriter(name: str, rewriter: Callable[[str, int], List[str]]) -> None:
+    """Make ``rewriter(search_text, count) -> variants`` selectable as ``QUESTION_REWRITER=name``"""
+    _rewriters[name] = rewriter
+
+
+def rewriting_settings() -> Dict[str, Any]:
+    name = os.environ.get("QUESTION_REWRITER", DEFAULT_REWRITER)
+    return {
+        "rewriter": name if name in _rewriters else DEFAULT_REWRITER,
+        "variants": max(0, env_number("QUESTION_REWRITING_VARIANTS", DEFAULT_VARIANTS, int)),
+        "cache_size": max(0, env_number("QUESTION_REWRITING_CACHE_SIZE", DEFAULT_CACHE_SIZE, int)),
+    }
+
+
+def rewrite_query(search_text: str, settings: Optional[Dict[str, Any]] = None) -> List[str]:
+    """The query followed by its distinct variants"""
+    settings = settings or rewriting_settings()
+    if not query_terms(search_text) or settings["variants"] == 0:
+        return [search_text]
+    key = (settings["rewriter"], search_text, settings["variants"])
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return list(_cache[key])
+    variants = _rewriters[settings["rewriter"]](search_text, settings["variants"])
+    queries, seen = [search_text], {" ".join(query_terms(search_text))}
+    for variant in variants:
+        normalized = " ".join(query_terms(variant))
+        if normalized and normalized not in seen:
+            seen.add(normalized)
+            queries.append(variant)
+    queries = queries[:settings["variants"] + 1]
+    if settings["cache_size"]:
+        with _cache_lock:
+            _cache[key] = queries
+            while len(_cache) > settings["cache_size"]:
+                _cache.popitem(last=False)
+    return list(queries)
+
+
+def clear_rewrite_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
+
+
+class FusedResults(list):
+    """Fused results with ``get_count()`` like ``SearchItemPaged``"""
+
+    def __init__(self, results: Iterable[Dict[str, Any]], count: Optional[int]):
+        super().__init__(results)
+        self._count = count
+
+    def get_count(self) -> Optional[int]:
+        return self._count
+
+
+def reciprocal_rank_fusion(rankings: List[List[Dict[str, Any]]], key: str, top: int) -> List[Dict[str, Any]]:
+    """Merge rankings into one, ordered by ``sum(1 / (RRF_K + rank))`` over the rankings.
+
+    Each document keeps the fields of its best-ranked occurrence, and the
+    highest ``@search.score`` and reranker score of any occurrence, so score
+    thresholds keep their scale. The fused score is ``FUSION_SCORE``, for
+    ordering only.
+    """
+    scores: Dict[Any, float] = {}
+    best: Dict[Any, tuple] = {}
+    originals: Dict[Any, Dict[str, float]] = {}
+    for ranking in rankings:
+        for rank, result in enumerate(ranking, start=1):
+            doc_key = result[key]
+            scores[doc_key] = scores.get(doc_key, 0.0) + 1.0 / (RRF_K + rank)
+            if doc_key not in best or rank < best[doc_key][0]:
+                best[doc_key] = (rank, result)
+            kept = originals.setdefault(doc_key, {})
+            for field in ORIGINAL_SCORES:
+                if result.get(field) is not None and result[field] > kept.get(field, float("-inf")):
+                    kept[field] = result[field]
+    fused = []
+    for doc_key in sorted(scores, key=lambda k: (-scores[k], best[k][0]))[:top]:
+        result = dict(best[doc_key][1])
+        result.update(originals[doc_key])
+        result[FUSION_SCORE] = scores[doc_key]
+        fused.append(result)
+    return fused
+
+
+def _search_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL_SEARCHES, thread_name_prefix="query-rewriting")
+    return _executor
+
+
+def multi_query_search(search_client: Any, queries: List[str], key: str, **search_options: Any) -> FusedResults:
+    """Run ``queries`` concurrently with the same options and fuse their results"""
+    def run(query: str):
+        results = search_client.search(search_text=query, **search_options)
+        return list(results), results.get_count() if search_options.get("include_total_count") else None
+
+    if len(queries) == 1:
+        ranking, count = run(queries[0])
+        return FusedResults(ranking, count)
+    outcomes = list(_search_executor().map(run, queries))
+    counts = [count for _, count in outcomes if count is not None]
+    fused = reciprocal_rank_fusion([ranking for ranking, _ in outcomes], key, search_options.get("top", 50))
+    # Matches of the union are unknown; the broadest variant's count is a lower bound
+    return FusedResults(fused, max(counts) if counts else None)
@@ -0,0 +1,290 @@
+"""Rate limits and throttling-aware retries for downstream services.
+
+Each service (``content_understanding``, ``search``, ``agents``) has one
+limiter per process with:
+
+- a token bucket of ``RATE_LIMIT_<SERVICE>_RPS`` requests per second for this
+  instance (``0`` is unlimited)
+- ``RATE_LIMIT_<SERVICE>_CONCURRENCY`` operation slots shared by all
+  instances (``0`` is unlimited); like chat run slots they are blob leases
+  (``RATE_LIMIT_BACKEND=blob``, the default) or an in-process stand-in
+  (``local``). Content Understanding has 4 by default, so the whole app
+  analyzes at most 4 files at once however far ingestion scales out; a call
+  waits for a slot up to ``RATE_LIMIT_SLOT_WAIT_SECONDS``, by default half
+  of the host's ``functionTimeout`` (5 minutes when host.json sets none),
+  leaving the rest for the work. Longer waits are cut to that too, so a
+  waiting invocation fails (and is retried) before the host stops it
+- a pause: a throttled (429/503) response stops every request of the
+  process to that service for its ``Retry-After`` (or an exponential backoff
+  with jitter when the service does not say), instead of each caller
+  retrying on its own
+
+``call`` retries throttled calls made with ``requests`` or the Azure SDKs.
+The Azure SDK clients retry 429 themselves, except on POST (searches, agent
+runs); ``sdk_options`` plugs the limiter into their pipeline, so every attempt
+takes a token and honours the pause, and has POSTs retried on 429 as well,
+which the service rejected without processing them. A malformed
+``RATE_LIMIT_*`` value falls back to its default with a warning.
+"""
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from .chat_leases import Busy, LocalLeaseStore
+from .settings import env_number
+
+# requests/sec per instance and slots across instances; 0 is unlimited
+DEFAULT_LIMITS = {
+    "content_understanding": {"rps": 5.0, "concurrency": 4},
+    "search": {"rps": 50.0, "concurrency": 0},
+    "agents": {"rps": 20.0, "concurrency": 0},
+}
+LIMITS_CONTAINER = "rate-limits"
+THROTTLED_STATUS_CODES = (429, 503)
+DEFAULT_MAX_RETRIES = 8
+BACKOFF_BASE_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+# Slot waits cover a burst of uploads queueing behind long analyses, within the function timeout
+SLOT_WAIT_SHARE = 0.5
+# Host timeout of the Consumption plan when host.json sets no functionTimeout
+DEFAULT_FUNCTION_TIMEOUT_SECONDS = 300
+# Slot wait where functions run without a timeout (functionTimeout -1)
+UNBOUNDED_SLOT_WAIT_SECONDS = 600
+HOST_JSON = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "host.json")
+SLOT_POLL_SECONDS = 0.2
+
+
+def status_of(outcome: Any) -> Optional[int]:
+    """HTTP status of a response or of the error raised for one"""
+    status = getattr(outcome, "status_code", None)
+    if status is None:
+        status = getattr(getattr(outcome, "response", None), "status_code", None)
+    return status
+
+
+def retry_after_seconds(outcome: Any) -> Optional[float]:
+    """``Retry-After`` (seconds or ``retry-after-ms``) of a response or of the error raised for one"""
+    response = outcome if hasattr(outcome, "headers") else getattr(outcome, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("Retry-After"):
+            return float(headers["Retry-After"])
+    except (TypeError, ValueError):
+        # HTTP dates are rare for these services; fall back to backoff
+        pass
+    return None
+
+
+def backoff_seconds(attempt: int) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(MAX_BACKOFF_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+class TokenBucket:
+    """``rate`` tokens per second with bursts of up to ``capacity``"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token; returns how long to wait before using it"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class RateLimiter:
+    """Requests per second, shared slots and throttling pauses of one service"""
+
+    def __init__(self, service: str, rps: float, concurrency: int, store: Any = None):
+        self.service = service
+        self.bucket = TokenBucket(rps)
+        self.concurrency = concurrency
+        self.store = store or LocalLeaseStore()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "throttled": 0, "retries": 0, "waitedSeconds": 0.0}
+
+    def _sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            self.counters["waitedSeconds"] += seconds
+            time.sleep(seconds)
+
+    def wait(self) -> None:
+        """Block until a request may be sent: after any pause and with a token"""
+        self.counters["requests"] += 1
+        self._sleep(self._paused_until - time.monotonic())
+        self._sleep(self.bucket.reserve())
+
+    def pause(self, seconds: float) -> None:
+        """Hold every request of this process to the service for ``seconds``"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def throttled(self, outcome: Any, attempt: int) -> float:
+        """Record a throttled response; returns the pause it asked for"""
+        self.counters["throttled"] += 1
+        delay = retry_after_seconds(outcome)
+        delay = backoff_seconds(attempt) if delay is None else delay
+        self.pause(delay)
+        logging.warning(f"{self.service} throttled (HTTP {status_of(outcome)}), pausing {delay:.1f}s")
+        return delay
+
+    @contextmanager
+    def slot(self, wait: Optional[float] = None) -> Iterator[Any]:
+        """Hold one of the service's slots for a long operation; renew the yielded lease while working"""
+        if self.concurrency <= 0:
+            yield None
+            return
+        wait = slot_wait_seconds() if wait is None else wait
+        deadline = time.monotonic() + wait
+        offset = random.randrange(self.concurrency)
+        while True:
+            for i in range(self.concurrency):
+                lease = self.store.try_acquire(f"{self.service}/{(offset + i) % self.concurrency}")
+                if lease is not None:
+                    try:
+                        yield lease
+                    finally:
+                        lease.release()
+                    return
+            if time.monotonic() >= deadline:
+                raise Busy(f"All {self.concurrency} {self.service} slots are busy")
+            self._sleep(SLOT_POLL_SECONDS * random.uniform(0.5, 1.5))
+
+    def call(self, fn: Callable[[], Any], max_retries: Optional[int] = None) -> Any:
+        """Run ``fn`` (one request) at the service's rate, retrying throttled attempts.
+
+        Throttling shows as a 429/503 response (``requests``) or as an error
+        carrying one (Azure SDKs); other responses and errors are the
+        caller's to handle.
+        """
+        max_retries = max_retries if max_retries is not None else max_retry_setting()
+        for attempt in range(max_retries + 1):
+            self.wait()
+            try:
+                outcome = fn()
+            except Exception as e:
+                if status_of(e) not in THROTTLED_STATUS_CODES or attempt == max_retries:
+                    raise
+                outcome = e
+            else:
+                if status_of(outcome) not in THROTTLED_STATUS_CODES or attempt == max_retries:
+                    return outcome
+            self.throttled(outcome, attempt)
+            self.counters["retries"] += 1
+        return outcome
+
+    def sdk_options(self) -> Dict[str, Any]:
+        """Keyword arguments for Azure SDK clients: hooks run on every attempt and the retry policy"""
+        attempts = threading.local()
+
+        def on_request(request: Any) -> None:
+            self.wait()
+
+        def on_response(response: Any) -> None:
+            http_response = getattr(response, "http_response", response)
+            if status_of(http_response) in THROTTLED_STATUS_CODES:
+                attempts.count = getattr(attempts, "count", 0) + 1
+                # The SDK's retry policy sleeps for Retry-After itself; the pause holds the other callers
+                self.throttled(http_response, attempts.count)
+            else:
+                attempts.count = 0
+
+        return {
+            "raw_request_hook": on_request,
+            "raw_response_hook": on_response,
+            "retry_policy": throttling_retry_policy(max_retry_setting()),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {"service": self.service, **self.counters, "waitedSeconds": round(self.counters["waitedSeconds"], 3)}
+
+
+def throttling_retry_policy(max_retries: int) -> Any:
+    """The Azure SDK retry policy, also retrying POSTs that were throttled"""
+    from azure.core.pipeline.policies import RetryPolicy
+
+    class ThrottlingRetryPolicy(RetryPolicy):
+        def _is_method_retryable(self, settings, request, response=None):
+            if response is not None and response.status_code == 429:
+                return True
+            return super()._is_method_retryable(settings, request, response=response)
+
+    return ThrottlingRetryPolicy(retry_total=max_retries)
+
+
+@functools.lru_cache(maxsize=1)
+def function_timeout_seconds() -> Optional[float]:
+    """``functionTimeout`` of host.json in seconds, None when unbounded"""
+    try:
+        with open(HOST_JSON, "r", encoding="utf-8") as f:
+            timeout = json.load(f).get("functionTimeout")
+        if timeout is None:
+            return DEFAULT_FUNCTION_TIMEOUT_SECONDS
+        if str(timeout).strip() == "-1":
+            return None
+        hours, minutes, seconds = (float(part) for part in str(timeout).split(":"))
+        return hours * 3600 + minutes * 60 + seconds
+    except (OSError, ValueError) as e:
+        logging.warning(f"Could not read functionTimeout from host.json, assuming {DEFAULT_FUNCTION_TIMEOUT_SECONDS}s: {e}")
+        return DEFAULT_FUNCTION_TIMEOUT_SECONDS
+
+
+def slot_wait_seconds() -> float:
+    """How long a call waits for a slot: ``RATE_LIMIT_SLOT_WAIT_SECONDS``, at most a share of the function timeout"""
+    timeout = function_timeout_seconds()
+    limit = UNBOUNDED_SLOT_WAIT_SECONDS if timeout is None else timeout * SLOT_WAIT_SHARE
+    return max(0.0, min(limit, env_number("RATE_LIMIT_SLOT_WAIT_SECONDS", limit)))
+
+
+def max_retry_setting() -> int:
+    return max(0, env_number("RATE_LIMIT_MAX_RETRIES", DEFAULT_MAX_RETRIES, int))
+
+
+def limit_settings(service: str) -> Dict[str, float]:
+    """Limits of ``service``; a malformed value falls back to the default with a warning"""
+    defaults = DEFAULT_LIMITS.get(service, {"rps": 0.0, "concurrency": 0})
+    prefix = f"RATE_LIMIT_{service.upper()}"
+    return {
+        "rps": max(0.0, env_number(f"{prefix}_RPS", defaults["rps"])),
+        "concurrency": max(0, env_number(f"{prefix}_CONCURRENCY", defaults["concurrency"], int)),
+    }
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _slot_store() -> Any:
+    if os.environ.get("RATE_LIMIT_BACKEND", "blob").lower() == "blob":
+        from .chat_leases import BlobLeaseStore
+        from .storage import container_client
+        return BlobLeaseStore(container_client(LIMITS_CONTAINER))
+    return LocalLeaseStore()
+
+
+def rate_limiter(service: str) -> RateLimiter:
+    """The limiter of ``service`` in this process"""
+    with _limiters_lock:
+        if service not in _limiters:
+            settings = limit_settings(service)
+            _limiters[service] = RateLimiter(service, settings["rps"], settings["concurrency"], _slot_store())
+        return _limiters[service]
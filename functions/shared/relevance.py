@@ -0,0 +1,86 @@
+"""Semantic ranking options and relevance cuts for tool results.
+
+The indexes define one semantic configuration each (``SEMANTIC_CONFIGURATIONS``,
+created by ``create_search_indexes``); ``semantic_options`` requests it. Tools
+then keep only strong evidence, so weak matches do not take room in the 60KB
+queue message:
+
+- with semantic ranking, results whose reranker score (0-4) is below
+  ``SEARCH_MIN_RERANKER_SCORE`` are dropped
+- ``minScore`` in the tool call drops results below that score (reranker
+  score with semantic ranking, search score otherwise)
+- the elbow cut (``SEARCH_ELBOW_CUT``, on by default) keeps the results above
+  the largest drop in score when that drop is at least
+  ``SEARCH_ELBOW_MIN_GAP`` of the top score
+
+At least ``SEARCH_MIN_RESULTS`` results are kept whenever there are any, so a
+question without strong matches still gets its best candidates.
+"""
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from .settings import env_number
+
+SEMANTIC_CONFIGURATIONS = {"artifacts": "artifact-semantic", "chunks": "chunk-semantic"}
+DEFAULT_MIN_RERANKER_SCORE = 1.5
+DEFAULT_ELBOW_MIN_GAP = 0.4
+DEFAULT_MIN_RESULTS = 1
+RERANKER_SCORE = "@search.reranker_score"
+SEARCH_SCORE = "@search.score"
+
+
+def semantic_options(base_name: str) -> Dict[str, Any]:
+    """Search options for semantic ranking with the configuration of ``base_name`` ("artifacts" or "chunks")"""
+    return {
+        "query_type": "semantic",
+        "query_language": "en-us",
+        "semantic_configuration_name": SEMANTIC_CONFIGURATIONS[base_name],
+        "query_caption": "extractive",
+    }
+
+
+def relevance_settings() -> Dict[str, Any]:
+    return {
+        "min_reranker_score": env_number("SEARCH_MIN_RERANKER_SCORE", DEFAULT_MIN_RERANKER_SCORE),
+        "elbow": os.environ.get("SEARCH_ELBOW_CUT", "on").lower() not in ("off", "false", "0"),
+        "elbow_min_gap": env_number("SEARCH_ELBOW_MIN_GAP", DEFAULT_ELBOW_MIN_GAP),
+        "min_results": max(0, env_number("SEARCH_MIN_RESULTS", DEFAULT_MIN_RESULTS, int)),
+    }
+
+
+def result_score(result: Dict[str, Any]) -> Optional[float]:
+    """The reranker score of a semantically ranked result, else its search score"""
+    score = result.get(RERANKER_SCORE)
+    return score if score is not None else result.get(SEARCH_SCORE)
+
+
+def elbow_index(scores: List[float], min_gap: float) -> int:
+    """How many leading scores lie above the largest drop, or all when no drop reaches ``min_gap`` of the top"""
+    if len(scores) < 2 or scores[0] <= 0:
+        return len(scores)
+    gaps = [(scores[i] - scores[i + 1], i + 1) for i in range(len(scores) - 1)]
+    gap, cut = max(gaps)
+    return cut if gap >= min_gap * scores[0] else len(scores)
+
+
+def relevance_cut(
+    results: List[Dict[str, Any]], min_score: Optional[float] = None, settings: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """Drop weak results from ``results`` (in ranking order)"""
+    settings = settings or relevance_settings()
+    kept = results
+    if any(r.get(RERANKER_SCORE) is not None for r in kept):
+        kept = [r for r in kept if (r.get(RERANKER_SCORE) or 0.0) >= settings["min_reranker_score"]]
+    if min_score is not None:
+        kept = [r for r in kept if (result_score(r) or 0.0) >= min_score]
+    if settings["elbow"] and kept:
+        scores = [result_score(r) or 0.0 for r in kept]
+        # Collapsing duplicates and fusion keep the ranking order but not always sorted scores
+        if scores == sorted(scores, reverse=True):
+            kept = kept[:elbow_index(scores, settings["elbow_min_gap"])]
+    if len(kept) < settings["min_results"]:
+        kept = results[:settings["min_results"]]
+    if len(kept) < len(results):
+        logging.info(f"Relevance cut kept {len(kept)} of {len(results)} results")
+    return kept
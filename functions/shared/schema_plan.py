@@ -0,0 +1,245 @@
+"""Compiled extraction plan for the user schema.
+
+``compile_schema`` turns the ``fields`` of ``schemas/user_config.json`` into a
+``SchemaPlan`` once; ingestion, index creation, the Artifact tool and the
+agent instructions all read the same plan, so the index columns, the values
+written to them and the fields the agent is told about cannot drift apart.
+
+Each schema field gets an extractor for its Content Understanding value type
+(``valueString``, ``valueNumber``, ``valueDate``, ...). Table fields (and
+objects with declared sub-fields) are flattened into ``<field>_<subfield>``
+columns holding one value per row. The same values are copied onto every
+chunk of the item as ``chunk_<column>`` so chunk searches filter on them
+directly.
+"""
+import json
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Index column types, mapped to Azure AI Search EDM types by index creation
+STRING = "string"
+STRINGS = "strings"
+DOUBLE = "double"
+INT64 = "int64"
+BOOLEAN = "boolean"
+DATETIME = "datetime"
+
+STANDARD_ARTIFACT_FIELDS = ["id", "content", "docType", "timestamp", "fileName"]
+
+CHUNK_PREFIX = "chunk_"
+
+_VALUE_KEYS = {
+    "string": "valueString",
+    "number": "valueNumber",
+    "integer": "valueInteger",
+    "boolean": "valueBoolean",
+    "date": "valueDate",
+    "time": "valueTime",
+    "array": "valueArray",
+    "object": "valueObject",
+}
+
+Extractor = Callable[[Any], Any]
+
+
+def raw_value(field: Any) -> Any:
+    """The typed value of a Content Understanding field result"""
+    if not isinstance(field, dict):
+        return field
+    key = _VALUE_KEYS.get(field.get("type"))
+    if key and key in field:
+        return field[key]
+    # Untyped or mismatched results: take whichever value is present
+    for key in _VALUE_KEYS.values():
+        if key in field:
+            return field[key]
+    return field.get("content")
+
+
+def _as_text(field: Any) -> Optional[str]:
+    if isinstance(field, dict):
+        value = field.get("valueString")
+        if value is not None:
+            return value
+    value = raw_value(field)
+    if value is None:
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"))
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value if isinstance(value, str) else str(value)
+
+
+def _as_number(field: Any) -> Optional[float]:
+    value = raw_value(field)
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(",", "").strip())
+    except ValueError:
+        return None
+
+
+def _as_integer(field: Any) -> Optional[int]:
+    number = _as_number(field)
+    return int(number) if number is not None else None
+
+
+def _as_boolean(field: Any) -> Optional[bool]:
+    value = raw_value(field)
+    if isinstance(value, bool) or value is None:
+        return value
+    return str(value).strip().lower() in ("true", "yes", "1")
+
+
+# "Z", "+02:00" or "-0500" at the end of a date-time
+_UTC_OFFSET = re.compile(r"(?:[Zz]|([+-]\d{2}):?(\d{2}))$")
+
+
+def _as_datetime(field: Any) -> Optional[str]:
+    """Dates become Edm.DateTimeOffset strings (``2024-05-01T00:00:00Z``); times without an offset are UTC"""
+    value = raw_value(field)
+    if not isinstance(value, str) or not value:
+        return None
+    if "T" not in value:
+        return f"{value}T00:00:00Z"
+    offset = _UTC_OFFSET.search(value)
+    if offset is None:
+        return f"{value}Z"
+    # The index takes offsets as +hh:mm
+    return value[:offset.start()] + f"{offset.group(1)}:{offset.group(2)}" if offset.group(1) else value
+
+
+def _as_strings(field: Any) -> List[str]:
+    items = raw_value(field)
+    if items is None:
+        return []
+    if not isinstance(items, list):
+        items = [field]
+    return [text for text in (_as_text(item) for item in items) if text is not None]
+
+
+_SCALARS: Dict[str, Tuple[str, Extractor]] = {
+    "string": (STRING, _as_text),
+    "time": (STRING, _as_text),
+    "number": (DOUBLE, _as_number),
+    "integer": (INT64, _as_integer),
+    "boolean": (BOOLEAN, _as_boolean),
+    "date": (DATETIME, _as_datetime),
+}
+
+
+class FieldPlan:
+    """How one schema field is extracted and which index columns it fills"""
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.name = spec["name"]
+        self.type = spec.get("type", "string")
+        self.description = spec.get("description", "")
+        self.subfields = [sub["name"] for sub in spec.get("fields", [])]
+        # (column name, column type)
+        self.columns: List[Tuple[str, str]] = []
+        if self.subfields and self.type in ("table", "object"):
+            self.columns = [(f"{self.name}_{sub}", STRINGS) for sub in self.subfields]
+            self.extract = self._extract_rows
+        elif self.type == "array":
+            self.columns = [(self.name, STRINGS)]
+            self.extract = lambda field: {self.name: _as_strings(field)}
+        else:
+            column_type, extractor = _SCALARS.get(self.type, (STRING, _as_text))
+            self.columns = [(self.name, column_type)]
+            self.extract = lambda field: {self.name: extractor(field)}
+
+    def _extract_rows(self, field: Any) -> Dict[str, List[str]]:
+        rows = raw_value(field)
+        if isinstance(rows, dict):
+            rows = [rows]  # an object is a table with one row
+        targets = [(sub, []) for sub in self.subfields]
+        for row in rows or []:
+            cells = row.get("valueObject", row) if isinstance(row, dict) else None
+            if not isinstance(cells, dict):
+                continue
+            for sub, column in targets:
+                cell = cells.get(sub)
+                if cell is not None:
+                    text = _as_text(cell)
+                    if text is not None:
+                        column.append(text)
+        return {f"{self.name}_{sub}": column for sub, column in targets}
+
+    def filter_example(self, prefix: str = "") -> str:
+        column, column_type = self.columns[0]
+        column = prefix + column
+        if column_type == STRINGS:
+            return f"{column}/any(v: v eq 'value')"
+        if column_type in (DOUBLE, INT64):
+            return f"{column} ge 100"
+        if column_type == BOOLEAN:
+            return f"{column} eq true"
+        if column_type == DATETIME:
+            return f"{column} ge 2024-01-01T00:00:00Z"
+        return f"{column} eq 'value'"
+
+    def instruction(self) -> str:
+        if self.subfields and self.type in ("table", "object"):
+            columns = ", ".join(column for column, _ in self.columns)
+            return f"- {self.name}: Table; each column is a list of row values ({columns}). {self.description}"
+        kinds = {
+            STRINGS: "List of strings", DOUBLE: "Number", INT64: "Integer",
+            BOOLEAN: "true/false", DATETIME: "Date/time value (ISO 8601)", STRING: "Text value",
+        }
+        return f"- {self.name}: {kinds[self.columns[0][1]]}. {self.description}"
+
+
+class SchemaPlan:
+    """A schema compiled for extraction; build it with ``compile_schema``"""
+
+    def __init__(self, fields: List[Dict[str, Any]]):
+        self.fields = [FieldPlan(spec) for spec in fields]
+        self._by_name = {plan.name: plan for plan in self.fields}
+        self.columns: List[Tuple[str, str]] = [column for plan in self.fields for column in plan.columns]
+        self.column_names = frozenset(name for name, _ in self.columns)
+        self.select_fields = STANDARD_ARTIFACT_FIELDS + [name for name, _ in self.columns]
+        self.chunk_columns = [(CHUNK_PREFIX + name, column_type) for name, column_type in self.columns]
+
+    def extract(self, content_fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Index column values for the schema fields present in a content item"""
+        values: Dict[str, Any] = {}
+        by_name = self._by_name
+        for name, field in content_fields.items():
+            plan = by_name.get(name)
+            if plan is not None:
+                values.update(plan.extract(field))
+        return values
+
+    @staticmethod
+    def chunk_values(values: Dict[str, Any]) -> Dict[str, Any]:
+        """``extract`` output renamed to the chunk index columns"""
+        return {CHUNK_PREFIX + name: value for name, value in values.items()}
+
+    def field_instructions(self) -> List[str]:
+        return [plan.instruction() for plan in self.fields]
+
+    def filter_examples(self, prefix: str = "") -> List[str]:
+        return [plan.filter_example(prefix) for plan in self.fields]
+
+
+_cache: Dict[str, SchemaPlan] = {}
+_cache_lock = threading.Lock()
+
+
+def compile_schema(schema_json: Dict[str, Any]) -> SchemaPlan:
+    """Compile (or fetch the cached plan for) the fields of a schema"""
+    fields = schema_json.get("fields", [])
+    key = json.dumps(fields, sort_keys=True)
+    with _cache_lock:
+        plan = _cache.get(key)
+        if plan is None:
+            if len(_cache) >= 32:
+                _cache.clear()
+            plan = _cache[key] = SchemaPlan(fields)
+        return plan
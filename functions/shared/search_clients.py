@@ -0,0 +1,29 @@
+import os
+from typing import Any
+
+
+def use_local_search() -> bool:
+    """True when ``SEARCH_BACKEND=local`` selects the embedded search engine"""
+    return os.environ.get("SEARCH_BACKEND", "azure").lower() == "local"
+
+
+def get_search_client(index_name: str) -> Any:
+    """Return a search client for ``index_name`` on the configured backend.
+
+    Both backends expose the same ``search`` / ``upload_documents`` /
+    ``merge_or_upload_documents`` / ``delete_documents`` surface.
+    """
+    if use_local_search():
+        from .local_search import LocalSearchClient
+        return LocalSearchClient(index_name=index_name)
+
+    from azure.search.documents import SearchClient
+    from azure.core.credentials import AzureKeyCredential
+    from .rate_limits import rate_limiter
+    return SearchClient(
+        endpoint=os.environ["SEARCH_ENDPOINT"],
+        index_name=index_name,
+        credential=AzureKeyCredential(os.environ["SEARCH_ADMIN_KEY"]),
+        # Every attempt, retries included, goes through the shared search limiter
+        **rate_limiter("search").sdk_options()
+    )
@@ -0,0 +1,40 @@
+"""Numeric settings read from the environment.
+
+A malformed value (``RATE_LIMIT_SEARCH_RPS=fast``) falls back to the default
+with one warning per variable and value, instead of failing every invocation
+that reads the setting.
+"""
+import logging
+import math
+import os
+import threading
+from typing import Callable, Set, Tuple, Union
+
+Number = Union[int, float]
+
+_warned: Set[Tuple[str, str]] = set()
+_warned_lock = threading.Lock()
+
+
+def warn_once(name: str, value: str, message: str) -> None:
+    """Log ``message`` the first time ``name`` is seen set to ``value``"""
+    with _warned_lock:
+        if (name, value) in _warned:
+            return
+        _warned.add((name, value))
+    logging.warning(message)
+
+
+def env_number(name: str, default: Number, cast: Callable[[float], Number] = float) -> Number:
+    """``name`` as a finite number passed through ``cast`` (``int`` truncates), or ``default``"""
+    raw = os.environ.get(name)
+    if raw is None or not raw.strip():
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        value = math.nan
+    if not math.isfinite(value):
+        warn_once(name, raw, f"Ignoring {name}={raw!r}, which is not a number; using {default}")
+        return default
+    return cast(value)
@@ -0,0 +1,168 @@
+"""Query-focused snippets for tool results.
+
+Tools return a window of each result's content around the passages that
+matched, instead of its first characters: semantic captions first, then
+search highlights, then occurrences of the query terms. The characters per
+result come from ``snippet_budget(top_k)`` so that ``top_k`` snippets fill,
+but do not exceed, the queue message limit. They are counted as encoded in
+the message (``encoded_length``), where an accented letter or CJK character
+takes several.
+"""
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Queue messages are capped at 64KB; keep room for metadata and the other fields
+MESSAGE_BUDGET = 48000
+MIN_SNIPPET_CHARS = 400
+MAX_SNIPPET_CHARS = 8000
+# Smallest window kept around each match
+MIN_WINDOW_CHARS = 160
+ELLIPSIS = " … "
+
+HIGHLIGHT_PRE_TAG = "<em>"
+HIGHLIGHT_POST_TAG = "</em>"
+_TAGS = re.compile(r"</?em>")
+_EMPHASIS = re.compile(r"<em>(.*?)</em>")
+_QUERY_TERM = re.compile(r"[\w']+")
+_QUERY_OPERATORS = {"and", "or", "not"}
+
+
+def snippet_budget(top_k: int) -> int:
+    """Encoded characters of content each of ``top_k`` results may return"""
+    return max(MIN_SNIPPET_CHARS, min(MAX_SNIPPET_CHARS, MESSAGE_BUDGET // max(top_k, 1)))
+
+
+def highlight_options(content_field: str) -> Dict[str, Any]:
+    """Search options that request highlights for ``content_field``"""
+    return {
+        "highlight_fields": content_field,
+        "highlight_pre_tag": HIGHLIGHT_PRE_TAG,
+        "highlight_post_tag": HIGHLIGHT_POST_TAG,
+    }
+
+
+def query_terms(search_text: Optional[str]) -> List[str]:
+    """Plain terms of a search query, without operators and wildcards"""
+    if not search_text or search_text.strip() == "*":
+        return []
+    return [t for t in _QUERY_TERM.findall(search_text.lower()) if t not in _QUERY_OPERATORS]
+
+
+def result_fragments(result: Dict[str, Any], content_field: str) -> List[str]:
+    """Caption and highlight passages the service returned for a result"""
+    fragments = []
+    for caption in result.get("@search.captions") or []:
+        text = caption.get("text") if isinstance(caption, dict) else getattr(caption, "text", None)
+        if text:
+            fragments.append(text)
+    fragments.extend((result.get("@search.highlights") or {}).get(content_field) or [])
+    return fragments
+
+
+def _anchors(content: str, fragments: Iterable[str], terms: Iterable[str], limit: int) -> List[Tuple[int, int]]:
+    """Spans of matching passages, most relevant first, at most ``limit``"""
+    spans = []
+    for fragment in fragments:
+        plain = _TAGS.sub("", fragment).strip()
+        start = content.find(plain) if plain else -1
+        if start >= 0:
+            spans.append((start, start + len(plain)))
+            continue
+        # Captions and highlights may be normalized; fall back to their emphasized words
+        for word in _EMPHASIS.findall(fragment):
+            match = re.search(re.escape(word), content, re.IGNORECASE)
+            if match:
+                spans.append(match.span())
+    terms = list(terms)
+    if not spans and terms:
+        # str.find is far faster than a case-insensitive regex on long artifacts
+        lowered = content.lower()
+        for term in terms:
+            found = 0
+            start = lowered.find(term)
+            while start >= 0 and found < limit:
+                end = start + len(term)
+                if (start == 0 or not lowered[start - 1].isalnum()) and (end >= len(lowered) or not lowered[end].isalnum()):
+                    spans.append((start, end))
+                    found += 1
+                start = lowered.find(term, end)
+        spans.sort()
+    return spans[:limit]
+
+
+def _windows(spans: List[Tuple[int, int]], length: int, share: int) -> List[List[int]]:
+    """Windows of ``share`` characters centred on each span, merged where they overlap"""
+    windows: List[List[int]] = []
+    for start, end in sorted(spans):
+        pad = max(0, (share - (end - start)) // 2)
+        start, end = max(0, start - pad), min(length, end + pad)
+        if windows and start <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], end)
+        else:
+            windows.append([start, end])
+    return windows
+
+
+def encoded_length(text: str) -> int:
+    """Characters ``text`` takes in a queue message, where tool results are a JSON string inside the JSON message"""
+    # Without the two pairs of quotes around it
+    return len(json.dumps(json.dumps(text))) - 6
+
+
+def build_snippet(content: str, budget: int, fragments: Iterable[str] = (), terms: Iterable[str] = ()) -> str:
+    """``content`` around its matching passages, at most ``budget`` characters once encoded"""
+    if not isinstance(content, str) or (len(content) <= budget and encoded_length(content) <= budget):
+        return content
+    spans = _anchors(content, fragments, terms, max(1, budget // MIN_WINDOW_CHARS))
+    chars = budget
+    while True:
+        snippet = _snippet(content, chars, spans[:max(1, chars // MIN_WINDOW_CHARS)])
+        size = encoded_length(snippet)
+        if size <= budget:
+            return snippet
+        # Escapes make text longer: shrink by their share, or by the excess when they are few
+        chars = min(chars - 1, max(chars * budget // size, chars - (size - budget)))
+
+
+def _snippet(content: str, budget: int, spans: List[Tuple[int, int]]) -> str:
+    """Up to ``budget`` characters of ``content`` around ``spans``"""
+    if len(content) <= budget:
+        return content
+    if not spans:
+        return content[:budget]
+
+    # Split the budget evenly; budget left over where windows merged is handed out again
+    share = budget // len(spans)
+    windows = _windows(spans, len(content), share)
+    for _ in range(3):
+        used = sum(end - start for start, end in windows)
+        if used >= budget * 0.95:
+            break
+        share += (budget - used) // len(windows)
+        windows = _windows(spans, len(content), share)
+
+    parts = []
+    remaining = budget
+    for start, end in windows:
+        if remaining < MIN_WINDOW_CHARS // 2:
+            break
+        end = min(end, start + remaining)
+        # Snap to word boundaries
+        if start > 0:
+            space = content.find(" ", start, start + 40)
+            start = space + 1 if space >= 0 else start
+        if end < len(content):
+            space = content.rfind(" ", end - 40, end)
+            end = space if space > start else end
+        parts.append((start, end))
+        remaining -= end - start
+    if not parts:
+        return content[:budget]
+
+    snippet = ELLIPSIS.join(content[start:end].strip() for start, end in parts)
+    if parts[0][0] > 0:
+        snippet = ELLIPSIS.lstrip() + snippet
+    if parts[-1][1] < len(content):
+        snippet += ELLIPSIS.rstrip()
+    return snippet
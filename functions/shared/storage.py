@@ -0,0 +1,60 @@
+"""Blob storage access shared within a function process.
+
+The storage SDK is imported on first use rather than when a function module
+loads, so cold starts of code paths that never touch storage do not pay for
+it. One ``BlobServiceClient`` (and its connection pool) is reused by every
+invocation in the process.
+"""
+import json
+import os
+import threading
+from typing import Any, Dict
+
+SCHEMAS_CONTAINER = "schemas"
+USER_CONFIG_BLOB = "user_config.json"
+
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def blob_service_client(connection_string: str = None):
+    """The process-wide ``BlobServiceClient`` for a connection string"""
+    connection_string = connection_string or os.environ["STORAGE_CONNECTION_STRING"]
+    client = _clients.get(connection_string)
+    if client is None:
+        from azure.storage.blob import BlobServiceClient
+        with _clients_lock:
+            client = _clients.get(connection_string)
+            if client is None:
+                client = _clients[connection_string] = BlobServiceClient.from_connection_string(connection_string)
+    return client
+
+
+def container_client(name: str, connection_string: str = None):
+    return blob_service_client(connection_string).get_container_client(name)
+
+
+def upload_blob(container, name: str, data, **kwargs) -> None:
+    """Upload (overwriting) to ``container``, creating the container on first use"""
+    from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+
+    try:
+        container.upload_blob(name, data, overwrite=True, **kwargs)
+    except ResourceNotFoundError:
+        try:
+            container.create_container()
+        except ResourceExistsError:
+            pass
+        container.upload_blob(name, data, overwrite=True, **kwargs)
+
+
+def load_user_config() -> Dict[str, Any]:
+    """The schema and agent configuration written by setup"""
+    blob = container_client(SCHEMAS_CONTAINER).get_blob_client(USER_CONFIG_BLOB)
+    return json.loads(blob.download_blob().readall())
+
+
+def use_blob_service_client(client: Any, connection_string: str = None) -> None:
+    """Serve ``client`` for a connection string, e.g. an in-memory stand-in"""
+    with _clients_lock:
+        _clients[connection_string or os.environ["STORAGE_CONNECTION_STRING"]] = client
@@ -0,0 +1,43 @@
+"""Token counts for sizing chunks and agent context.
+
+``estimate_tokens`` assumes about ``CHARS_PER_TOKEN`` characters per token and
+is what the request path uses. ``count_tokens`` counts with tiktoken's
+``cl100k_base`` encoding (that of the OpenAI embedding and GPT-4 models) for
+measuring how good the estimate is. tiktoken is imported on the first count,
+and downloads the encoding then unless ``TIKTOKEN_CACHE_DIR`` holds it; when
+the encoding cannot be loaded, counts fall back to the estimate with one
+warning.
+"""
+import logging
+from typing import Any, Optional
+
+CHARS_PER_TOKEN = 4
+ENCODING = "cl100k_base"
+
+_encoding: Optional[Any] = None
+_encoding_failed = False
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def tokenizer() -> Optional[Any]:
+    """The tiktoken encoding, or None when tiktoken or its encoding file is unavailable"""
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding(ENCODING)
+        except Exception as e:
+            _encoding_failed = True
+            logging.warning(f"Could not load the {ENCODING} encoding, estimating tokens instead: {e}")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = tokenizer()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
@@ -0,0 +1,327 @@
+"""In-process vector indexes used by the local search backend.
+
+Vectors are L2-normalized on insert so cosine similarity is a dot product.
+``numpy`` is used when it is installed; otherwise everything runs on plain
+Python arrays, which is fine for tests and small corpora.
+
+Indexes take an optional codec so the same graph/scan code runs on scalar
+(int8) or binary quantized vectors, mirroring Azure AI Search vector
+compression. ``RescoringVectorIndex`` re-ranks oversampled quantized hits
+with the original vectors.
+"""
+import heapq
+import math
+import operator
+import random
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional
+    np = None
+
+Allowed = Optional[Callable[[int], bool]]
+
+
+def normalize(vector: Sequence[float]) -> array:
+    """Unit-length float32 copy of ``vector`` (4 bytes per dimension)"""
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return array("f", [v / norm for v in vector])
+
+
+def truncate(vector: Sequence[float], dimensions: int) -> array:
+    """Shorten a Matryoshka-style embedding (e.g. text-embedding-3) and renormalize"""
+    return normalize(vector[:dimensions])
+
+
+def dot(a: Sequence[float], b: Sequence[float]) -> float:
+    return sum(map(operator.mul, a, b))
+
+
+def cosine_score(similarity: float) -> float:
+    """Azure AI Search reports cosine hits as 1 / (1 + cosine distance)"""
+    return 1.0 / (1.0 + (1.0 - similarity))
+
+
+class FloatCodec:
+    """Full-precision float32 vectors"""
+
+    name = "none"
+
+    def encode(self, vector: Sequence[float]) -> Any:
+        return normalize(vector)
+
+    def similarity(self, a: Any, b: Any) -> float:
+        return dot(a, b)
+
+    def bytes_per_vector(self, dimensions: int) -> int:
+        return 4 * dimensions
+
+
+class ScalarQuantizationCodec:
+    """int8 scalar quantization of unit vectors.
+
+    Components of a unit vector in ``d`` dimensions are roughly N(0, 1/d), so
+    the int8 range is mapped onto +/- 4 standard deviations and clipped.
+    """
+
+    name = "scalar"
+
+    def __init__(self, dimensions: Optional[int] = None):
+        self.scale = self._scale(dimensions) if dimensions else None
+
+    @staticmethod
+    def _scale(dimensions: int) -> float:
+        return 127 / (4 / math.sqrt(max(dimensions, 1)))
+
+    def encode(self, vector: Sequence[float]) -> Any:
+        if self.scale is None:
+            self.scale = self._scale(len(vector))
+        scale = self.scale
+        return array("b", [max(-127, min(127, int(round(v * scale)))) for v in normalize(vector)])
+
+    def similarity(self, a: Any, b: Any) -> float:
+        return dot(a, b) / (self.scale * self.scale)
+
+    def bytes_per_vector(self, dimensions: int) -> int:
+        return dimensions
+
+
+class BinaryQuantizationCodec:
+    """One bit per dimension (the sign); similarity from Hamming distance"""
+
+    name = "binary"
+
+    def __init__(self, dimensions: Optional[int] = None):
+        self.dimensions = dimensions
+
+    def encode(self, vector: Sequence[float]) -> Any:
+        if not self.dimensions:
+            self.dimensions = len(vector)
+        code = 0
+        for i, v in enumerate(vector):
+            if v > 0:
+                code |= 1 << i
+        return code
+
+    def similarity(self, a: Any, b: Any) -> float:
+        return 1.0 - 2.0 * bin(a ^ b).count("1") / self.dimensions
+
+    def bytes_per_vector(self, dimensions: int) -> int:
+        return (dimensions + 7) // 8
+
+
+def make_codec(compression: str, dimensions: Optional[int] = None):
+    """Codec for a profile's ``compression``; sized from the first vector if ``dimensions`` is None"""
+    if compression == "scalar":
+        return ScalarQuantizationCodec(dimensions)
+    if compression == "binary":
+        return BinaryQuantizationCodec(dimensions)
+    return FloatCodec()
+
+
+class ExhaustiveVectorIndex:
+    """Brute-force k-NN; exact, and fast enough with numpy for ~10^5 vectors"""
+
+    def __init__(self, codec=None):
+        self.codec = codec or FloatCodec()
+        self._vectors: Dict[int, Any] = {}
+        self._matrix = None
+        self._matrix_slots: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def add(self, slot: int, vector: Sequence[float]) -> None:
+        self._vectors[slot] = self.codec.encode(vector)
+        self._matrix = None
+
+    def remove(self, slot: int) -> None:
+        if self._vectors.pop(slot, None) is not None:
+            self._matrix = None
+
+    def search(self, query: Sequence[float], k: int, allowed: Allowed = None) -> List[Tuple[int, float]]:
+        encoded = self.codec.encode(query)
+        if np is not None and self._vectors and isinstance(self.codec, FloatCodec):
+            if self._matrix is None:
+                self._matrix_slots = list(self._vectors)
+                self._matrix = np.asarray([self._vectors[s] for s in self._matrix_slots], dtype=np.float32)
+            similarities = self._matrix @ np.asarray(encoded, dtype=np.float32)
+            order = np.argsort(-similarities)
+            hits = []
+            for i in order:
+                slot = self._matrix_slots[int(i)]
+                if allowed is None or allowed(slot):
+                    hits.append((slot, float(similarities[int(i)])))
+                    if len(hits) >= k:
+                        break
+            return hits
+        similarity = self.codec.similarity
+        candidates = (
+            (slot, similarity(encoded, vector))
+            for slot, vector in self._vectors.items()
+            if allowed is None or allowed(slot)
+        )
+        return heapq.nlargest(k, candidates, key=lambda item: item[1])
+
+
+class HnswVectorIndex:
+    """Hierarchical Navigable Small World graph (Malkov & Yashunin).
+
+    Parameters mirror the Azure AI Search HNSW configuration. Deletions are
+    tombstoned: removed nodes still route traffic but are never returned.
+    """
+
+    def __init__(self, m: int = 4, ef_construction: int = 400, ef_search: int = 500, seed: int = 42, codec=None):
+        self.m = m
+        self.m0 = 2 * m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.codec = codec or FloatCodec()
+        self._level_mult = 1 / math.log(max(m, 2))
+        self._rng = random.Random(seed)
+        self._vectors: Dict[int, Any] = {}
+        self._graph: List[Dict[int, List[int]]] = []
+        self._deleted = set()
+        self._entry: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._vectors) - len(self._deleted)
+
+    def _search_layer(self, query, entry_points: List[int], ef: int, layer: int) -> List[Tuple[float, int]]:
+        similarity = self.codec.similarity
+        vectors = self._vectors
+        visited = set(entry_points)
+        candidates = [(-similarity(vectors[p], query), p) for p in entry_points]
+        heapq.heapify(candidates)
+        best = [(-d, p) for d, p in candidates]  # min-heap on similarity
+        heapq.heapify(best)
+        while candidates:
+            neg_sim, node = heapq.heappop(candidates)
+            if best and -neg_sim < best[0][0] and len(best) >= ef:
+                break
+            for neighbour in self._graph[layer].get(node, []):
+                if neighbour in visited:
+                    continue
+                visited.add(neighbour)
+                sim = similarity(vectors[neighbour], query)
+                if len(best) < ef or sim > best[0][0]:
+                    heapq.heappush(candidates, (-sim, neighbour))
+                    heapq.heappush(best, (sim, neighbour))
+                    if len(best) > ef:
+                        heapq.heappop(best)
+        return sorted(best, reverse=True)
+
+    def _top_level(self) -> int:
+        return max(i for i, layer in enumerate(self._graph) if self._entry in layer)
+
+    def add(self, slot: int, vector: Sequence[float]) -> None:
+        if slot in self._vectors:
+            # Re-inserting a key: keep the node, refresh its vector
+            self._deleted.discard(slot)
+        encoded = self._vectors[slot] = self.codec.encode(vector)
+        level = int(-math.log(1.0 - self._rng.random()) * self._level_mult)
+        while len(self._graph) <= level:
+            self._graph.append({})
+        if self._entry is None:
+            for layer in range(level + 1):
+                self._graph[layer][slot] = []
+            self._entry = slot
+            return
+
+        entry = [self._entry]
+        top_level = self._top_level()
+        for layer in range(top_level, level, -1):
+            entry = [self._search_layer(encoded, entry, 1, layer)[0][1]]
+        similarity = self.codec.similarity
+        for layer in range(min(level, top_level), -1, -1):
+            found = self._search_layer(encoded, entry, self.ef_construction, layer)
+            limit = self.m0 if layer == 0 else self.m
+            neighbours = [node for _, node in found if node != slot][:limit]
+            self._graph[layer][slot] = neighbours
+            for neighbour in neighbours:
+                links = self._graph[layer].setdefault(neighbour, [])
+                links.append(slot)
+                if len(links) > limit:
+                    base = self._vectors[neighbour]
+                    links.sort(key=lambda n: -similarity(self._vectors[n], base))
+                    del links[limit:]
+            entry = [node for _, node in found]
+        for layer in range(top_level + 1, level + 1):
+            self._graph[layer][slot] = []
+        if level > top_level:
+            self._entry = slot
+
+    def remove(self, slot: int) -> None:
+        if slot in self._vectors:
+            self._deleted.add(slot)
+
+    def search(self, query: Sequence[float], k: int, allowed: Allowed = None, ef: Optional[int] = None) -> List[Tuple[int, float]]:
+        if self._entry is None:
+            return []
+        encoded = self.codec.encode(query)
+        entry = [self._entry]
+        for layer in range(self._top_level(), 0, -1):
+            entry = [self._search_layer(encoded, entry, 1, layer)[0][1]]
+        ef = max(ef or self.ef_search, k)
+        # Filtered queries widen the beam until enough allowed nodes are found
+        while True:
+            found = self._search_layer(encoded, entry, ef, 0)
+            hits = [
+                (node, sim) for sim, node in found
+                if node not in self._deleted and (allowed is None or allowed(node))
+            ]
+            if len(hits) >= k or ef >= len(self._vectors):
+                return hits[:k]
+            ef *= 4
+
+
+class RescoringVectorIndex:
+    """Searches a compressed index for ``k * oversampling`` hits, then re-ranks
+    them with the full-precision vectors (Azure's ``rerankWithOriginalVectors``)"""
+
+    def __init__(self, inner, oversampling: float = 10.0):
+        self.inner = inner
+        self.oversampling = max(oversampling, 1.0)
+        self._originals: Dict[int, array] = {}
+
+    def __len__(self) -> int:
+        return len(self.inner)
+
+    def add(self, slot: int, vector: Sequence[float]) -> None:
+        self._originals[slot] = normalize(vector)
+        self.inner.add(slot, vector)
+
+    def remove(self, slot: int) -> None:
+        self._originals.pop(slot, None)
+        self.inner.remove(slot)
+
+    def search(self, query: Sequence[float], k: int, allowed: Allowed = None) -> List[Tuple[int, float]]:
+        candidates = self.inner.search(query, int(math.ceil(k * self.oversampling)), allowed)
+        query = normalize(query)
+        rescored = [(slot, dot(query, self._originals[slot])) for slot, _ in candidates]
+        return heapq.nlargest(k, rescored, key=lambda item: item[1])
+
+
+def build_vector_index(profile: Optional[Dict[str, Any]] = None):
+    """Build an index that behaves like an Azure AI Search vector profile.
+
+    ``profile`` uses the setup schema keys (see ``shared.vector_profiles``).
+    """
+    profile = profile or {}
+    dimensions = profile.get("dimensions")
+    compression = profile.get("compression", "none")
+    codec = make_codec(compression, dimensions)
+    if profile.get("algorithm", "exhaustiveKnn") == "hnsw":
+        index = HnswVectorIndex(
+            m=profile.get("m", 4),
+            ef_construction=profile.get("efConstruction", 400),
+            ef_search=profile.get("efSearch", 500),
+            codec=codec,
+        )
+    else:
+        index = ExhaustiveVectorIndex(codec)
+    if compression != "none" and profile.get("rescore", True):
+        index = RescoringVectorIndex(index, profile.get("oversampling", 10.0))
+    return index
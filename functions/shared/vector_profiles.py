@@ -0,0 +1,75 @@
+"""Vector index profiles that are part of the setup schema.
+
+The setup request may carry ``vectorProfiles`` with one entry per index:
+
+    "vectorProfiles": {
+        "artifacts": {"algorithm": "hnsw", "m": 4, "efConstruction": 400, "efSearch": 500},
+        "chunks": {
+            "algorithm": "hnsw", "m": 8, "efConstruction": 400, "efSearch": 200,
+            "compression": "scalar", "rescore": true, "oversampling": 4,
+            "stored": false, "dimensions": 512
+        }
+    }
+
+Missing keys fall back to ``DEFAULT_VECTOR_PROFILE``, which matches the
+profile the indexes were created with before profiles were configurable.
+"""
+import copy
+from typing import Any, Dict, Optional
+
+INDEX_NAMES = ("artifacts", "chunks")
+
+DEFAULT_VECTOR_PROFILE = {
+    "algorithm": "hnsw",          # "hnsw" or "exhaustiveKnn"
+    "metric": "cosine",
+    "m": 4,
+    "efConstruction": 400,
+    "efSearch": 500,
+    "compression": "none",        # "none", "scalar" (int8) or "binary"
+    "rescore": True,              # re-rank compressed hits with the original vectors
+    "oversampling": 10.0,
+    "stored": True,               # keep a retrievable copy of the vectors
+    "dimensions": 1536,
+}
+
+_ALGORITHMS = ("hnsw", "exhaustiveKnn")
+_METRICS = ("cosine", "euclidean", "dotProduct")
+_COMPRESSIONS = ("none", "scalar", "binary")
+# Limits enforced by Azure AI Search
+_RANGES = {
+    "m": (4, 10),
+    "efConstruction": (100, 1000),
+    "efSearch": (100, 1000),
+    "oversampling": (1, 100),
+    "dimensions": (2, 3072),
+}
+
+
+def resolve_vector_profile(profile: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge a profile over the defaults and validate it; raises ValueError"""
+    resolved = copy.deepcopy(DEFAULT_VECTOR_PROFILE)
+    unknown = set(profile or {}) - set(resolved)
+    if unknown:
+        raise ValueError(f"Unknown vector profile settings: {', '.join(sorted(unknown))}")
+    resolved.update(profile or {})
+
+    if resolved["algorithm"] not in _ALGORITHMS:
+        raise ValueError(f"Vector algorithm must be one of {', '.join(_ALGORITHMS)}")
+    if resolved["metric"] not in _METRICS:
+        raise ValueError(f"Vector metric must be one of {', '.join(_METRICS)}")
+    if resolved["compression"] not in _COMPRESSIONS:
+        raise ValueError(f"Vector compression must be one of {', '.join(_COMPRESSIONS)}")
+    for key, (low, high) in _RANGES.items():
+        if not isinstance(resolved[key], (int, float)) or not low <= resolved[key] <= high:
+            raise ValueError(f"Vector profile setting '{key}' must be between {low} and {high}")
+    resolved["dimensions"] = int(resolved["dimensions"])
+    return resolved
+
+
+def resolve_vector_profiles(config: Optional[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Resolve the ``vectorProfiles`` setup setting for both indexes"""
+    config = config or {}
+    unknown = set(config) - set(INDEX_NAMES)
+    if unknown:
+        raise ValueError(f"Vector profiles can only be set for: {', '.join(INDEX_NAMES)}")
+    return {name: resolve_vector_profile(config.get(name)) for name in INDEX_NAMES}
@@ -0,0 +1,154 @@
+import azure.functions as func
+import json
+import logging
+from typing import Any, Dict, List, Tuple
+from shared.search_clients import get_search_client
+from shared.index_versions import active_index_name
+from shared.odata_filter import quote_literal
+from shared.snippets import MESSAGE_BUDGET
+from shared.profiling import profiled
+
+DEFAULT_RADIUS_SECONDS = 60
+# Transcript chunks hold 10 segments, so this covers several hours of audio
+MAX_CHUNKS = 500
+# Consecutive chunks share their last/first segments (AudioTranscriptChunker overlap)
+MAX_OVERLAP_LINES = 20
+GAP_MARKER = "…"
+
+def parse_time(value: Any) -> int:
+    """Milliseconds of a time given as seconds or as [hh:]mm:ss[.fff]"""
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        text = str(value).strip()
+        try:
+            *hours, minutes, secs = text.split(":") if ":" in text else ["0", "0", text]
+            seconds = int(hours[0] if hours else 0) * 3600 + int(minutes) * 60 + float(secs)
+        except ValueError:
+            raise ValueError(f"Invalid time {value!r}; use seconds or [hh:]mm:ss")
+    if seconds < 0:
+        raise ValueError(f"Invalid time {value!r}; times cannot be negative")
+    return int(seconds * 1000)
+
+def format_time(ms: int) -> str:
+    seconds = ms // 1000
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+def time_range(payload: Dict[str, Any]) -> Tuple[int, int]:
+    """The requested range in milliseconds, from start/end or center ± radius"""
+    if payload.get("center") is not None:
+        center = parse_time(payload["center"])
+        radius = parse_time(payload.get("radius", DEFAULT_RADIUS_SECONDS))
+        return max(0, center - radius), center + radius
+    if payload.get("start") is None or payload.get("end") is None:
+        raise ValueError("Pass either 'start' and 'end', or 'center' with an optional 'radius'")
+    start, end = parse_time(payload["start"]), parse_time(payload["end"])
+    if end <= start:
+        raise ValueError("'end' must be after 'start'")
+    return start, end
+
+def merge_chunks(chunks: List[Dict[str, Any]]) -> List[str]:
+    """Transcript lines of chunks sorted by start time, without the lines consecutive chunks share"""
+    lines: List[str] = []
+    previous_end = None
+    for chunk in chunks:
+        chunk_lines = (chunk.get("chunk_content") or "").split("\n")
+        if previous_end is not None and chunk["chunk_segmentStartTime"] > previous_end:
+            # A chunk in between is missing (e.g. collapsed as a duplicate)
+            lines.append(GAP_MARKER)
+        overlap = 0
+        for k in range(min(MAX_OVERLAP_LINES, len(lines), len(chunk_lines)), 0, -1):
+            if lines[-k:] == chunk_lines[:k]:
+                overlap = k
+                break
+        lines.extend(chunk_lines[overlap:])
+        previous_end = max(previous_end or 0, chunk["chunk_segmentEndTime"])
+    return lines
+
+def fit_budget(lines: List[str], budget: int) -> Tuple[List[str], bool]:
+    """Drop lines from both ends, which lie at the edges of the range, until the excerpt fits"""
+    size = sum(len(line) + 1 for line in lines)
+    if size <= budget:
+        return lines, False
+    head, tail = 0, len(lines)
+    while size > budget and tail - head > 1:
+        if (head + len(lines) - tail) % 2 == 0:
+            size -= len(lines[head]) + 1
+            head += 1
+        else:
+            tail -= 1
+            size -= len(lines[tail]) + 1
+    return [GAP_MARKER] + lines[head:tail] + [GAP_MARKER], True
+
+def transcript_window(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """The transcript of one file between two times, merged from its overlapping chunks"""
+    file_name = payload.get("fileName")
+    if not file_name:
+        raise ValueError("Missing fileName")
+    start, end = time_range(payload)
+
+    search_client = get_search_client(active_index_name("chunks"))
+    # Chunks that overlap [start, end), in transcript order; near-identical chunks list every file as a source
+    results = search_client.search(
+        search_text="*",
+        filter=" and ".join([
+            "chunk_docType eq 'chunk'",
+            f"chunk_sources/any(s: s eq {quote_literal(file_name)})",
+            f"chunk_segmentStartTime lt {end}",
+            f"chunk_segmentEndTime gt {start}",
+        ]),
+        order_by=["chunk_segmentStartTime asc"],
+        select="chunk_id,chunk_content,chunk_segmentStartTime,chunk_segmentEndTime",
+        top=MAX_CHUNKS
+    )
+    chunks = [r for r in results if r.get("chunk_segmentStartTime") is not None]
+    if not chunks:
+        return {
+            "fileName": file_name,
+            "start": format_time(start),
+            "end": format_time(end),
+            "chunks": 0,
+            "excerpt": "",
+            "message": "No transcript segments of this file in that time range"
+        }
+
+    lines, truncated = fit_budget(merge_chunks(chunks), MESSAGE_BUDGET)
+    return {
+        "fileName": file_name,
+        "start": format_time(chunks[0]["chunk_segmentStartTime"]),
+        "end": format_time(max(c["chunk_segmentEndTime"] for c in chunks)),
+        "startMs": chunks[0]["chunk_segmentStartTime"],
+        "endMs": max(c["chunk_segmentEndTime"] for c in chunks),
+        "chunks": len(chunks),
+        "truncated": truncated,
+        "excerpt": "\n".join(lines)
+    }
+
+@profiled("transcriptwindow_function")
+def main(msg: func.QueueMessage, outputQueueItem: func.Out[str]) -> None:
+    logging.info('Python queue trigger function processed a queue item')
+    correlation_id = None
+
+    try:
+        # Parse the queue message
+        message_payload = json.loads(msg.get_body().decode('utf-8'))
+        correlation_id = message_payload.get('CorrelationId')
+        payload = message_payload.get('payload', {})
+
+        window = transcript_window(payload)
+        logging.info(f"Transcript window of {window['fileName']}: {window['chunks']} chunks, truncated: {window.get('truncated', False)}")
+
+        output_message = {
+            "Value": json.dumps(window),
+            "CorrelationId": correlation_id
+        }
+        outputQueueItem.set(json.dumps(output_message))
+
+    except Exception as e:
+        logging.error(f"Error in transcriptwindow_function: {str(e)}")
+        # Send error to output queue
+        error_message = {
+            "error": str(e),
+            "CorrelationId": correlation_id
+        }
+        outputQueueItem.set(json.dumps(error_message))
@@ -1,10 +1,9 @@
 # /upload_file_function/__init__.py
 import azure.functions as func
-import os
-from azure.storage.blob import BlobServiceClient
 import uuid
 import json
 import logging
+from shared.storage import blob_service_client
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Processing upload file request')
@@ -30,8 +29,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         })
 
         # Get blob storage connection
-        blob_conn_str = os.environ["STORAGE_CONNECTION_STRING"]
-        blob_client = BlobServiceClient.from_connection_string(blob_conn_str)
+        blob_client = blob_service_client()
         
         # Get files container
         container = blob_client.get_container_client("files")
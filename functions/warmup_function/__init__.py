@@ -0,0 +1,41 @@
+import azure.functions as func
+import logging
+import json
+import time
+from typing import Any, Dict
+from chat_function.initialize_client import initialize_client
+from chat_function.thread_pool import thread_pool
+
+def warm_up() -> Dict[str, Any]:
+    """Load the SDKs, credentials, agent client, config and agent id, and fill the thread pool"""
+    timings = {}
+    start = time.perf_counter()
+    _, agent_id = initialize_client()
+    timings["clientMs"] = round((time.perf_counter() - start) * 1000)
+
+    # Creating threads also fetches the credential's first token
+    start = time.perf_counter()
+    pool = thread_pool()
+    created = pool.fill()
+    timings["threadPoolMs"] = round((time.perf_counter() - start) * 1000)
+
+    result = {"agentId": agent_id, "durationMs": timings, "threadsCreated": created, "threadPool": pool.stats()}
+    logging.info(f"Warm-up done: {json.dumps(result)}")
+    return result
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    logging.info('Warm-up request')
+
+    try:
+        return func.HttpResponse(
+            json.dumps(warm_up()),
+            mimetype="application/json",
+            status_code=200
+        )
+    except Exception as e:
+        logging.error(f"Warm-up failed: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=500
+        )
@@ -0,0 +1,10 @@
+import azure.functions as func
+import logging
+from warmup_function import warm_up
+
+def main(timer: func.TimerRequest) -> None:
+    # Keeps one instance warm; Always On or a health check on /api/warmup covers the others
+    try:
+        warm_up()
+    except Exception as e:
+        logging.error(f"Scheduled warm-up failed: {str(e)}")